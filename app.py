@@ -1,112 +1,166 @@
-import copy
-from datetime import datetime
-from io import BytesIO
-from threading import Lock, Thread
-
-from flask import Flask, render_template, request, jsonify, send_file
-from excel_handler import process_excel_file
-from database import init_db, update_or_insert_data, get_all_data
-import sqlite3
-from workbook_consolidator import PipelineError, run_workbook_pipeline
+import csv
+import io
+import json
+import os
+import pstats
+import shutil
+import time
+import zlib
+from threading import Thread
+
+from flask import Flask, Response, g, render_template, request, jsonify, send_file
+from excel_handler import iter_excel_batches
+from database import (TELEMETRY_COLUMNS, init_db, update_or_insert_data, get_all_data, iter_data, query_data,
+                      new_batch_id, query_history, list_batches, get_dashboard_summary, refresh_alerts,
+                      get_active_alerts, get_alert_rules, set_alert_rule, delete_alert_rule, clear_data)
+from email_alerts import dispatcher as alert_dispatcher, send_alert
+from content_cache import ContentCache, combine_hashes, hash_stream
+from job_manager import FINISHED_STATUSES, JobManager, JobQueueFull
+from metrics import REGISTRY, collect_spans
+from workbook_consolidator import PhaseCache, run_workbook_pipeline, run_workbook_pipeline_in_process
+from workbook_writer import OUTPUT_MODES
 
 app = Flask(__name__)
 
-# Initialize database on startup
-init_db()
+PIPELINE_MAX_UPLOAD_MB = int(os.getenv('PIPELINE_MAX_UPLOAD_MB', '200'))
+PIPELINE_MAX_UPLOAD_BYTES = PIPELINE_MAX_UPLOAD_MB * 1024 * 1024
+# Three workbooks per /process request, plus multipart overhead
+app.config['MAX_CONTENT_LENGTH'] = 3 * PIPELINE_MAX_UPLOAD_BYTES + 1024 * 1024
+
+# Identical uploads (by SHA-256 of their content) reuse earlier results; send no_cache=1 to bypass
+CACHE_MAX_AGE = float(os.getenv('UPLOAD_CACHE_TTL', '86400'))
+
+# "process" runs each job in a child process so openpyxl work does not hold the web tier's GIL
+PIPELINE_EXECUTION = os.getenv('PIPELINE_EXECUTION', 'thread')
+# "modified" rewrites only the sheets the pipeline edits and copies the rest of MAIN through
+PIPELINE_OUTPUT_MODE = os.getenv('PIPELINE_OUTPUT_MODE', 'full')
+if PIPELINE_OUTPUT_MODE not in OUTPUT_MODES:
+    raise ValueError(
+        f"PIPELINE_OUTPUT_MODE must be one of {', '.join(OUTPUT_MODES)}, got {PIPELINE_OUTPUT_MODE!r}"
+    )
 
 
-PHASE_LABELS = {
-    "1": "Phase 1: DMS normalization",
-    "2": "Phase 2: repJourney merge",
-    "3": "Phase 3: MAIN enrichment",
-    "4": "Phase 4: Completed, ready for human review",
-}
+def _compress_level_setting():
+    """Zip deflate level 0-9 for the consolidated workbook; unset keeps zlib's default."""
+    value = os.getenv('PIPELINE_COMPRESS_LEVEL', '').strip()
+    if not value:
+        return None
+    try:
+        level = int(value)
+    except ValueError:
+        level = None
+    if level is None or not 0 <= level <= 9:
+        raise ValueError(f"PIPELINE_COMPRESS_LEVEL must be an integer from 0 to 9, got {value!r}")
+    return level
+
+
+PIPELINE_COMPRESS_LEVEL = _compress_level_setting()
+
+# Uploads and rule changes evaluate alerts as they write; this timer catches devices that merely aged
+ALERT_REFRESH_SECONDS = float(os.getenv('ALERT_REFRESH_SECONDS', '300'))
+
+# Set up by init_app()
+job_manager = None
+upload_cache = None
+process_cache = None
+phase_cache = None
+alert_refresher = None
+
+
+def init_app():
+    """Initialize the database, the pipeline job manager and the result caches."""
+    global job_manager, upload_cache, process_cache, phase_cache, alert_refresher
+    init_db()
+    refresh_alerts()
+    alert_refresher = Thread(target=_refresh_alerts_periodically, name='alert-refresh', daemon=True)
+    alert_refresher.start()
+    job_manager = JobManager(
+        max_workers=int(os.getenv('PIPELINE_WORKERS', '2')),
+        max_pending=int(os.getenv('PIPELINE_MAX_QUEUED', '10')),
+        result_ttl=float(os.getenv('PIPELINE_RESULT_TTL', '3600')),
+        max_results=int(os.getenv('PIPELINE_MAX_RESULTS', '10')),
+        spool_dir=os.getenv('PIPELINE_SPOOL_DIR') or None,
+    )
+    upload_cache = ContentCache(
+        max_age=CACHE_MAX_AGE,
+        max_entries=int(os.getenv('UPLOAD_CACHE_MAX_ENTRIES', '200')),
+    )
+    process_cache = ContentCache(
+        max_age=CACHE_MAX_AGE,
+        max_entries=int(os.getenv('PROCESS_CACHE_MAX_ENTRIES', '20')),
+        max_bytes=int(os.getenv('PROCESS_CACHE_MAX_MB', '500')) * 1024 * 1024,
+        directory=os.path.join(job_manager.spool_dir, 'cache'),
+    )
+    # Intermediate phase results, so a run with one changed workbook only redoes the work that depends on it
+    phase_cache = PhaseCache(
+        os.path.join(job_manager.spool_dir, 'phase-cache'),
+        max_entries=int(os.getenv('PHASE_CACHE_MAX_ENTRIES', '4')),
+    )
 
-progress_lock = Lock()
-pipeline_state = {}
-processed_workbook_bytes: bytes | None = None
 
+def _refresh_alerts_periodically():
+    while True:
+        time.sleep(ALERT_REFRESH_SECONDS)
+        try:
+            refresh_alerts()
+        except Exception:
+            app.logger.exception('Periodic alert refresh failed')
 
-def _phase_template(label: str) -> dict:
-    return {
-        "label": label,
-        "status": "pending",
-        "percent": 0,
-        "processed_rows": 0,
-        "total_rows": 0,
-        "message": "Waiting to begin.",
-    }
 
+# Pipeline workers started with "spawn" re-import this module as __mp_main__ when the app runs
+# as `python app.py`; they must not migrate the database or start a job manager of their own
+if __name__ != '__mp_main__':
+    init_app()
 
-def _default_phases() -> dict:
-    return {key: _phase_template(label) for key, label in PHASE_LABELS.items()}
 
+def _cache_bypassed() -> bool:
+    return request.values.get('no_cache') == '1'
 
-def _reset_pipeline_state():
-    global processed_workbook_bytes
-    pipeline_state.clear()
-    pipeline_state.update(
-        {
-            "overall_status": "idle",
-            "download_ready": False,
-            "error": None,
-            "started_at": None,
-            "finished_at": None,
-            "filename": None,
-            "phases": _default_phases(),
-        }
-    )
-    processed_workbook_bytes = None
-
-
-def _update_progress(phase: int, **payload):
-    phase_key = str(phase)
-    with progress_lock:
-        phase_state = pipeline_state.get("phases", {}).get(phase_key)
-        if not phase_state:
-            return
-        status = payload.get("status")
-        if status:
-            phase_state["status"] = status
-            if status == "running" and pipeline_state.get("overall_status") not in {"error", "completed"}:
-                pipeline_state["overall_status"] = "running"
-            if status == "error":
-                pipeline_state["overall_status"] = "error"
-        total = payload.get("total_rows") or payload.get("total")
-        if total is not None:
-            phase_state["total_rows"] = int(total)
-        processed = payload.get("processed_rows") or payload.get("processed")
-        if processed is not None:
-            phase_state["processed_rows"] = int(processed)
-        percent = payload.get("percent")
-        total_for_percent = phase_state.get("total_rows") or total or 0
-        if total_for_percent and processed is not None:
-            fraction = min(processed, total_for_percent) / total_for_percent
-            phase_state["percent"] = round(fraction * 100, 2)
-        elif percent is not None:
-            phase_state["percent"] = percent
-        message = payload.get("message")
-        if message:
-            phase_state["message"] = message
-
-
-def _handle_pipeline_failure(exc: Exception):
-    message = str(exc)
-    global processed_workbook_bytes
-    with progress_lock:
-        pipeline_state["overall_status"] = "error"
-        pipeline_state["error"] = message
-        pipeline_state["download_ready"] = False
-        pipeline_state["finished_at"] = datetime.utcnow().isoformat() + "Z"
-        processed_workbook_bytes = None
-        if isinstance(exc, PipelineError) and exc.phase:
-            phase_key = str(exc.phase)
-            if phase_key in pipeline_state["phases"]:
-                pipeline_state["phases"][phase_key]["status"] = "error"
-                pipeline_state["phases"][phase_key]["message"] = message
-
-
-_reset_pipeline_state()
+
+# Served in the Prometheus text format at /metrics
+HTTP_REQUESTS = REGISTRY.counter(
+    'cpecaps_http_requests_total', 'HTTP requests by method, route and status.', ['method', 'endpoint', 'status']
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    'cpecaps_http_request_seconds', 'Time to produce an HTTP response in seconds.', ['endpoint']
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge('cpecaps_http_requests_in_flight', 'HTTP requests being handled.')
+PIPELINE_JOBS = REGISTRY.counter('cpecaps_pipeline_jobs_total', 'Pipeline jobs by outcome.', ['outcome'])
+REGISTRY.gauge('cpecaps_pipeline_jobs_queued', 'Pipeline jobs waiting for a worker.',
+               function=lambda: job_manager.count('queued'))
+REGISTRY.gauge('cpecaps_pipeline_jobs_running', 'Pipeline jobs being processed.',
+               function=lambda: job_manager.count('running'))
+UPLOAD_ROWS = REGISTRY.counter('cpecaps_upload_rows_total', 'Uploaded telemetry rows by outcome.', ['outcome'])
+
+
+def _request_endpoint() -> str:
+    # The route pattern, not the path, so job ids do not create a series each
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+
+
+@app.after_request
+def _record_request(response):
+    endpoint = _request_endpoint()
+    HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+    if 'request_started' in g:
+        HTTP_LATENCY.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+    return response
+
+
+@app.teardown_request
+def _finish_request(exc):
+    if g.pop('request_started', None) is not None:
+        HTTP_IN_FLIGHT.dec()
+
+
+# Rejected rows listed in an /upload response; the total count is always reported
+UPLOAD_REJECTS_REPORTED = 100
 
 @app.route('/')
 def index():
@@ -115,26 +169,69 @@ def index():
 
 @app.route('/upload', methods=['POST'])
 def upload():
-    """Handle Excel file upload."""
+    """Handle Excel file upload, ingesting valid rows chunk by chunk."""
     file = request.files.get('file')
     if file is None:
         return jsonify({"error": "No file uploaded"}), 400
 
+    content_hash = hash_stream(file.stream)
+    cached = None if _cache_bypassed() else upload_cache.get(content_hash)
+    if cached is not None:
+        return jsonify(dict(cached, cached=True))
+
+    inserted = updated = unchanged = rejected = 0
+    rejects = []
+    batch_id = new_batch_id()
     try:
-        # Process the Excel file using our handler
-        df = process_excel_file(file)
-        
-        # Update database (update existing or insert new records)
-        inserted, updated = update_or_insert_data(df)
-        
-        return jsonify({"message": "Upload successful", "inserted": inserted, "updated": updated})
+        # Each chunk is validated, normalized and upserted before the next is read
+        for batch, batch_rejects in iter_excel_batches(file):
+            if not batch.empty:
+                batch_inserted, batch_updated, batch_unchanged = update_or_insert_data(batch, batch_id=batch_id)
+                inserted += batch_inserted
+                updated += batch_updated
+                unchanged += batch_unchanged
+            rejected += len(batch_rejects)
+            rejects.extend(batch_rejects[:max(UPLOAD_REJECTS_REPORTED - len(rejects), 0)])
+
+        result = {
+            "message": "Upload successful",
+            "batch_id": batch_id,
+            "inserted": inserted,
+            "updated": updated,
+            "unchanged": unchanged,
+            "rejected": rejected,
+            "rejects": rejects,
+        }
+        for outcome in ('inserted', 'updated', 'unchanged', 'rejected'):
+            UPLOAD_ROWS.inc(result[outcome], outcome=outcome)
+        if rejected and not inserted + updated + unchanged:
+            del result["message"]
+            return jsonify(dict(result, error=f"No rows were accepted: all {rejected:,} rows were rejected")), 400
+        # A file with rejected rows is worth retrying after a fix elsewhere, so only clean results are reused
+        if not rejected:
+            upload_cache.put(content_hash, result)
+        return jsonify(dict(result, cached=False))
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        # Chunks upserted before the failure stay committed; report them under their batch_id
+        return jsonify({
+            "error": str(e),
+            "batch_id": batch_id,
+            "partial": inserted + updated > 0,
+            "inserted": inserted,
+            "updated": updated,
+            "unchanged": unchanged,
+            "rejected": rejected,
+            "rejects": rejects,
+        }), 400
 
 
 @app.route('/process', methods=['POST'])
 def start_processing():
-    """Start the four-phase workbook pipeline in a background thread."""
+    """Queue the four-phase workbook pipeline on the job manager's worker pool.
+
+    Send ``profile=1`` to profile the run; the stats are served at ``/profile/<job_id>``.
+    A profiled run skips the result and phase caches, so it measures the whole pipeline.
+    """
 
     required_fields = {
         'dms_file': request.files.get('dms_file'),
@@ -145,76 +242,174 @@ def start_processing():
     if missing:
         return jsonify({"error": f"Missing uploads: {', '.join(missing)}"}), 400
 
-    file_bytes = {}
-    for key, storage in required_fields.items():
-        content = storage.read()
-        if not content:
-            return jsonify({"error": f"Upload '{key}' is empty."}), 400
-        file_bytes[key] = content
-
-    with progress_lock:
-        if pipeline_state.get("overall_status") == "running":
-            return jsonify({"error": "A processing job is already running."}), 409
-        _reset_pipeline_state()
-        pipeline_state["overall_status"] = "running"
-        pipeline_state["started_at"] = datetime.utcnow().isoformat() + "Z"
-
-    def worker():
-        global processed_workbook_bytes
-        try:
-            output_buffer, filename = run_workbook_pipeline(
-                file_bytes['dms_file'],
-                file_bytes['rep_file'],
-                file_bytes['main_file'],
-                progress_callback=_update_progress,
-            )
-            with progress_lock:
-                processed_workbook_bytes = output_buffer.getvalue()
-                pipeline_state["download_ready"] = True
-                pipeline_state["overall_status"] = "completed"
-                pipeline_state["finished_at"] = datetime.utcnow().isoformat() + "Z"
-                pipeline_state["filename"] = filename
-                phase_four = pipeline_state["phases"].get("4")
-                if phase_four:
-                    phase_four.update(
-                        {
-                            "status": "done",
-                            "percent": 100,
-                            "processed_rows": 1,
-                            "total_rows": 1,
-                            "message": PHASE_LABELS["4"],
-                        }
-                    )
-        except Exception as exc:
-            _handle_pipeline_failure(exc)
-
-    Thread(target=worker, daemon=True).start()
-    return jsonify({"message": "Processing started"})
-
+    try:
+        job = job_manager.create_job()
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 429
 
-@app.route('/progress')
-def get_progress():
-    with progress_lock:
-        snapshot = copy.deepcopy(pipeline_state)
-    return jsonify(snapshot)
+    # Until the job is started or finished from cache, a failure must give back its queue slot
+    try:
+        # Spool uploads to the job's directory so the pipeline reads them from disk
+        input_paths = {}
+        input_hashes = []
+        for key, storage in required_fields.items():
+            path = job.spool_path(f"{key}.xlsx")
+            input_hashes.append((key, hash_stream(storage.stream, copy_to=path)))
+            size = os.path.getsize(path)
+            if not size or size > PIPELINE_MAX_UPLOAD_BYTES:
+                job_manager.discard(job)
+                if not size:
+                    return jsonify({"error": f"Upload '{key}' is empty."}), 400
+                return jsonify({"error": f"Upload '{key}' exceeds the {PIPELINE_MAX_UPLOAD_MB} MB limit."}), 413
+            input_paths[key] = path
+
+        cache_key = combine_hashes(input_hashes)
+        profiled_run = request.values.get('profile') == '1'
+        use_cache = not (_cache_bypassed() or profiled_run)
+        cached = process_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            output_path = job.spool_path('output.xlsx')
+            try:
+                shutil.copyfile(cached['path'], output_path)
+            except FileNotFoundError:
+                # Evicted since the lookup; run the pipeline as for a miss
+                cached = None
+        if cached is not None:
+            for path in input_paths.values():
+                os.remove(path)
+            job_manager.finish_from_cache(job, output_path, cached['filename'])
+            PIPELINE_JOBS.inc(outcome='cached')
+            return jsonify({"message": "Served from cache", "job_id": job.job_id, "cached": True})
+
+        pipeline = run_workbook_pipeline_in_process if PIPELINE_EXECUTION == 'process' else run_workbook_pipeline
+        job_phase_cache = phase_cache if use_cache else None
+        profile_path = job.spool_path('profile.pstats') if profiled_run else None
+
+        def runner(job):
+            try:
+                with collect_spans() as spans:
+                    output_path, filename = pipeline(
+                        input_paths['dms_file'],
+                        input_paths['rep_file'],
+                        input_paths['main_file'],
+                        progress_callback=job.update_progress,
+                        output=job.spool_path('output.xlsx'),
+                        phase_cache=job_phase_cache,
+                        profile_path=profile_path,
+                        output_mode=PIPELINE_OUTPUT_MODE,
+                        compress_level=PIPELINE_COMPRESS_LEVEL,
+                    )
+            except Exception:
+                PIPELINE_JOBS.inc(outcome='error')
+                raise
+            finally:
+                job.record_timings(spans)
+                # Only the output needs to outlive the run
+                for path in input_paths.values():
+                    os.remove(path)
+            if profile_path and os.path.exists(profile_path):
+                job.record_profile(profile_path)
+            process_cache.put(cache_key, {"filename": filename}, path=output_path)
+            job.mark_completed(output_path, filename)
+            PIPELINE_JOBS.inc(outcome='completed')
+
+        job_manager.start(job, runner)
+    except BaseException:
+        job_manager.discard(job)
+        raise
+    return jsonify({"message": "Processing queued", "job_id": job.job_id, "cached": False})
+
+
+@app.route('/progress', defaults={'job_id': None})
+@app.route('/progress/<job_id>')
+def get_progress(job_id):
+    """Return the progress of a job; without an id there is nothing to report."""
+    if job_id is None:
+        # Other clients' jobs are only reachable by their id
+        return jsonify({"overall_status": "idle", "download_ready": False, "error": None, "phases": {}})
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job."}), 404
+    return jsonify(job.snapshot())
+
+
+SSE_KEEPALIVE_SECONDS = 15
+
+
+@app.route('/progress/<job_id>/events')
+def stream_progress(job_id):
+    """Push a job's progress as Server-Sent Events, sending only changed phases."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job."}), 404
+
+    def events():
+        version = -1
+        while True:
+            version, update = job.wait_for_changes(version, timeout=SSE_KEEPALIVE_SECONDS)
+            if update is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"data: {json.dumps(update)}\n\n"
+            if update["overall_status"] in FINISHED_STATUSES:
+                break
+
+    return Response(
+        events(),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
-@app.route('/download')
-def download_processed_workbook():
-    with progress_lock:
-        if not pipeline_state.get("download_ready") or not processed_workbook_bytes:
-            return jsonify({"error": "No processed workbook is ready yet."}), 400
-        filename = pipeline_state.get("filename") or "Consolidated_MAIN.xlsx"
-        payload = processed_workbook_bytes
-    buffer = BytesIO(payload)
-    buffer.seek(0)
+@app.route('/download', defaults={'job_id': None})
+@app.route('/download/<job_id>')
+def download_processed_workbook(job_id):
+    if job_id is None:
+        return jsonify({"error": "Download a workbook by its job id: /download/<job_id>."}), 400
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job."}), 404
+    snapshot = job.snapshot()
+    result_path = job.result_path
+    if not snapshot.get("download_ready") or not result_path or not os.path.exists(result_path):
+        return jsonify({"error": "No processed workbook is ready yet."}), 400
+    filename = snapshot.get("filename") or "Consolidated_MAIN.xlsx"
     return send_file(
-        buffer,
+        result_path,
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         as_attachment=True,
         download_name=filename,
     )
 
+PROFILE_TEXT_LINES = 40
+PROFILE_SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+
+@app.route('/profile/<job_id>')
+def download_profile(job_id):
+    """Return a profiled job's cProfile stats, or the top functions as text with ``?format=text``."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job."}), 404
+    if not job.profile_path or not os.path.exists(job.profile_path):
+        return jsonify({"error": "This job was not profiled; queue it with profile=1."}), 404
+    if request.args.get('format') == 'text':
+        report = io.StringIO()
+        stats = pstats.Stats(job.profile_path, stream=report)
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in PROFILE_SORT_KEYS:
+            return jsonify({"error": f"sort must be one of: {', '.join(PROFILE_SORT_KEYS)}"}), 400
+        stats.sort_stats(sort).print_stats(PROFILE_TEXT_LINES)
+        return Response(report.getvalue(), mimetype='text/plain')
+    return send_file(job.profile_path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{job_id}.pstats")
+
+
+@app.route('/metrics')
+def metrics():
+    """Expose request, pipeline, upload and span metrics for Prometheus."""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/raw_data')
 def raw_data():
     """Display raw data page."""
@@ -222,28 +417,200 @@ def raw_data():
 
 @app.route('/dashboard')
 def dashboard():
-    """Dashboard placeholder page."""
+    """Display dashboard page."""
     return render_template('pages/dashboard.html')
 
+# Devices not sighted for more than this many days count as stale on the dashboard
+DASHBOARD_STALE_DAYS = int(os.getenv('DASHBOARD_STALE_DAYS', '30'))
+
+@app.route('/dashboard/data')
+def dashboard_data():
+    """Return the precomputed dashboard aggregates."""
+    try:
+        stale_days = max(int(request.args.get('stale_days', DASHBOARD_STALE_DAYS)), 0)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(get_dashboard_summary(stale_days=stale_days))
+
 @app.route('/alerts')
 def alerts():
-    """Alerts placeholder page; supply minimal context to render the template."""
-    return render_template('pages/alerts.html', alerts={"soft": [], "urgent": []}, devices=[])
+    """Display the active alerts."""
+    active = get_active_alerts()
+    grouped = {level: [a['Device_ID'] for a in active if a['level'] == level] for level in ('soft', 'urgent')}
+    return render_template('pages/alerts.html', alerts=grouped, devices=active)
+
+@app.route('/alerts/data')
+def alerts_data():
+    """Return the active alerts, optionally for one level."""
+    try:
+        return jsonify({"alerts": get_active_alerts(request.args.get('level') or None)})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/alerts/rules', methods=['GET', 'POST'])
+def alert_rules():
+    """List the staleness thresholds, or set the thresholds for one Location_Code."""
+    if request.method == 'POST':
+        payload = request.get_json(silent=True) or request.form
+        try:
+            set_alert_rule(payload.get('Location_Code'), payload.get('soft_days'), payload.get('urgent_days'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify({"rules": get_alert_rules()})
+
+@app.route('/alerts/rules/<path:location_code>', methods=['DELETE'])
+def remove_alert_rule(location_code):
+    """Drop a Location_Code's thresholds so the fallback rule applies."""
+    try:
+        delete_alert_rule(location_code)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"rules": get_alert_rules()})
+
+@app.route('/alerts/notify', methods=['POST'])
+def notify_alerts():
+    """Queue an email digest of the devices with active alerts."""
+    refresh_alerts()
+    result = send_alert([a['Device_ID'] for a in get_active_alerts()])
+    return jsonify(dict(result, dispatch=alert_dispatcher.stats())), (202 if result['ok'] else 200)
+
+DATA_PAGE_SIZE = 100
+DATA_MAX_PAGE_SIZE = 1000
 
 @app.route('/data')
 def data():
-    """Return all data for the raw data table."""
-    df = get_all_data()
-    return jsonify(df.to_dict(orient='records'))
+    """Return one filtered, sorted page of the raw data table.
+
+    Send the previous page's ``next_cursor`` as ``after`` to page by key, and the
+    first page's ``total`` back as ``total`` so later pages skip the count.
+    """
+    args = request.args
+    try:
+        limit = min(max(int(args.get('limit', DATA_PAGE_SIZE)), 1), DATA_MAX_PAGE_SIZE)
+        offset = max(int(args.get('offset', 0)), 0)
+        after = json.loads(args['after']) if args.get('after') else None
+        known_total = int(args['total']) if args.get('total') else None
+        rows, total, next_cursor = query_data(
+            device=args.get('device', '').strip(),
+            location=args.get('location', '').strip(),
+            location_code=args.get('location_code', '').strip(),
+            date_type=args.get('date_type', 'on'),
+            date=args.get('date', '').strip(),
+            sort=args.get('sort', 'Device_ID'),
+            direction=args.get('dir', 'asc'),
+            limit=limit,
+            offset=offset,
+            after=after,
+            count=known_total is None,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if total is None:
+        total = known_total
+    return jsonify({
+        "data": rows,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "next_cursor": next_cursor,
+        "last_page": max((total + limit - 1) // limit, 1),
+    })
+
+@app.route('/history')
+def history():
+    """Return one page of the change log, optionally for a single batch or device."""
+    args = request.args
+    try:
+        limit = min(max(int(args.get('limit', DATA_PAGE_SIZE)), 1), DATA_MAX_PAGE_SIZE)
+        offset = max(int(args.get('offset', 0)), 0)
+        rows, total = query_history(
+            batch_id=args.get('batch_id', '').strip(),
+            device=args.get('device', '').strip(),
+            change_type=args.get('change_type', '').strip(),
+            limit=limit,
+            offset=offset,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "data": rows,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "last_page": max((total + limit - 1) // limit, 1),
+    })
+
+@app.route('/history/batches')
+def history_batches():
+    """Return the most recent upload batches with their insert/update counts."""
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), DATA_MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"batches": list_batches(limit)})
+
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _ndjson_chunks(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(TELEMETRY_COLUMNS, row))))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(TELEMETRY_COLUMNS)
+    for idx, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if idx % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@app.route('/export/<fmt>')
+def export_data(fmt):
+    """Stream the whole telemetry table as NDJSON or CSV without buffering it."""
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"error": f"Unsupported export format: {fmt}"}), 400
+
+    rows = iter_data(chunk_size=EXPORT_CHUNK_ROWS)
+    chunks = _ndjson_chunks(rows) if fmt == 'ndjson' else _csv_chunks(rows)
+    headers = {"Content-Disposition": f"attachment; filename=telemetry.{fmt}", "Vary": "Accept-Encoding"}
+    use_gzip = request.args.get('gzip') == '1' or 'gzip' in request.headers.get('Accept-Encoding', '')
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        chunks = _gzip_chunks(chunks)
+    return Response(chunks, mimetype=EXPORT_MIMETYPES[fmt], headers=headers)
 
 @app.route('/clear_database', methods=['POST'])
 def clear_database():
     """Clear all data from the database."""
     try:
-        conn = sqlite3.connect('data.db')
-        conn.execute('DELETE FROM telemetry')
-        conn.commit()
-        conn.close()
+        clear_data()
+        # Cached upload results no longer describe what the database holds
+        upload_cache.clear()
         return jsonify({"message": "Database cleared successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -255,7 +622,7 @@ def update_database():
         df = get_all_data()
         # Here you would implement logic to update missing data
         # For demonstration, we will just re-insert the same data
-        inserted, updated = update_or_insert_data(df)
+        inserted, updated, _ = update_or_insert_data(df)
         return jsonify({"message": "Database updated successfully", "inserted": inserted, "updated": updated})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import BinaryIO, Iterable, Optional
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def hash_stream(stream: BinaryIO, copy_to: Optional[str] = None) -> str:
+    """Return the SHA-256 hex digest of ``stream``, optionally copying it to ``copy_to``.
+
+    The stream is rewound afterwards so it can be read again.
+    """
+    digest = hashlib.sha256()
+    target = open(copy_to, 'wb') if copy_to else None
+    try:
+        while True:
+            chunk = stream.read(HASH_CHUNK_BYTES)
+            if not chunk:
+                break
+            digest.update(chunk)
+            if target:
+                target.write(chunk)
+    finally:
+        if target:
+            target.close()
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def combine_hashes(labelled_hashes: Iterable[tuple]) -> str:
+    """Hash several ``(label, digest)`` pairs into one key, e.g. a DMS/rep/MAIN triple."""
+    digest = hashlib.sha256()
+    for label, value in labelled_hashes:
+        digest.update(f"{label}={value};".encode())
+    return digest.hexdigest()
+
+
+class ContentCache:
+    """Content-addressed result cache with age- and size-based eviction.
+
+    Entries older than ``max_age`` seconds are dropped, and the least recently used
+    entries are dropped beyond ``max_entries`` or ``max_bytes``. When ``directory``
+    is set, :meth:`put` can take a file that the cache keeps its own copy of.
+    """
+
+    def __init__(self, max_age: float, max_entries: int, max_bytes: Optional[int] = None,
+                 directory: Optional[str] = None):
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = Lock()
+        # key -> (stored_at, size, value, path)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str):
+        """Return the cached value for ``key`` (with its ``path`` if it has a file)."""
+        with self._lock:
+            self._evict_locked()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            _, _, value, path = entry
+            if path and not os.path.exists(path):
+                del self._entries[key]
+                return None
+            return dict(value, path=path) if path else value
+
+    def put(self, key: str, value, path: Optional[str] = None):
+        """Store ``value`` under ``key``; ``path`` is copied into the cache directory."""
+        size = 0
+        cached_path = None
+        if path:
+            if not self.directory:
+                raise ValueError("This cache has no directory for files.")
+            cached_path = os.path.join(self.directory, f"{key}{os.path.splitext(path)[1]}")
+            # Stage under a unique name: the old entry for ``key`` owns cached_path until it is dropped
+            handle, staged_path = tempfile.mkstemp(dir=self.directory, prefix=f"{key}.", suffix='.partial')
+            os.close(handle)
+            try:
+                _link_or_copy(path, staged_path)
+                size = os.path.getsize(staged_path)
+            except BaseException:
+                _remove_quietly(staged_path)
+                raise
+        with self._lock:
+            self._drop_locked(key)
+            if cached_path:
+                os.replace(staged_path, cached_path)
+            self._entries[key] = (time.monotonic(), size, value, cached_path)
+            self._evict_locked()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop_locked(key)
+
+    def _drop_locked(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry and entry[3] and os.path.exists(entry[3]):
+            os.remove(entry[3])
+
+    def _evict_locked(self):
+        now = time.monotonic()
+        for key, (stored_at, _, _, _) in list(self._entries.items()):
+            if now - stored_at > self.max_age:
+                self._drop_locked(key)
+        # Front of the OrderedDict is least recently used
+        while len(self._entries) > self.max_entries:
+            self._drop_locked(next(iter(self._entries)))
+        if self.max_bytes is not None:
+            while self._entries and sum(entry[1] for entry in self._entries.values()) > self.max_bytes:
+                self._drop_locked(next(iter(self._entries)))
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _link_or_copy(source: str, destination: str):
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
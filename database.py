@@ -1,10 +1,118 @@
+import calendar
+import os
+import queue
 import sqlite3
+import time
+import uuid
+from datetime import date, datetime
 import pandas as pd
 
+from metrics import timed
+
+TELEMETRY_COLUMNS = ['Device_ID', 'Last_Sighted_Date', 'Last_Sighted_Location', 'Location_Code']
+# Sortable columns exposed to the raw data page, mapped to the column SQLite orders by
+SORT_COLUMNS = {
+    'Device_ID': 'Device_ID',
+    'Last_Sighted_Date': 'Last_Sighted_Epoch',
+    'Last_Sighted_Location': 'Last_Sighted_Location',
+    'Location_Code': 'Location_Code',
+}
+CANONICAL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Dashboard dimensions kept in telemetry_summary, mapped to the SQL for their key
+SUMMARY_DIMENSIONS = {
+    'location': "COALESCE({prefix}Last_Sighted_Location, '')",
+    'location_code': "COALESCE({prefix}Location_Code, '')",
+    'sighted_day': "COALESCE(date({prefix}Last_Sighted_Epoch, 'unixepoch'), '')",
+}
+# (label, min days, max days) bands for the days-since-last-sighting breakdown
+SIGHTING_AGE_BANDS = [
+    ('0-7 days', 0, 7),
+    ('8-30 days', 8, 30),
+    ('31-90 days', 31, 90),
+    ('90+ days', 91, None),
+]
+# Alert rule that applies to Location_Codes without a rule of their own
+DEFAULT_ALERT_RULE = '*'
+ALERT_COLUMNS = ['Device_ID', 'level', 'Location_Code', 'Last_Sighted_Location', 'Last_Sighted_Date',
+                 'Last_Sighted_Epoch', 'raised_at']
+HISTORY_COLUMNS = ['id', 'batch_id', 'Device_ID', 'change_type',
+                   'old_Last_Sighted_Date', 'old_Last_Sighted_Location', 'old_Location_Code',
+                   'new_Last_Sighted_Date', 'new_Last_Sighted_Location', 'new_Location_Code',
+                   'changed_at']
+
+# SQLite file used by every function here; relative paths resolve against the working directory
+DATABASE_PATH = os.getenv('DATABASE_PATH', 'data.db')
+# Idle connections kept open for reuse; extra ones are closed when released
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', '30'))
+DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+DB_CACHE_MB = int(os.getenv('DB_CACHE_MB', '64'))
+DB_MMAP_MB = int(os.getenv('DB_MMAP_MB', '256'))
+
+_idle_connections = queue.LifoQueue()
+
+class _PooledConnection(sqlite3.Connection):
+    # Remembers which file it was opened on so a path change retires it
+    database_path = None
+
+def set_database_path(path):
+    """Point every later call at ``path``, closing pooled connections to the old file."""
+    global DATABASE_PATH
+    DATABASE_PATH = os.fspath(path)
+    close_connections()
+
+def connect():
+    """Borrow a connection from the pool (or open one); hand it back with :func:`release`.
+
+    Connections run in WAL mode, so readers keep working while an upload writes,
+    and may be used from any thread as long as only one thread uses them at a time.
+    """
+    while True:
+        try:
+            conn = _idle_connections.get_nowait()
+        except queue.Empty:
+            break
+        if conn.database_path == DATABASE_PATH:
+            return conn
+        conn.close()
+
+    conn = sqlite3.connect(DATABASE_PATH, timeout=DB_BUSY_TIMEOUT, check_same_thread=False,
+                           factory=_PooledConnection)
+    conn.database_path = DATABASE_PATH
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA synchronous={DB_SYNCHRONOUS}')
+    # Negative cache_size is in KiB
+    conn.execute(f'PRAGMA cache_size={-DB_CACHE_MB * 1024}')
+    conn.execute(f'PRAGMA mmap_size={DB_MMAP_MB * 1024 * 1024}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+def release(conn):
+    """Return a connection from :func:`connect` to the pool, discarding unfinished work."""
+    if conn.in_transaction:
+        conn.rollback()
+    if conn.database_path != DATABASE_PATH or _idle_connections.qsize() >= DB_POOL_SIZE:
+        conn.close()
+        return
+    _idle_connections.put(conn)
+
+def close_connections():
+    """Close every idle pooled connection."""
+    while True:
+        try:
+            _idle_connections.get_nowait().close()
+        except queue.Empty:
+            return
+
 def init_db():
-    """Initialize database with correct schema."""
-    conn = sqlite3.connect('data.db')
-    
+    """Initialize database and upgrade it to the latest schema version."""
+    conn = connect()
+    try:
+        apply_migrations(conn)
+    finally:
+        release(conn)
+
+def _migrate_create_telemetry(conn):
     # Create telemetry table for device data
     conn.execute('''CREATE TABLE IF NOT EXISTS telemetry
                    (Device_ID TEXT,
@@ -12,35 +120,437 @@ def init_db():
                     Last_Sighted_Location TEXT,
                     Location_Code TEXT,
                     PRIMARY KEY (Device_ID))''')
-    
+
+def _migrate_add_epoch_and_indexes(conn):
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(telemetry)')}
+    if 'Last_Sighted_Epoch' not in columns:
+        conn.execute('ALTER TABLE telemetry ADD COLUMN Last_Sighted_Epoch INTEGER')
+
+    # Backfill from the free-form text dates stored by earlier versions
+    existing = pd.read_sql('SELECT Device_ID, Last_Sighted_Date FROM telemetry', conn)
+    if not existing.empty:
+        epochs = to_epoch_seconds(existing['Last_Sighted_Date'])
+        conn.executemany(
+            'UPDATE telemetry SET Last_Sighted_Epoch = ? WHERE Device_ID = ?',
+            [(epoch, device_id) for epoch, device_id in zip(epochs, existing['Device_ID'])],
+        )
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_telemetry_epoch ON telemetry (Last_Sighted_Epoch)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_telemetry_location ON telemetry (Last_Sighted_Location)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_telemetry_location_code ON telemetry (Location_Code)')
+
+def _migrate_create_history(conn):
+    # Append-only log of every insert/update applied by an upload batch
+    conn.execute('''CREATE TABLE IF NOT EXISTS telemetry_history
+                   (id INTEGER PRIMARY KEY,
+                    batch_id TEXT NOT NULL,
+                    Device_ID TEXT NOT NULL,
+                    change_type TEXT NOT NULL,
+                    old_Last_Sighted_Date TEXT,
+                    old_Last_Sighted_Location TEXT,
+                    old_Location_Code TEXT,
+                    old_Last_Sighted_Epoch INTEGER,
+                    new_Last_Sighted_Date TEXT,
+                    new_Last_Sighted_Location TEXT,
+                    new_Location_Code TEXT,
+                    new_Last_Sighted_Epoch INTEGER,
+                    changed_at TEXT NOT NULL)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_history_batch ON telemetry_history (batch_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_history_device ON telemetry_history (Device_ID)')
+
+def _migrate_create_summary(conn):
+    # Device counts per dashboard dimension value, kept in step with telemetry by the upserts
+    conn.execute('''CREATE TABLE IF NOT EXISTS telemetry_summary
+                   (dimension TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    devices INTEGER NOT NULL,
+                    PRIMARY KEY (dimension, key))''')
+    rebuild_summary(conn)
+
+def _migrate_create_alerts(conn):
+    # Staleness thresholds (in days) per Location_Code; '*' is the fallback rule
+    conn.execute('''CREATE TABLE IF NOT EXISTS alert_rules
+                   (Location_Code TEXT PRIMARY KEY,
+                    soft_days INTEGER NOT NULL,
+                    urgent_days INTEGER NOT NULL,
+                    CHECK (soft_days >= 0 AND urgent_days >= soft_days))''')
+    conn.execute('INSERT OR IGNORE INTO alert_rules VALUES (?, 14, 30)', (DEFAULT_ALERT_RULE,))
+    # Currently active alerts, one per device
+    conn.execute('''CREATE TABLE IF NOT EXISTS alerts
+                   (Device_ID TEXT PRIMARY KEY,
+                    level TEXT NOT NULL,
+                    Location_Code TEXT,
+                    Last_Sighted_Location TEXT,
+                    Last_Sighted_Date TEXT,
+                    Last_Sighted_Epoch INTEGER,
+                    raised_at TEXT NOT NULL)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_alerts_level ON alerts (level, Last_Sighted_Epoch)')
+    # When alerts were last brought up to date, so the next pass only sweeps the time since
+    conn.execute('''CREATE TABLE IF NOT EXISTS alert_state
+                   (id INTEGER PRIMARY KEY CHECK (id = 1),
+                    evaluated_epoch INTEGER)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_telemetry_code_epoch ON telemetry (Location_Code, Last_Sighted_Epoch)')
+    _rebuild_alerts(conn.cursor(), _sighting_clock())
+
+def _migrate_add_paging_indexes(conn):
+    # Sort column plus Device_ID, matching /data's ORDER BY and its keyset cursor
+    for column, name in (('Last_Sighted_Epoch', 'epoch'), ('Last_Sighted_Location', 'location'),
+                         ('Location_Code', 'location_code')):
+        conn.execute(f'DROP INDEX IF EXISTS idx_telemetry_{name}')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_telemetry_{name}_sort ON telemetry ({column}, Device_ID)')
+    # LIKE is case-insensitive, so prefix filters can only use NOCASE indexes
+    for column, name in (('Device_ID', 'device'), ('Last_Sighted_Location', 'location'),
+                         ('Location_Code', 'location_code')):
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_telemetry_{name}_nocase ON telemetry ({column} COLLATE NOCASE)')
+
+SEARCH_COLUMNS = ['Device_ID', 'Last_Sighted_Location', 'Location_Code']
+
+def _migrate_create_search_index(conn):
+    # Trigram full-text index behind the /data substring filters, kept in step with telemetry by triggers
+    for name in ('device', 'location', 'location_code'):
+        conn.execute(f'DROP INDEX IF EXISTS idx_telemetry_{name}_nocase')
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+    try:
+        conn.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS telemetry_search
+                        USING fts5({columns}, content='telemetry', content_rowid='rowid', tokenize='trigram')""")
+    except sqlite3.OperationalError:
+        # No FTS5 trigram tokenizer (SQLite before 3.34): substring filters scan telemetry instead
+        return
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS telemetry_search_insert AFTER INSERT ON telemetry BEGIN
+                        INSERT INTO telemetry_search (rowid, {columns}) VALUES (new.rowid, {new_values});
+                    END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS telemetry_search_delete AFTER DELETE ON telemetry BEGIN
+                        INSERT INTO telemetry_search (telemetry_search, rowid, {columns})
+                        VALUES ('delete', old.rowid, {old_values});
+                    END""")
+    changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in SEARCH_COLUMNS)
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS telemetry_search_update AFTER UPDATE ON telemetry
+                    WHEN {changed} BEGIN
+                        INSERT INTO telemetry_search (telemetry_search, rowid, {columns})
+                        VALUES ('delete', old.rowid, {old_values});
+                        INSERT INTO telemetry_search (rowid, {columns}) VALUES (new.rowid, {new_values});
+                    END""")
+    conn.execute("INSERT INTO telemetry_search (telemetry_search) VALUES ('rebuild')")
+
+def _migrate_normalize_float_device_ids(conn):
+    # Earlier uploads stored Excel's float IDs as text ("11592.0"); uploads now store "11592"
+    float_ids = [row[0] for row in conn.execute(
+        "SELECT Device_ID FROM telemetry WHERE Device_ID GLOB '[0-9]*.0' "
+        "AND substr(Device_ID, 1, length(Device_ID) - 2) NOT GLOB '*[^0-9]*'"
+    )]
+    if not float_ids:
+        return
+    now = _sighting_clock()
+    for float_id in float_ids:
+        device_id = float_id[:-2]
+        existing = conn.execute(
+            'SELECT COALESCE(Last_Sighted_Epoch, -1) FROM telemetry WHERE Device_ID = ?', (device_id,)
+        ).fetchone()
+        if existing is None:
+            conn.execute('UPDATE telemetry SET Device_ID = ? WHERE Device_ID = ?', (device_id, float_id))
+        else:
+            # Both spellings were uploaded: keep the newer sighting under the integer ID
+            float_epoch = conn.execute(
+                'SELECT COALESCE(Last_Sighted_Epoch, -1) FROM telemetry WHERE Device_ID = ?', (float_id,)
+            ).fetchone()[0]
+            if float_epoch > existing[0]:
+                conn.execute('DELETE FROM telemetry WHERE Device_ID = ?', (device_id,))
+                conn.execute('UPDATE telemetry SET Device_ID = ? WHERE Device_ID = ?', (device_id, float_id))
+            else:
+                conn.execute('DELETE FROM telemetry WHERE Device_ID = ?', (float_id,))
+        conn.execute('UPDATE telemetry_history SET Device_ID = ? WHERE Device_ID = ?', (device_id, float_id))
+        conn.execute('DELETE FROM alerts WHERE Device_ID IN (?, ?)', (device_id, float_id))
+        conn.execute(_alert_upsert_sql('t.Device_ID = :device'), {'device': device_id, 'now': now})
+    rebuild_summary(conn)
+
+# Ordered (version, description, migration) steps; append new ones, never edit old ones
+MIGRATIONS = [
+    (1, 'create telemetry table', _migrate_create_telemetry),
+    (2, 'add Last_Sighted_Epoch column and location/date indexes', _migrate_add_epoch_and_indexes),
+    (3, 'create telemetry_history change log', _migrate_create_history),
+    (4, 'create telemetry_summary dashboard aggregates', _migrate_create_summary),
+    (5, 'create alert rules and active alerts tables', _migrate_create_alerts),
+    (6, 'add sort and case-insensitive filter indexes for /data paging', _migrate_add_paging_indexes),
+    (7, 'create trigram search index for /data substring filters', _migrate_create_search_index),
+    (8, 'store float-formatted device IDs as integers', _migrate_normalize_float_device_ids),
+]
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for an unversioned database)."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_version'"
+    ).fetchone()
+    if not exists:
+        return 0
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+def apply_migrations(conn):
+    """Apply pending migrations in order, each in its own transaction.
+
+    Returns the list of versions that were applied.
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                   (version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TEXT)''')
     conn.commit()
-    conn.close()
+    current = get_schema_version(conn)
+    applied = []
+    for version, description, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            # sqlite3 commits DDL as it runs unless a transaction is already open, so open one
+            # explicitly; IMMEDIATE also keeps a second process from running the same step
+            conn.execute('BEGIN IMMEDIATE')
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migration(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, datetime('now'))",
+                (version, description),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
 
-def update_or_insert_data(df):
-    """Update existing records or insert new ones based on Device_ID."""
-    conn = sqlite3.connect('data.db')
-    
+def to_epoch_seconds(dates):
+    """Parse a Series of dates into integer Unix seconds (None where unparseable)."""
+    return _epoch_seconds(_parse_dates(dates))
+
+def _parse_dates(dates):
+    return pd.to_datetime(pd.Series(dates, dtype=object), errors='coerce', format='mixed')
+
+def _epoch_seconds(parsed):
+    seconds = (parsed - pd.Timestamp('1970-01-01')) // pd.Timedelta(seconds=1)
+    return [None if pd.isna(value) else int(value) for value in seconds]
+
+def _sighting_clock():
+    """Now, on the same scale as Last_Sighted_Epoch.
+
+    Sighting dates are naive local times and their epochs treat them as UTC,
+    so the current time is read the same way: local wall-clock time as if UTC.
+    """
+    return calendar.timegm(time.localtime())
+
+def new_batch_id():
+    """Return an id for one upload; pass it to every chunk of that upload."""
+    return uuid.uuid4().hex
+
+@timed('db.upsert')
+def update_or_insert_data(df, batch_id=None):
+    """Bulk upsert a telemetry DataFrame in a single transaction.
+
+    Rows are loaded into a temporary staging table, collapsed to the most recent
+    sighting per Device_ID, counted against ``telemetry`` and then applied with one
+    ``INSERT ... ON CONFLICT DO UPDATE`` statement. The net change per device is
+    logged to ``telemetry_history`` under ``batch_id`` in the same transaction.
+    Returns ``(inserted, updated, unchanged)`` counted per input row exactly as
+    :func:`update_or_insert_data_row_by_row` counts them: a repeated device's
+    later rows are updates when they are newer than every earlier sighting.
+    """
+    staging_rows = _build_staging_rows(df)
+    batch_id = batch_id or new_batch_id()
+
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('DROP TABLE IF EXISTS temp.telemetry_staging')
+        cursor.execute('''
+            CREATE TEMP TABLE telemetry_staging
+            (seq INTEGER PRIMARY KEY,
+             Device_ID TEXT,
+             Last_Sighted_Date TEXT,
+             Last_Sighted_Location TEXT,
+             Location_Code TEXT,
+             Last_Sighted_Epoch INTEGER)
+        ''')
+        cursor.executemany('''
+            INSERT INTO telemetry_staging
+            (seq, Device_ID, Last_Sighted_Date, Last_Sighted_Location, Location_Code, Last_Sighted_Epoch)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', staging_rows)
+        inserted, updated = _count_changes(cursor)
+
+        # Keep one row per device: the latest valid date wins, file order breaks ties
+        cursor.execute('''
+            DELETE FROM telemetry_staging
+            WHERE seq NOT IN (
+                SELECT seq FROM (
+                    SELECT seq, ROW_NUMBER() OVER (
+                        PARTITION BY Device_ID
+                        ORDER BY Last_Sighted_Epoch IS NULL, Last_Sighted_Epoch DESC, seq ASC
+                    ) AS pick
+                    FROM telemetry_staging
+                ) WHERE pick = 1
+            )
+        ''')
+
+        # A row with an unparseable date can never replace an existing sighting;
+        # existing sightings without a parseable date are always replaced
+        cursor.execute('''
+            DELETE FROM telemetry_staging
+            WHERE Last_Sighted_Epoch IS NULL
+              AND Device_ID IN (SELECT Device_ID FROM telemetry)
+        ''')
+
+        # Log the changes (with the values they replace) before applying them
+        history_mark = _history_watermark(cursor)
+        changed_at = cursor.execute("SELECT datetime('now')").fetchone()[0]
+        cursor.execute('''
+            INSERT INTO telemetry_history
+            (batch_id, Device_ID, change_type,
+             new_Last_Sighted_Date, new_Last_Sighted_Location, new_Location_Code, new_Last_Sighted_Epoch,
+             changed_at)
+            SELECT ?, s.Device_ID, 'insert',
+                   s.Last_Sighted_Date, s.Last_Sighted_Location, s.Location_Code, s.Last_Sighted_Epoch, ?
+            FROM telemetry_staging s
+            WHERE NOT EXISTS (SELECT 1 FROM telemetry t WHERE t.Device_ID = s.Device_ID)
+            ORDER BY s.seq
+        ''', (batch_id, changed_at))
+        cursor.execute('''
+            INSERT INTO telemetry_history
+            (batch_id, Device_ID, change_type,
+             old_Last_Sighted_Date, old_Last_Sighted_Location, old_Location_Code, old_Last_Sighted_Epoch,
+             new_Last_Sighted_Date, new_Last_Sighted_Location, new_Location_Code, new_Last_Sighted_Epoch,
+             changed_at)
+            SELECT ?, s.Device_ID, 'update',
+                   t.Last_Sighted_Date, t.Last_Sighted_Location, t.Location_Code, t.Last_Sighted_Epoch,
+                   s.Last_Sighted_Date, s.Last_Sighted_Location, s.Location_Code, s.Last_Sighted_Epoch, ?
+            FROM telemetry_staging s
+            JOIN telemetry t ON t.Device_ID = s.Device_ID
+            WHERE t.Last_Sighted_Epoch IS NULL
+               OR s.Last_Sighted_Epoch > t.Last_Sighted_Epoch
+            ORDER BY s.seq
+        ''', (batch_id, changed_at))
+
+        cursor.execute('''
+            INSERT INTO telemetry
+            (Device_ID, Last_Sighted_Date, Last_Sighted_Location, Location_Code, Last_Sighted_Epoch)
+            SELECT Device_ID, Last_Sighted_Date, Last_Sighted_Location, Location_Code, Last_Sighted_Epoch
+            FROM telemetry_staging
+            WHERE true
+            ORDER BY seq
+            ON CONFLICT(Device_ID) DO UPDATE SET
+                Last_Sighted_Date = excluded.Last_Sighted_Date,
+                Last_Sighted_Location = excluded.Last_Sighted_Location,
+                Location_Code = excluded.Location_Code,
+                Last_Sighted_Epoch = excluded.Last_Sighted_Epoch
+            WHERE telemetry.Last_Sighted_Epoch IS NULL
+               OR excluded.Last_Sighted_Epoch > telemetry.Last_Sighted_Epoch
+        ''')
+        _apply_summary_changes(cursor, history_mark)
+        _evaluate_alerts(cursor, history_mark)
+        cursor.execute('DROP TABLE temp.telemetry_staging')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release(conn)
+
+    return inserted, updated, len(staging_rows) - inserted - updated
+
+def _count_changes(cursor):
+    """Count ``(inserted, updated)`` staging rows as if applied one at a time in file order.
+
+    A row inserts when its device is neither stored nor seen earlier in the
+    batch, and updates when its date parses and is later than every earlier
+    date for the device (or none of those dates parsed).
+    """
+    inserted, updated = cursor.execute('''
+        SELECT COALESCE(SUM(is_new), 0),
+               COALESCE(SUM(NOT is_new AND epoch IS NOT NULL AND (latest IS NULL OR epoch > latest)), 0)
+        FROM (
+            SELECT s.Last_Sighted_Epoch AS epoch,
+                   t.Device_ID IS NULL AND s.earlier_rows = 0 AS is_new,
+                   -- MAX() of two values is NULL when either is, so fill each from the other
+                   MAX(COALESCE(t.Last_Sighted_Epoch, s.earlier_latest),
+                       COALESCE(s.earlier_latest, t.Last_Sighted_Epoch)) AS latest
+            FROM (
+                SELECT Device_ID, Last_Sighted_Epoch,
+                       COUNT(*) OVER earlier AS earlier_rows,
+                       MAX(Last_Sighted_Epoch) OVER earlier AS earlier_latest
+                FROM telemetry_staging
+                WINDOW earlier AS (PARTITION BY Device_ID ORDER BY seq
+                                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+            ) s
+            LEFT JOIN telemetry t ON t.Device_ID = s.Device_ID
+        )
+    ''').fetchone()
+    return inserted, updated
+
+def _build_staging_rows(df):
+    """Return staging tuples with dates parsed once per column, not once per row."""
+    frame = df[TELEMETRY_COLUMNS].reset_index(drop=True)
+    parsed = _parse_dates(frame['Last_Sighted_Date'])
+    # Store parsed dates in canonical form alongside their epoch seconds
+    dates = frame['Last_Sighted_Date'].astype(object).where(
+        parsed.isna(), parsed.dt.strftime(CANONICAL_DATE_FORMAT)
+    )
+    frame = frame.assign(Last_Sighted_Date=dates).astype(object)
+    frame = frame.where(frame.notna(), None)
+    epochs = _epoch_seconds(parsed)
+
+    return [
+        (seq, device_id, date, location, code, epoch)
+        for seq, ((device_id, date, location, code), epoch) in enumerate(
+            zip(frame.itertuples(index=False, name=None), epochs)
+        )
+    ]
+
+@timed('db.upsert_row_by_row')
+def update_or_insert_data_row_by_row(df, batch_id=None):
+    """Update existing records or insert new ones based on Device_ID.
+
+    Reference implementation for :func:`update_or_insert_data`; issues one SELECT
+    and one UPDATE/INSERT (plus one history row) per changed row.
+    """
+    batch_id = batch_id or new_batch_id()
+    conn = connect()
+    try:
+        inserted, updated, unchanged = _upsert_row_by_row(conn, df, batch_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release(conn)
+
+    return inserted, updated, unchanged
+
+def _upsert_row_by_row(conn, df, batch_id):
     # Convert DataFrame to list of tuples for batch processing
     records = df.to_records(index=False)
     
     # For each record, update if exists (and new date is more recent) or insert if new
     cursor = conn.cursor()
+    history_mark = _history_watermark(cursor)
     inserted = 0
     updated = 0
+    unchanged = 0
     for record in records:
         device_id, date, location, code = record
 
         # Check if device exists and get its current date
         cursor.execute('''
-            SELECT Last_Sighted_Date 
+            SELECT Last_Sighted_Date, Last_Sighted_Location, Location_Code, Last_Sighted_Epoch
             FROM telemetry 
             WHERE Device_ID = ?
         ''', (device_id,))
 
         existing = cursor.fetchone()
 
-        if existing and existing[0] is not None and str(existing[0]).strip() != '':
-            # Parse dates safely
+        if existing:
+            # An existing row without a readable date is replaced by any readable one
             try:
                 new_dt = pd.to_datetime(date, errors='coerce')
                 old_dt = pd.to_datetime(existing[0], errors='coerce')
@@ -50,30 +560,478 @@ def update_or_insert_data(df):
 
             # Update only if new date is more recent
             if not pd.isna(new_dt) and (pd.isna(old_dt) or new_dt > old_dt):
+                epoch = _epoch_seconds(pd.Series([new_dt]))[0]
                 cursor.execute('''
                     UPDATE telemetry 
                     SET Last_Sighted_Date = ?,
                         Last_Sighted_Location = ?,
-                        Location_Code = ?
+                        Location_Code = ?,
+                        Last_Sighted_Epoch = ?
                     WHERE Device_ID = ?
-                ''', (date, location, code, device_id))
+                ''', (date, location, code, epoch, device_id))
+                _log_change(cursor, batch_id, device_id, 'update', existing, (date, location, code, epoch))
                 updated += 1
+            else:
+                unchanged += 1
         else:
             # Insert new record
+            epoch = to_epoch_seconds([date])[0]
             cursor.execute('''
                 INSERT INTO telemetry 
-                (Device_ID, Last_Sighted_Date, Last_Sighted_Location, Location_Code)
-                VALUES (?, ?, ?, ?)
-            ''', (device_id, date, location, code))
+                (Device_ID, Last_Sighted_Date, Last_Sighted_Location, Location_Code, Last_Sighted_Epoch)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (device_id, date, location, code, epoch))
+            _log_change(cursor, batch_id, device_id, 'insert', None, (date, location, code, epoch))
             inserted += 1
     
-    conn.commit()
-    conn.close()
-    
-    return inserted, updated
+    _apply_summary_changes(cursor, history_mark)
+    _evaluate_alerts(cursor, history_mark)
+    return inserted, updated, unchanged
+
+def _log_change(cursor, batch_id, device_id, change_type, old, new):
+    old = old or (None, None, None, None)
+    cursor.execute('''
+        INSERT INTO telemetry_history
+        (batch_id, Device_ID, change_type,
+         old_Last_Sighted_Date, old_Last_Sighted_Location, old_Location_Code, old_Last_Sighted_Epoch,
+         new_Last_Sighted_Date, new_Last_Sighted_Location, new_Location_Code, new_Last_Sighted_Epoch,
+         changed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+    ''', (batch_id, device_id, change_type, *old, *new))
+def _history_watermark(cursor):
+    return cursor.execute('SELECT COALESCE(MAX(id), 0) FROM telemetry_history').fetchone()[0]
+
+def _apply_summary_changes(cursor, history_mark):
+    """Fold the history rows logged after ``history_mark`` into telemetry_summary.
+
+    Each change adds one device to its new dimension values and, for updates,
+    removes one from the values it replaced, so the cost follows the size of the
+    batch rather than the size of the fleet.
+    """
+    for dimension, key_sql in SUMMARY_DIMENSIONS.items():
+        new_key = key_sql.format(prefix='new_')
+        old_key = key_sql.format(prefix='old_')
+        cursor.execute(f'''
+            INSERT INTO telemetry_summary (dimension, key, devices)
+            SELECT ?, key, SUM(delta) FROM (
+                SELECT {new_key} AS key, 1 AS delta
+                FROM telemetry_history WHERE id > ?
+                UNION ALL
+                SELECT {old_key} AS key, -1 AS delta
+                FROM telemetry_history WHERE id > ? AND change_type = 'update'
+            )
+            WHERE true
+            GROUP BY key
+            ON CONFLICT(dimension, key) DO UPDATE SET devices = devices + excluded.devices
+        ''', (dimension, history_mark, history_mark))
+    cursor.execute('DELETE FROM telemetry_summary WHERE devices = 0')
+
+def rebuild_summary(conn):
+    """Recompute telemetry_summary from a full scan of telemetry."""
+    conn.execute('DELETE FROM telemetry_summary')
+    for dimension, key_sql in SUMMARY_DIMENSIONS.items():
+        key = key_sql.format(prefix='')
+        conn.execute(f'''
+            INSERT INTO telemetry_summary (dimension, key, devices)
+            SELECT ?, {key}, COUNT(*) FROM telemetry GROUP BY {key}
+        ''', (dimension,))
+
+@timed('db.dashboard_summary')
+def get_dashboard_summary(stale_days=30, today=None):
+    """Return the dashboard aggregates from telemetry_summary.
+
+    Reads one row per distinct location, location code and sighting day, so the
+    cost does not grow with the number of devices. Devices last sighted more than
+    ``stale_days`` days before ``today`` (UTC by default) count as stale.
+    """
+    today = today or datetime.utcnow().date()
+    conn = connect()
+    try:
+        rows = conn.execute('SELECT dimension, key, devices FROM telemetry_summary').fetchall()
+    finally:
+        release(conn)
+
+    counts = {dimension: {} for dimension in SUMMARY_DIMENSIONS}
+    for dimension, key, devices in rows:
+        if dimension in counts:
+            counts[dimension][key] = devices
+
+    bands = {label: 0 for label, _, _ in SIGHTING_AGE_BANDS}
+    unknown = stale = 0
+    for day, devices in counts['sighted_day'].items():
+        if not day:
+            unknown += devices
+            continue
+        # Sightings dated in the future count as seen today
+        age = max((today - date.fromisoformat(day)).days, 0)
+        for label, low, high in SIGHTING_AGE_BANDS:
+            if age >= low and (high is None or age <= high):
+                bands[label] += devices
+                break
+        if age > stale_days:
+            stale += devices
+
+    def ranked(dimension):
+        return [
+            {"key": key or None, "devices": devices}
+            for key, devices in sorted(counts[dimension].items(), key=lambda item: (-item[1], item[0]))
+        ]
+
+    return {
+        "total_devices": sum(counts['location'].values()),
+        "stale_devices": stale,
+        "stale_days": stale_days,
+        "unknown_sighting": unknown,
+        "sighting_age": [{"label": label, "devices": bands[label]} for label, _, _ in SIGHTING_AGE_BANDS],
+        "locations": ranked('location'),
+        "location_codes": ranked('location_code'),
+        "as_of": today.isoformat(),
+    }
+
+def _alert_upsert_sql(where):
+    # The device's own Location_Code rule wins over the fallback rule
+    return f'''
+        INSERT INTO alerts
+        (Device_ID, level, Location_Code, Last_Sighted_Location, Last_Sighted_Date, Last_Sighted_Epoch, raised_at)
+        SELECT * FROM (
+            SELECT t.Device_ID,
+                   CASE
+                       WHEN t.Last_Sighted_Epoch < :now - COALESCE(r.urgent_days, d.urgent_days) * 86400 THEN 'urgent'
+                       WHEN t.Last_Sighted_Epoch < :now - COALESCE(r.soft_days, d.soft_days) * 86400 THEN 'soft'
+                   END AS level,
+                   t.Location_Code, t.Last_Sighted_Location, t.Last_Sighted_Date, t.Last_Sighted_Epoch,
+                   datetime(:now, 'unixepoch')
+            FROM telemetry t
+            JOIN alert_rules d ON d.Location_Code = '{DEFAULT_ALERT_RULE}'
+            LEFT JOIN alert_rules r ON r.Location_Code = t.Location_Code
+            WHERE {where}
+        )
+        WHERE level IS NOT NULL
+        ON CONFLICT(Device_ID) DO UPDATE SET
+            level = excluded.level,
+            Location_Code = excluded.Location_Code,
+            Last_Sighted_Location = excluded.Last_Sighted_Location,
+            Last_Sighted_Date = excluded.Last_Sighted_Date,
+            Last_Sighted_Epoch = excluded.Last_Sighted_Epoch
+    '''
+
+def _evaluate_alerts(cursor, history_mark=None, now=None):
+    """Bring the alerts table up to date without scanning all of telemetry.
+
+    Devices changed since ``history_mark`` are re-evaluated from scratch. Every
+    other device can only have aged, so each threshold is checked over the slice
+    of the date index that crossed it since the previous evaluation.
+    """
+    now = _sighting_clock() if now is None else now
+    row = cursor.execute('SELECT evaluated_epoch FROM alert_state WHERE id = 1').fetchone()
+    previous = row[0] if row else None
+    if previous is None or previous > now:
+        _rebuild_alerts(cursor, now)
+        return
+
+    if history_mark is not None:
+        changed = 'SELECT Device_ID FROM telemetry_history WHERE id > :mark'
+        cursor.execute(f'DELETE FROM alerts WHERE Device_ID IN ({changed})', {'mark': history_mark})
+        cursor.execute(_alert_upsert_sql(f't.Device_ID IN ({changed})'), {'mark': history_mark, 'now': now})
+
+    rules = cursor.execute('SELECT Location_Code, soft_days, urgent_days FROM alert_rules').fetchall()
+    for code, soft_days, urgent_days in rules:
+        if code == DEFAULT_ALERT_RULE:
+            scope = ('(t.Location_Code IS NULL OR t.Location_Code NOT IN '
+                     f"(SELECT Location_Code FROM alert_rules WHERE Location_Code != '{DEFAULT_ALERT_RULE}'))")
+        else:
+            scope = 't.Location_Code = :code'
+        for days in sorted({soft_days, urgent_days}):
+            cursor.execute(
+                _alert_upsert_sql(f'{scope} AND t.Last_Sighted_Epoch >= :start AND t.Last_Sighted_Epoch < :end'),
+                {'code': code, 'now': now, 'start': previous - days * 86400, 'end': now - days * 86400},
+            )
+    _set_alert_state(cursor, now)
+
+def _rebuild_alerts(cursor, now):
+    cursor.execute('DELETE FROM alerts')
+    cursor.execute(_alert_upsert_sql('t.Last_Sighted_Epoch IS NOT NULL'), {'now': now})
+    _set_alert_state(cursor, now)
+
+def _set_alert_state(cursor, now):
+    cursor.execute(
+        'INSERT INTO alert_state (id, evaluated_epoch) VALUES (1, ?) '
+        'ON CONFLICT(id) DO UPDATE SET evaluated_epoch = excluded.evaluated_epoch',
+        (now,),
+    )
+
+@timed('db.refresh_alerts')
+def refresh_alerts():
+    """Escalate alerts for devices that aged past a threshold since the last evaluation."""
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        _evaluate_alerts(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release(conn)
+
+def get_active_alerts(level=None):
+    """Return active alerts (most urgent and longest unseen first), optionally for one level."""
+    if level and level not in ('soft', 'urgent'):
+        raise ValueError(f"Unknown alert level: {level}")
+    where = 'WHERE level = ?' if level else ''
+    conn = connect()
+    try:
+        cursor = conn.execute(
+            f"SELECT {', '.join(ALERT_COLUMNS)} FROM alerts {where} "
+            "ORDER BY level = 'soft', Last_Sighted_Epoch, Device_ID",
+            [level] if level else [],
+        )
+        rows = [dict(zip(ALERT_COLUMNS, row)) for row in cursor.fetchall()]
+    finally:
+        release(conn)
+    now = _sighting_clock()
+    for row in rows:
+        row['days_unseen'] = (now - row['Last_Sighted_Epoch']) // 86400
+    return rows
+
+def get_alert_rules():
+    """Return the alert rules; Location_Code ``'*'`` is the fallback rule."""
+    conn = connect()
+    try:
+        cursor = conn.execute('SELECT Location_Code, soft_days, urgent_days FROM alert_rules ORDER BY Location_Code')
+        return [dict(zip(('Location_Code', 'soft_days', 'urgent_days'), row)) for row in cursor.fetchall()]
+    finally:
+        release(conn)
+
+def set_alert_rule(location_code, soft_days, urgent_days):
+    """Create or change the thresholds for ``location_code`` and re-evaluate every alert."""
+    soft_days, urgent_days = int(soft_days), int(urgent_days)
+    if not location_code:
+        raise ValueError("Location_Code is required")
+    if soft_days < 0 or urgent_days < soft_days:
+        raise ValueError("Thresholds must satisfy 0 <= soft_days <= urgent_days")
+    _change_alert_rules(
+        'INSERT INTO alert_rules VALUES (?, ?, ?) ON CONFLICT(Location_Code) DO UPDATE SET '
+        'soft_days = excluded.soft_days, urgent_days = excluded.urgent_days',
+        (location_code, soft_days, urgent_days),
+    )
+
+def delete_alert_rule(location_code):
+    """Drop the rule for ``location_code`` so the fallback rule applies again."""
+    if location_code == DEFAULT_ALERT_RULE:
+        raise ValueError("The fallback rule cannot be deleted")
+    _change_alert_rules('DELETE FROM alert_rules WHERE Location_Code = ?', (location_code,))
+
+def _change_alert_rules(sql, params):
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(sql, params)
+        # Thresholds moved, so earlier evaluations no longer hold
+        _rebuild_alerts(cursor, _sighting_clock())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release(conn)
+
 def get_all_data():
     """Retrieve all records from database."""
-    conn = sqlite3.connect('data.db')
-    df = pd.read_sql('SELECT * FROM telemetry', conn)
-    conn.close()
-    return df
\ No newline at end of file
+    conn = connect()
+    try:
+        return pd.read_sql(f"SELECT {', '.join(TELEMETRY_COLUMNS)} FROM telemetry", conn)
+    finally:
+        release(conn)
+
+def iter_data(chunk_size=1000):
+    """Yield telemetry rows as tuples, fetching ``chunk_size`` rows at a time."""
+    conn = connect()
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(TELEMETRY_COLUMNS)} FROM telemetry ORDER BY Device_ID")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        release(conn)
+
+@timed('db.query_data')
+def query_data(device=None, location=None, location_code=None, date_type='on', date=None,
+               sort='Device_ID', direction='asc', limit=100, offset=0, after=None, count=True):
+    """Return one filtered, sorted page of telemetry rows, the total match count and the next cursor.
+
+    Text filters are case-insensitive substring matches, looked up in the
+    trigram ``telemetry_search`` index when they are at least three characters
+    long; ``date`` is a ``YYYY-MM-DD`` day compared ``on``/``before``/``after``
+    through the epoch index, and rows without a readable date are always kept.
+    Pages are ordered by ``sort`` then Device_ID. Pass the previous page's cursor
+    as ``after`` to continue from it by key instead of skipping ``offset`` rows.
+    The total is only counted when ``count`` is true (``None`` is returned
+    otherwise), so later pages can reuse the first one's.
+    """
+    text_filters = [(column, str(value)) for column, value in zip(SEARCH_COLUMNS, (device, location, location_code))
+                    if value]
+
+    date_clause = None
+    date_params = []
+    if date:
+        day_start = to_epoch_seconds([date])[0]
+        if day_start is None:
+            raise ValueError(f"Invalid date filter: {date}")
+        day_end = day_start + 86400
+        if date_type == 'before':
+            date_clause = 'Last_Sighted_Epoch < ?'
+            date_params = [day_start]
+        elif date_type == 'after':
+            date_clause = 'Last_Sighted_Epoch >= ?'
+            date_params = [day_end]
+        else:
+            date_clause = 'Last_Sighted_Epoch >= ? AND Last_Sighted_Epoch < ?'
+            date_params = [day_start, day_end]
+
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Cannot sort by column: {sort}")
+    sort_column = SORT_COLUMNS[sort]
+    descending = str(direction).lower() == 'desc'
+    order = 'DESC' if descending else 'ASC'
+    limit = int(limit)
+    # Each segment continues where the previous one ran out, so every query is one index range
+    segments = [(None, [])] if after is None else _cursor_segments(sort_column, descending, after)
+
+    conn = connect()
+    try:
+        clauses, params = _text_filter_clauses(conn, text_filters)
+        if date_clause:
+            clauses.append(f'(Last_Sighted_Epoch IS NULL OR ({date_clause}))')
+            params.extend(date_params)
+        filters = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        total = conn.execute(f'SELECT COUNT(*) FROM telemetry {filters}', params).fetchone()[0] if count else None
+        fetched = []
+        for segment, segment_params in segments:
+            page_clauses = clauses + [segment] if segment else clauses
+            where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ''
+            fetched += conn.execute(
+                f"SELECT {', '.join(TELEMETRY_COLUMNS)}, {sort_column} FROM telemetry {where} "
+                f"ORDER BY {sort_column} {order}, Device_ID {order} LIMIT ? OFFSET ?",
+                params + segment_params + [limit - len(fetched), 0 if after is not None else int(offset)],
+            ).fetchall()
+            if len(fetched) >= limit:
+                break
+    finally:
+        release(conn)
+    rows = [dict(zip(TELEMETRY_COLUMNS, row)) for row in fetched]
+    next_cursor = [fetched[-1][-1], fetched[-1][0]] if len(fetched) == limit else None
+    return rows, total, next_cursor
+
+def _text_filter_clauses(conn, text_filters):
+    """Build the WHERE clauses and parameters for ``(column, value)`` substring filters."""
+    clauses = []
+    params = []
+    searches = []
+    indexed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='telemetry_search'"
+    ).fetchone() is not None
+    for column, value in text_filters:
+        if indexed and len(value) >= 3:
+            # A trigram phrase matches the value anywhere in the column, ignoring case
+            phrase = value.replace('"', '""')
+            searches.append(f'{column} : "{phrase}"')
+        else:
+            # Shorter values have no trigram to look up, so they are checked row by row
+            clauses.append(f"{column} LIKE ? ESCAPE '\\'")
+            params.append(f'%{_escape_like(value)}%')
+    if searches:
+        clauses.insert(0, 'rowid IN (SELECT rowid FROM telemetry_search WHERE telemetry_search MATCH ?)')
+        params.insert(0, ' AND '.join(searches))
+    return clauses, params
+
+def _cursor_segments(sort_column, descending, after):
+    """Split the rows after a ``[sort_value, Device_ID]`` cursor into ``(clause, params)`` ranges, in order.
+
+    SQLite sorts NULLs first, so they come before every value ascending and
+    after every value descending; row-value comparisons skip them, and they get
+    a range of their own.
+    """
+    try:
+        value, device_id = after
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid page cursor: {after!r}")
+    beyond = '<' if descending else '>'
+    if sort_column == 'Device_ID':
+        return [(f'Device_ID {beyond} ?', [device_id])]
+    if value is None:
+        rest = [] if descending else [(f'{sort_column} IS NOT NULL', [])]
+        return [(f'{sort_column} IS NULL AND Device_ID {beyond} ?', [device_id])] + rest
+    rest = [(f'{sort_column} IS NULL', [])] if descending else []
+    return [(f'({sort_column}, Device_ID) {beyond} (?, ?)', [value, device_id])] + rest
+
+def clear_data():
+    """Delete all telemetry together with its history, summary and alerts."""
+    conn = connect()
+    try:
+        with conn:
+            for table in ('telemetry', 'telemetry_history', 'telemetry_summary', 'alerts'):
+                conn.execute(f'DELETE FROM {table}')
+    finally:
+        release(conn)
+
+def _escape_like(value):
+    return str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+@timed('db.query_history')
+def query_history(batch_id=None, device=None, change_type=None, limit=100, offset=0):
+    """Return one page of ``telemetry_history`` (newest first) and the total match count.
+
+    Filters are exact matches so they are served by the per-batch and per-device
+    indexes; ``change_type`` is ``insert`` or ``update``.
+    """
+    clauses = []
+    params = []
+    for column, value in (
+        ('batch_id', batch_id),
+        ('Device_ID', device),
+        ('change_type', change_type),
+    ):
+        if value:
+            clauses.append(f'{column} = ?')
+            params.append(value)
+    if change_type and change_type not in ('insert', 'update'):
+        raise ValueError(f"Unknown change type: {change_type}")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+    conn = connect()
+    try:
+        total = conn.execute(f'SELECT COUNT(*) FROM telemetry_history {where}', params).fetchone()[0]
+        cursor = conn.execute(
+            f"SELECT {', '.join(HISTORY_COLUMNS)} FROM telemetry_history {where} "
+            f"ORDER BY id DESC LIMIT ? OFFSET ?",
+            params + [int(limit), int(offset)],
+        )
+        rows = [dict(zip(HISTORY_COLUMNS, row)) for row in cursor.fetchall()]
+    finally:
+        release(conn)
+    return rows, total
+
+def list_batches(limit=20):
+    """Return the most recent upload batches that changed anything, with their insert/update counts."""
+    conn = connect()
+    try:
+        cursor = conn.execute('''
+            SELECT batch_id,
+                   MIN(changed_at) AS started_at,
+                   MAX(changed_at) AS finished_at,
+                   SUM(change_type = 'insert') AS inserted,
+                   SUM(change_type = 'update') AS updated
+            FROM telemetry_history
+            GROUP BY batch_id
+            ORDER BY MAX(id) DESC
+            LIMIT ?
+        ''', (int(limit),))
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        release(conn)
@@ -0,0 +1,170 @@
+"""Column-oriented date parsing for spreadsheet values.
+
+:class:`DateParser` works out which of its formats a column uses from a sample
+of its text values, tries that format first for every value, and caches the
+result for each distinct raw text, since exports repeat the same dates many
+times. Excel serial numbers are converted in bulk. Values that cannot be
+parsed come back as ``None`` and are counted in :attr:`DateParser.failure_count`.
+"""
+import re
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+from openpyxl.utils.datetime import WINDOWS_EPOCH, from_excel
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%m/%d/%Y", "%m/%d/%Y %H:%M", "%d-%b-%Y")
+# Serials in this range convert without openpyxl's special cases (times of day, Excel's 1900 leap day)
+_BULK_SERIAL_RANGE = (61, 2958466)  # 1900-03-01 .. 9999-12-31
+# datetime.fromisoformat() is much faster than strptime, but accepts more than these formats
+_ISO_PATTERNS = {
+    "%Y-%m-%d": re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}\Z"),
+    "%Y-%m-%d %H:%M:%S": re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}\Z"),
+}
+
+
+class DateParser:
+    """Parse the date values of one column.
+
+    ``formats`` are ``strptime`` formats; the one matching most of the first
+    ``sample_size`` text values is tried first, the rest in order after it.
+    ``epoch`` is the workbook's date epoch for Excel serials. ``fallback``, if
+    given, receives the list of texts no format matched and returns a parsed
+    ``datetime`` or ``None`` for each. Up to ``max_failures`` unparseable
+    values are kept in :attr:`failures` as ``(position, value)`` pairs.
+    """
+
+    def __init__(self, formats=DATE_FORMATS, epoch=WINDOWS_EPOCH, sample_size=100,
+                 cache_size=4096, fallback=None, max_failures=20):
+        self.formats = tuple(formats)
+        self.epoch = epoch
+        self.sample_size = sample_size
+        self.fallback = fallback
+        self.max_failures = max_failures
+        self.detected_format = None
+        self.failures = []
+        self.failure_count = 0
+        self._position = 0
+        self._parse_text = lru_cache(maxsize=cache_size)(self._parse_text_uncached)
+
+    def parse(self, value):
+        """Parse a single value; blank values are ``None`` without counting as failures."""
+        return self.parse_column([value])[0]
+
+    def parse_column(self, values):
+        """Return the parsed ``datetime`` (or ``None``) for each of ``values``.
+
+        Positions in :attr:`failures` continue across calls, so a column can be
+        parsed in chunks.
+        """
+        values = list(values)
+        if self.detected_format is None:
+            self.detect_format(values)
+
+        parsed = [None] * len(values)
+        serials = []
+        unmatched = []
+        failed = []
+        low, high = _BULK_SERIAL_RANGE
+        for index, value in enumerate(values):
+            value_type = type(value)
+            if value is None:
+                continue
+            if value_type is datetime:
+                parsed[index] = value
+            elif value_type is str:
+                result = self._parse_text(value)
+                if result is not None:
+                    parsed[index] = result
+                elif value.strip():
+                    unmatched.append(index)
+            elif (value_type is int or value_type is float) and low <= value < high:
+                serials.append(index)
+            else:
+                result = self._parse_other(value)
+                if result is not None:
+                    parsed[index] = result
+                else:
+                    failed.append(index)
+
+        if serials:
+            for index, result in zip(serials, self._convert_serials([values[index] for index in serials])):
+                parsed[index] = result
+        if unmatched and self.fallback is not None:
+            results = self.fallback([values[index].strip() for index in unmatched])
+            still_unmatched = []
+            for index, result in zip(unmatched, results):
+                if result is None:
+                    still_unmatched.append(index)
+                else:
+                    parsed[index] = result
+            unmatched = still_unmatched
+
+        self._record_failures(sorted(failed + unmatched), values)
+        self._position += len(values)
+        return parsed
+
+    def detect_format(self, values):
+        """Put the format matching most sampled text values first; returns it (or ``None``)."""
+        sample = []
+        for value in values:
+            if isinstance(value, str) and value.strip():
+                sample.append(value.strip())
+                if len(sample) >= self.sample_size:
+                    break
+        if not sample:
+            return None
+        counts = {fmt: sum(1 for text in sample if _try_format(text, fmt) is not None) for fmt in self.formats}
+        best = max(self.formats, key=lambda fmt: counts[fmt])
+        if counts[best]:
+            self.detected_format = best
+            self.formats = (best,) + tuple(fmt for fmt in self.formats if fmt != best)
+            self._parse_text.cache_clear()
+        return self.detected_format
+
+    def _parse_text_uncached(self, value):
+        text = value.strip()
+        if not text:
+            return None
+        for fmt in self.formats:
+            result = _try_format(text, fmt)
+            if result is not None:
+                return result
+        return None
+
+    def _parse_other(self, value):
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, (int, float)):
+            try:
+                result = from_excel(value, self.epoch)
+            except Exception:
+                return None
+            # Serials below 1 are times of day, which do not order against dates
+            return result if isinstance(result, datetime) else None
+        return None
+
+    def _convert_serials(self, serials):
+        # Same arithmetic as openpyxl's from_excel, a whole array at a time
+        values = np.asarray(serials, dtype='float64')
+        days = np.floor(values)
+        millis = np.round((values - days) * 86400 * 1000)
+        stamps = (np.datetime64(self.epoch, 'ms') + days.astype('timedelta64[D]')
+                  + millis.astype('int64').astype('timedelta64[ms]'))
+        return stamps.astype('datetime64[us]').tolist()
+
+    def _record_failures(self, indexes, values):
+        self.failure_count += len(indexes)
+        room = self.max_failures - len(self.failures)
+        for index in indexes[:max(room, 0)]:
+            self.failures.append((self._position + index, values[index]))
+
+
+def _try_format(text, fmt):
+    try:
+        pattern = _ISO_PATTERNS.get(fmt)
+        if pattern is not None and pattern.match(text):
+            return datetime.fromisoformat(text)
+        return datetime.strptime(text, fmt)
+    except ValueError:
+        return None
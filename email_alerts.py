@@ -1,6 +1,10 @@
 from email.mime.text import MIMEText
 import smtplib
 import os
+import queue
+import time
+from collections import OrderedDict
+from threading import Condition, Event, Lock, Thread
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -8,22 +12,174 @@ load_dotenv()
 
 EMAIL = os.getenv('EMAIL')
 PASSWORD = os.getenv('EMAIL_PASS')
+# Point these at a local stand-in (e.g. `python -m aiosmtpd -n -l localhost:8025`, SMTP_SSL=0) for testing
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '465'))
+SMTP_SSL = os.getenv('SMTP_SSL', '1') == '1'
+ALERT_RECIPIENTS = [r.strip() for r in os.getenv('ALERT_RECIPIENTS', 'recipient@example.com').split(',') if r.strip()]
+# Seconds to keep collecting alerts after the first one before sending a digest
+ALERT_BATCH_WINDOW = float(os.getenv('ALERT_BATCH_WINDOW', '2'))
+ALERT_MAX_RETRIES = int(os.getenv('ALERT_MAX_RETRIES', '5'))
 
-def send_alert(device_list):
-    """Send email alert for underutilized devices."""
+
+class AlertDispatcher:
+    """Sends alert emails from a background thread.
+
+    Alerts queued within ``batch_window`` seconds of each other are coalesced
+    into one digest per recipient, and each batch of digests is sent over a
+    single SMTP connection. A failed batch is retried with exponential backoff
+    (``backoff`` seconds, doubling up to ``max_backoff``) ``max_retries`` times
+    before its remaining digests are dropped.
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, use_ssl=SMTP_SSL, username=EMAIL, password=PASSWORD,
+                 sender=EMAIL, batch_window=ALERT_BATCH_WINDOW, max_retries=ALERT_MAX_RETRIES,
+                 backoff=2.0, max_backoff=300.0, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.sender = sender or 'alerts@localhost'
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = Lock()
+        self._idle = Condition(self._lock)
+        self._stopping = Event()
+        self._thread = None
+        # Alerts queued but not yet sent or dropped
+        self._pending = 0
+        self.sent = 0
+        self.failed = 0
+        self.last_error = None
+
+    def enqueue(self, device_list, recipients=None):
+        """Queue an alert for ``device_list`` to each recipient; returns immediately."""
+        recipients = recipients or ALERT_RECIPIENTS
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = Thread(target=self._run, name='alert-dispatch', daemon=True)
+                self._thread.start()
+            self._pending += len(recipients)
+        for recipient in recipients:
+            self._queue.put((recipient, list(device_list)))
+
+    def flush(self, timeout=None):
+        """Wait until every queued alert was sent or dropped; returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def stop(self, timeout=None):
+        """Make one last attempt at what is queued (no more backoff), then stop the thread."""
+        self._stopping.set()
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {"pending": self._pending, "sent": self.sent, "failed": self.failed,
+                    "last_error": self.last_error}
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._deliver_with_retry(_coalesce(batch))
+            except Exception as e:
+                # Never let one bad batch end the thread; its alerts count as failed
+                self._record_failure(len(batch), e)
+            finally:
+                with self._idle:
+                    self._pending -= len(batch)
+                    self._idle.notify_all()
+
+    def _deliver_with_retry(self, digests):
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._deliver(digests)
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                with self._lock:
+                    self.last_error = str(e)
+                print("Email Error:", e)
+                if attempt == self.max_retries or self._stopping.wait(min(delay, self.max_backoff)):
+                    break
+                delay *= 2
+            except Exception as e:
+                # A bad address or unencodable text fails the same way every time, so it is not retried
+                self._record_failure(len(digests), e)
+                return
+        with self._lock:
+            self.failed += len(digests)
+
+    def _record_failure(self, count, error):
+        with self._lock:
+            self.failed += count
+            self.last_error = f"{type(error).__name__}: {error}"
+        print("Email Error:", repr(error))
+
+    def _deliver(self, digests):
+        """Send ``digests`` over one connection, removing each one once it was accepted."""
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        with smtp_class(self.host, self.port, timeout=self.timeout) as server:
+            if self.username and self.password:
+                server.login(self.username, self.password)
+            for recipient in list(digests):
+                server.send_message(self._build_message(recipient, digests[recipient]))
+                del digests[recipient]
+                with self._lock:
+                    self.sent += 1
+
+    def _build_message(self, recipient, devices):
+        msg = MIMEText(f"The following devices are underutilized or inactive: {', '.join(devices)}")
+        msg['Subject'] = "Ascent: Underutilized Devices Alert"
+        msg['From'] = self.sender
+        msg['To'] = recipient
+        return msg
+
+
+def _coalesce(batch):
+    """Merge queued ``(recipient, devices)`` alerts into one de-duplicated device list per recipient."""
+    digests = OrderedDict()
+    for recipient, devices in batch:
+        merged = digests.setdefault(recipient, OrderedDict())
+        for device in devices:
+            merged[device] = None
+    return OrderedDict((recipient, list(devices)) for recipient, devices in digests.items())
+
+
+dispatcher = AlertDispatcher()
+
+
+def send_alert(device_list, recipients=None):
+    """Queue an email alert for underutilized devices; delivery happens in the background."""
     if not device_list:
         return {"msg": "No alerts needed", "ok": False}
 
-    msg = MIMEText(f"The following devices are underutilized or inactive: {', '.join(device_list)}")
-    msg['Subject'] = "Ascent: Underutilized Devices Alert"
-    msg['From'] = EMAIL
-    msg['To'] = "recipient@example.com"
-
-    try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(EMAIL, PASSWORD)
-            server.send_message(msg)
-        return {"msg": "Sent", "ok": True}
-    except Exception as e:
-        print("Email Error:", e)
-        return {"msg": str(e), "ok": False}
\ No newline at end of file
+    dispatcher.enqueue(device_list, recipients)
+    return {"msg": "Queued", "ok": True}
@@ -1,4 +1,13 @@
+import zipfile
+
 import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from date_parser import DateParser
+
+EXPECTED_HEADERS = ['Device_ID', 'Last_Sighted_Date', 'Last_Sighted_Location', 'Location_Code']
+DEFAULT_CHUNK_ROWS = 5000
 
 def process_excel_file(file):
     """
@@ -8,33 +17,131 @@ def process_excel_file(file):
     - Column 3: Last_Sighted_Date
     - Column 4: Last_Sighted_Location
     - Column 5: Location_Code
+
+    Loads the whole file and rejects it if any row is invalid; use
+    :func:`iter_excel_batches` to ingest valid rows and report the rest.
+    """
+    batches = []
+    for batch, rejects in iter_excel_batches(file):
+        if rejects:
+            raise ValueError("Some dates in column 3 are not in a valid format. Please ensure all dates are valid.")
+        batches.append(batch)
+
+    if not batches:
+        return pd.DataFrame(columns=EXPECTED_HEADERS)
+    return pd.concat(batches, ignore_index=True)
+
+def iter_excel_batches(file, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield ``(batch, rejects)`` for each chunk of ``chunk_rows`` spreadsheet rows.
+
+    ``batch`` is a normalized DataFrame with the telemetry columns; ``rejects`` lists
+    the rows of that chunk that failed validation as dicts with the spreadsheet
+    ``row`` number, the ``reason`` and the raw ``Device_ID``.
     """
-    # Read Excel file without headers
-    raw = pd.read_excel(file, header=None)
-    
-    # Validate minimum columns
-    if raw.shape[1] < 5:
-        raise ValueError("File must have at least 5 columns")
-
-    # Check if first row contains exact column names
-    first_row = raw.iloc[0].astype(str).str.strip()
-    expected_headers = ['Device_ID', 'Last_Sighted_Date', 'Last_Sighted_Location', 'Location_Code']
-    
-    # If first row matches our expected headers, skip it
-    if all(header in first_row.values for header in expected_headers):
-        raw = raw.iloc[1:].reset_index(drop=True)
-
-    # Create DataFrame with specific columns (skip first column)
-    # Convert dates with error handling
-    dates = pd.to_datetime(raw.iloc[:, 2], errors='coerce')
-    if dates.isna().any():
-        raise ValueError("Some dates in column 3 are not in a valid format. Please ensure all dates are valid.")
-        
+    first_row = 1
+    # One parser per file, so the date format is detected once and repeated dates are parsed once
+    date_parser = new_date_parser()
+    for raw in _iter_raw_chunks(file, chunk_rows):
+        # Validate minimum columns (later chunks are padded to the same width)
+        if first_row == 1 and raw.shape[1] < 5:
+            raise ValueError("File must have at least 5 columns")
+
+        row_numbers = pd.RangeIndex(first_row, first_row + len(raw))
+        raw.index = row_numbers
+        raw = raw.dropna(how='all')
+        if first_row == 1 and 1 in raw.index:
+            # Check if first row contains exact column names
+            first = raw.loc[1].astype(str).str.strip()
+            if all(header in first.values for header in EXPECTED_HEADERS):
+                raw = raw.drop(index=1)
+        first_row += len(row_numbers)
+
+        yield normalize_chunk(raw, date_parser)
+
+def new_date_parser():
+    """Return a :class:`DateParser` for Last_Sighted_Date that falls back to pandas for unusual formats."""
+    return DateParser(fallback=_parse_mixed_dates)
+
+def normalize_chunk(raw, date_parser=None):
+    """Validate and normalize one raw chunk (column 2-5 layout) in a vectorized pass."""
+    device_ids = _clean_text(raw.iloc[:, 1].map(_integral_to_int))
+    date_parser = date_parser or new_date_parser()
+    dates = pd.to_datetime(
+        pd.Series(date_parser.parse_column(raw.iloc[:, 2].tolist()), index=raw.index, dtype=object),
+        errors='coerce',
+    )
+
+    missing_device = device_ids.isna()
+    bad_date = dates.isna() & ~missing_device
+    rejected = missing_device | bad_date
+
+    rejects = [
+        {"row": int(row), "reason": "missing Device_ID", "Device_ID": None}
+        for row in raw.index[missing_device]
+    ] + [
+        {"row": int(row), "reason": "invalid Last_Sighted_Date", "Device_ID": device_ids[row]}
+        for row in raw.index[bad_date]
+    ]
+    rejects.sort(key=lambda reject: reject["row"])
+
+    keep = ~rejected
     df = pd.DataFrame({
-        'Device_ID': raw.iloc[:, 1].astype(str).str.strip(),
-        'Last_Sighted_Date': dates.dt.strftime('%Y-%m-%d %H:%M:%S'),
-        'Last_Sighted_Location': raw.iloc[:, 3].astype(str).str.strip(),
-        'Location_Code': raw.iloc[:, 4].astype(str).str.strip()
-    })
-    
-    return df
\ No newline at end of file
+        'Device_ID': device_ids[keep],
+        'Last_Sighted_Date': dates[keep].dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'Last_Sighted_Location': _clean_text(raw.iloc[:, 3][keep]),
+        'Location_Code': _clean_text(raw.iloc[:, 4][keep]),
+    }).reset_index(drop=True)
+
+    return df, rejects
+
+def _clean_text(column):
+    text = column.astype('string').str.strip()
+    text = text.mask(text == '')
+    return text.astype(object).where(text.notna(), None)
+
+def _parse_mixed_dates(texts):
+    # Whatever the known formats miss, pandas infers value by value
+    parsed = pd.to_datetime(pd.Series(texts, dtype=object), errors='coerce', format='mixed')
+    return [None if pd.isna(value) else value.to_pydatetime() for value in parsed]
+
+def _integral_to_int(value):
+    # Excel stores IDs as floats; keep 11592.0 from becoming "11592.0" (migration 8 converts stored ones)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def _iter_raw_chunks(file, chunk_rows):
+    """Yield raw DataFrames of up to ``chunk_rows`` rows without reading the whole sheet.
+
+    .xlsx files are streamed with openpyxl's read-only reader; legacy .xls files
+    have no streaming reader, so they are loaded once and sliced.
+    """
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile, KeyError):
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        raw = pd.read_excel(file, header=None)
+        for start in range(0, len(raw), chunk_rows):
+            yield raw.iloc[start:start + chunk_rows].reset_index(drop=True)
+        return
+
+    try:
+        sheet = workbook.worksheets[0]
+        sheet.reset_dimensions()
+        chunk = []
+        width = 0
+        for values in sheet.iter_rows(values_only=True):
+            chunk.append(values)
+            width = max(width, len(values))
+            if len(chunk) >= chunk_rows:
+                yield _chunk_frame(chunk, width)
+                chunk = []
+        if chunk:
+            yield _chunk_frame(chunk, width)
+    finally:
+        workbook.close()
+
+def _chunk_frame(rows, width):
+    # Streamed rows stop at their last non-empty cell; pad them to a common width
+    return pd.DataFrame([row + (None,) * (width - len(row)) for row in rows], columns=range(width))
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Condition, Lock
+from typing import Callable, Dict, Optional, Tuple
+
+from workbook_consolidator import PipelineError, ensure_private_directory
+
+PHASE_LABELS = {
+    "1": "Phase 1: DMS normalization",
+    "2": "Phase 2: repJourney merge",
+    "3": "Phase 3: MAIN enrichment",
+    "4": "Phase 4: Completed, ready for human review",
+}
+
+FINISHED_STATUSES = {"completed", "error"}
+
+
+class JobQueueFull(Exception):
+    """Raised when the pipeline queue already holds the maximum number of pending jobs."""
+
+
+def _utc_timestamp() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def _phase_template(label: str) -> dict:
+    return {
+        "label": label,
+        "status": "pending",
+        "percent": 0,
+        "processed_rows": 0,
+        "total_rows": 0,
+        "message": "Waiting to begin.",
+        "cached": False,
+    }
+
+
+def _default_phases() -> dict:
+    return {key: _phase_template(label) for key, label in PHASE_LABELS.items()}
+
+
+class PipelineJob:
+    """Progress state and output of a single consolidation run."""
+
+    def __init__(self, job_id: str, lock: Lock, workdir: str):
+        self.job_id = job_id
+        self._lock = lock
+        self._changed = Condition(lock)
+        # Bumped on every state change; phases remember the version that last touched them
+        self.version = 0
+        self._phase_versions = {key: 0 for key in PHASE_LABELS}
+        self.workdir = workdir
+        self.result_path: Optional[str] = None
+        self.profile_path: Optional[str] = None
+        self.finished_monotonic: Optional[float] = None
+        self.state = {
+            "job_id": job_id,
+            "overall_status": "queued",
+            "download_ready": False,
+            "error": None,
+            "queued_at": _utc_timestamp(),
+            "started_at": None,
+            "finished_at": None,
+            "filename": None,
+            "timings": {},
+            "profile_ready": False,
+            "phases": _default_phases(),
+        }
+
+    @property
+    def finished(self) -> bool:
+        return self.state["overall_status"] in FINISHED_STATUSES
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._copy_state_locked()
+
+    def wait_for_changes(self, since_version: int, timeout: float) -> Tuple[int, Optional[dict]]:
+        """Block until the state moves past ``since_version`` or ``timeout`` elapses.
+
+        Returns the new version and the top-level state with only the phases
+        changed since ``since_version`` (``None`` on timeout). Pass ``-1`` to get
+        every phase.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.version > since_version, timeout=timeout)
+            if self.version <= since_version:
+                return since_version, None
+            return self.version, self._copy_state_locked(since_version)
+
+    def _copy_state_locked(self, since_version: int = -1) -> dict:
+        # Phase dicts hold only scalars, so one level of copying is enough
+        phases = {
+            key: dict(phase)
+            for key, phase in self.state["phases"].items()
+            if self._phase_versions[key] > since_version
+        }
+        return {**self.state, "phases": phases}
+
+    def _touch_locked(self, phase_key: Optional[str] = None):
+        self.version += 1
+        if phase_key in self._phase_versions:
+            self._phase_versions[phase_key] = self.version
+        self._changed.notify_all()
+
+    def mark_started(self):
+        with self._lock:
+            self.state["overall_status"] = "running"
+            self.state["started_at"] = _utc_timestamp()
+            self._touch_locked()
+
+    def update_progress(self, phase: int, **payload):
+        phase_key = str(phase)
+        with self._lock:
+            phase_state = self.state["phases"].get(phase_key)
+            if not phase_state:
+                return
+            status = payload.get("status")
+            if status:
+                phase_state["status"] = status
+                if status == "running" and self.state["overall_status"] not in FINISHED_STATUSES:
+                    self.state["overall_status"] = "running"
+                if status == "error":
+                    self.state["overall_status"] = "error"
+            total = payload.get("total_rows") or payload.get("total")
+            if total is not None:
+                phase_state["total_rows"] = int(total)
+            processed = payload.get("processed_rows") or payload.get("processed")
+            if processed is not None:
+                phase_state["processed_rows"] = int(processed)
+            percent = payload.get("percent")
+            total_for_percent = phase_state.get("total_rows") or total or 0
+            if total_for_percent and processed is not None:
+                fraction = min(processed, total_for_percent) / total_for_percent
+                phase_state["percent"] = round(fraction * 100, 2)
+            elif percent is not None:
+                phase_state["percent"] = percent
+            message = payload.get("message")
+            if message:
+                phase_state["message"] = message
+            if payload.get("cached"):
+                phase_state["cached"] = True
+            self._touch_locked(phase_key)
+
+    def record_timings(self, spans):
+        """Store the run's ``(name, seconds)`` spans as total seconds per span name."""
+        timings: Dict[str, float] = {}
+        for name, seconds in spans:
+            timings[name] = timings.get(name, 0.0) + seconds
+        with self._lock:
+            self.state["timings"] = {name: round(seconds, 4) for name, seconds in timings.items()}
+            self._touch_locked()
+
+    def record_profile(self, profile_path: str):
+        with self._lock:
+            self.profile_path = profile_path
+            self.state["profile_ready"] = True
+            self._touch_locked()
+
+    def spool_path(self, name: str) -> str:
+        """Return a path for ``name`` inside this job's spool directory."""
+        return os.path.join(self.workdir, name)
+
+    def mark_completed(self, result_path: str, filename: str):
+        with self._lock:
+            self.result_path = result_path
+            self.finished_monotonic = time.monotonic()
+            self.state["download_ready"] = True
+            self.state["overall_status"] = "completed"
+            self.state["finished_at"] = _utc_timestamp()
+            self.state["filename"] = filename
+            self.state["phases"]["4"].update(
+                {
+                    "status": "done",
+                    "percent": 100,
+                    "processed_rows": 1,
+                    "total_rows": 1,
+                    "message": PHASE_LABELS["4"],
+                }
+            )
+            self._touch_locked("4")
+
+    def mark_cached(self, result_path: str, filename: str):
+        """Complete the job with a workbook consolidated earlier from the same inputs."""
+        with self._lock:
+            self.state["started_at"] = _utc_timestamp()
+            for key in ("1", "2", "3"):
+                self.state["phases"][key].update(
+                    {"status": "done", "percent": 100, "cached": True,
+                     "message": f"{PHASE_LABELS[key]} – served from cache."}
+                )
+                self._touch_locked(key)
+        self.mark_completed(result_path, filename)
+
+    def mark_failed(self, exc: Exception):
+        message = str(exc)
+        with self._lock:
+            self.result_path = None
+            self.finished_monotonic = time.monotonic()
+            self.state["overall_status"] = "error"
+            self.state["error"] = message
+            self.state["download_ready"] = False
+            self.state["finished_at"] = _utc_timestamp()
+            phase_key = None
+            if isinstance(exc, PipelineError) and exc.phase:
+                phase_key = str(exc.phase)
+                if phase_key in self.state["phases"]:
+                    self.state["phases"][phase_key]["status"] = "error"
+                    self.state["phases"][phase_key]["message"] = message
+            self._touch_locked(phase_key)
+
+
+def _default_spool_dir() -> str:
+    # Anyone can create directories in the shared temp dir; use a fresh one if ours was taken
+    path = os.path.join(tempfile.gettempdir(), f"cpecaps-pipeline-{getattr(os, 'geteuid', lambda: 'user')()}")
+    try:
+        return ensure_private_directory(path)
+    except PermissionError:
+        return tempfile.mkdtemp(prefix="cpecaps-pipeline-")
+
+
+class JobManager:
+    """Runs pipeline jobs on a bounded worker pool and keeps their results for a while.
+
+    Each job spools its inputs and output to its own directory under ``spool_dir``.
+    Finished jobs (and their directories) are dropped once they are older than
+    ``result_ttl`` seconds, and the least recently accessed finished jobs are
+    dropped beyond ``max_results``.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 10,
+                 result_ttl: float = 3600, max_results: int = 10,
+                 spool_dir: Optional[str] = None):
+        if spool_dir:
+            self.spool_dir = ensure_private_directory(spool_dir)
+        else:
+            self.spool_dir = _default_spool_dir()
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline")
+        self._lock = Lock()
+        self._jobs: "OrderedDict[str, PipelineJob]" = OrderedDict()
+
+    def create_job(self) -> PipelineJob:
+        """Reserve a queue slot and spool directory for a new job."""
+        with self._lock:
+            self._evict_locked()
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_workers + self.max_pending:
+                raise JobQueueFull("Too many processing jobs are queued; try again shortly.")
+            job_id = uuid.uuid4().hex
+            workdir = tempfile.mkdtemp(prefix=f"{job_id}-", dir=self.spool_dir)
+            job = PipelineJob(job_id, self._lock, workdir)
+            self._jobs[job.job_id] = job
+        return job
+
+    def start(self, job: PipelineJob, runner: Callable[[PipelineJob], None]):
+        """Queue ``runner(job)``; it must call ``mark_completed`` or raise."""
+        self._executor.submit(self._run, job, runner)
+
+    def finish_from_cache(self, job: PipelineJob, result_path: str, filename: str):
+        """Complete a created job immediately with a cached result instead of queueing it."""
+        job.mark_cached(result_path, filename)
+
+    def discard(self, job: PipelineJob):
+        """Forget a job that was created but never started."""
+        with self._lock:
+            self._jobs.pop(job.job_id, None)
+        shutil.rmtree(job.workdir, ignore_errors=True)
+
+    def count(self, status: str) -> int:
+        """Return how many tracked jobs are in ``status`` (e.g. ``"queued"`` or ``"running"``)."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.state["overall_status"] == status)
+
+    def get(self, job_id: Optional[str]) -> Optional[PipelineJob]:
+        """Return the job with ``job_id``; job ids are the only handle, so there is no "latest job"."""
+        with self._lock:
+            self._evict_locked()
+            job = self._jobs.get(job_id) if job_id else None
+            if job:
+                self._jobs.move_to_end(job_id)
+            return job
+
+    def _run(self, job: PipelineJob, runner: Callable[[PipelineJob], None]):
+        job.mark_started()
+        try:
+            runner(job)
+        except Exception as exc:
+            job.mark_failed(exc)
+
+    def _evict_locked(self):
+        now = time.monotonic()
+        finished = [job for job in self._jobs.values() if job.finished_monotonic is not None]
+        expired = [job for job in finished if now - job.finished_monotonic > self.result_ttl]
+        retained = [job for job in finished if job not in expired]
+        # _jobs is ordered by last access, so the front holds the LRU entries
+        expired.extend(retained[:max(len(retained) - self.max_results, 0)])
+        for job in expired:
+            del self._jobs[job.job_id]
+            shutil.rmtree(job.workdir, ignore_errors=True)
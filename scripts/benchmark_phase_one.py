@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Benchmark the phase 1 DMS Dump rewrite against the old delete_rows/append path.
+
+Run from project root: python3 scripts/benchmark_phase_one.py --rows 100000
+"""
+import argparse
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+from openpyxl import Workbook
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from workbook_consolidator import (  # noqa: E402
+    _load_source_workbook,
+    _normalize_device_id,
+    _phase_one_normalize_dms,
+    _replace_data_rows,
+)
+
+HEADERS = ['Device_Type', 'Device_ID', 'Last_Sighted_Date', 'Last_Sighted_Location',
+           'Location_Code', 'Battery', 'Firmware', 'Status']
+
+
+def build_dms_bytes(rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'DMS Dump'
+    ws.append(HEADERS)
+    for i in range(rows):
+        ws.append(['IVM', f"{i:010d}", '2025-05-12', 'Head Office', 'HQ', 87, 'v1.2', 'active'])
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def build_main(rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'DMS Dump'
+    ws.append(HEADERS)
+    for i in range(rows):
+        ws.append(['old', str(i), '2025-01-01', 'Old Location', 'OLD', 50, 'v1.0', 'stale'])
+    return wb
+
+
+def legacy_rewrite(sheet, rows):
+    """The previous implementation: delete_rows, then one append per row."""
+    if sheet.max_row > 1:
+        sheet.delete_rows(2, sheet.max_row - 1)
+    for row in rows:
+        sheet.append(row)
+
+
+def bulk_rewrite(sheet, rows):
+    _replace_data_rows(sheet, 2, rows)
+
+
+def time_rewrite(label, func, rows):
+    sheet = build_main(len(rows))['DMS Dump']
+    start = time.perf_counter()
+    func(sheet, rows)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed:8.2f} s  ({len(rows) / elapsed:,.0f} rows/s)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"Building {args.rows:,}-row DMS dump…")
+    dms_bytes = build_dms_bytes(args.rows)
+    dms_wb = _load_source_workbook(dms_bytes)
+    rows = [list(values) for values in dms_wb['DMS Dump'].iter_rows(min_row=2, values_only=True)]
+    dms_wb.close()
+    for row in rows:
+        row[1] = _normalize_device_id(row[1])
+
+    print("Sheet rewrite only:")
+    legacy = time_rewrite('legacy', legacy_rewrite, rows)
+    bulk = time_rewrite('bulk', bulk_rewrite, rows)
+    print(f"{'speedup':<12} {legacy / bulk:8.2f} x")
+
+    print("Full phase 1 (streamed read + normalize + rewrite):")
+    main_wb = build_main(args.rows)
+    start = time.perf_counter()
+    _phase_one_normalize_dms(dms_bytes, main_wb, None)
+    elapsed = time.perf_counter() - start
+    print(f"{'phase 1':<12} {elapsed:8.2f} s  ({args.rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Benchmark the phase 2 month sheet rewrite against the old per-cell writes and delete_rows path.
+
+Run from project root: python3 scripts/benchmark_phase_two.py --rows 50000 --formula-columns 24
+"""
+import argparse
+import gc
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from workbook_consolidator import _rewrite_month_rows  # noqa: E402
+
+HEADERS = ['Journey ID', 'Begin Journey Date', 'IVM/iScout Device ID', 'Disarm Date', 'Origin', 'Trip Type']
+START = datetime(2025, 7, 1)
+
+
+def formula_row(row, count):
+    # Destination plus count - 1 derived columns, each referring to its own row
+    formulas = [f"=IFERROR(VLOOKUP(C{row},'DMS Dump'!B:D,3,FALSE),\"\")"]
+    for offset in range(1, count):
+        formulas.append(f'=IF(D{row}="","",D{row}-B{row}+{offset})')
+    return formulas
+
+
+def build_month_sheet(existing, formula_columns):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Jul2025'
+    ws.append(HEADERS + ['Destination'] + [f'Derived {i}' for i in range(1, formula_columns)])
+    for i in range(existing):
+        begin = START + timedelta(minutes=i)
+        ws.append([i, begin, str(10000 + i), begin + timedelta(hours=5), 'Head Office', 'Import']
+                  + formula_row(i + 2, formula_columns))
+    return ws
+
+
+def build_rep_rows(rows):
+    keys = [header.lower() for header in HEADERS]
+    return [
+        dict(zip(keys, [i, START + timedelta(minutes=i), str(20000 + i),
+                        START + timedelta(minutes=i, hours=3) if i % 10 else None, 'Port', 'Export']))
+        for i in range(rows)
+    ]
+
+
+def legacy_rewrite(sheet, rep_rows, formula_columns):
+    """The previous implementation: one sheet.cell() per value, verbatim template copies, delete_rows."""
+    destination_col = len(HEADERS) + 1
+    original_data_count = sheet.max_row - 1
+    formula_template = {}
+    if original_data_count > 0:
+        for col in range(destination_col, sheet.max_column + 1):
+            formula_template[col] = sheet.cell(row=original_data_count + 1, column=col).value
+    keys = [header.lower() for header in HEADERS]
+    for row_idx, row in enumerate(rep_rows):
+        for col_idx, key in enumerate(keys, start=1):
+            sheet.cell(row=2 + row_idx, column=col_idx, value=row.get(key))
+    if original_data_count > len(rep_rows):
+        sheet.delete_rows(2 + len(rep_rows), original_data_count - len(rep_rows))
+    for row_idx in range(original_data_count, len(rep_rows)):
+        for col in range(destination_col, destination_col + formula_columns):
+            sheet.cell(row=2 + row_idx, column=col, value=formula_template.get(col))
+
+
+def bulk_rewrite(sheet, rep_rows, formula_columns):
+    destination_col = len(HEADERS) + 1
+    existing = sheet.max_row - 1
+    cells = sheet._cells
+    template = {col: cells[(existing + 1, col)].value
+                for col in range(destination_col, destination_col + formula_columns)} if existing else {}
+    columns = [(col_idx, header.lower()) for col_idx, header in enumerate(HEADERS, start=1)]
+    _rewrite_month_rows(sheet, 2, rep_rows, columns, template, existing + 1, existing)
+
+
+def time_rewrite(label, func, existing, rep_rows, formula_columns):
+    sheet = build_month_sheet(existing, formula_columns)
+    # Keep collections of the sheet just built out of the timing
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        func(sheet, rep_rows, formula_columns)
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+    print(f"  {label:<10} {elapsed:8.2f} s  ({len(rep_rows) / elapsed:,.0f} rows/s)")
+    return sheet, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000, help='repJourney rows written')
+    parser.add_argument('--formula-columns', type=int, default=24, help='Destination and derived formula columns')
+    args = parser.parse_args()
+
+    rep_rows = build_rep_rows(args.rows)
+    # The month sheet grows, shrinks, or is rewritten at the same size
+    for label, existing in (('grow', args.rows // 2), ('shrink', args.rows * 2), ('same', args.rows)):
+        print(f"{label}: {existing:,} existing rows -> {args.rows:,} rows, {args.formula_columns} formula columns")
+        _, legacy = time_rewrite('legacy', legacy_rewrite, existing, rep_rows, args.formula_columns)
+        sheet, bulk = time_rewrite('bulk', bulk_rewrite, existing, rep_rows, args.formula_columns)
+        print(f"  {'speedup':<10} {legacy / bulk:8.2f} x")
+        last = sheet.max_row
+        letter = get_column_letter(len(HEADERS) + 2)
+        print(f"  last row {last}: {letter}{last} = {sheet[f'{letter}{last}'].value}")
+
+
+if __name__ == '__main__':
+    main()
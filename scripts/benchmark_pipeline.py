@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Benchmark the consolidation pipeline, Excel ingestion and bulk upsert on synthetic workloads.
+
+Run from project root:
+    python3 scripts/benchmark_pipeline.py --rows 10000 --rows 100000
+    python3 scripts/benchmark_pipeline.py --rows 10000 --save-baseline
+    python3 scripts/benchmark_pipeline.py --stage pipeline --output-mode modified --compress-level 1
+
+Workloads come from workload_generator and are reused between runs. Each stage
+runs in a fresh child process so its peak RSS is its own. Timings are compared
+with the stored baseline; anything slower or larger than --tolerance allows is
+reported as a regression and makes the exit code 1.
+"""
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from workload_generator import generate_workload  # noqa: E402
+
+STAGES = ('pipeline', 'excel', 'upsert')
+DEFAULT_BASELINE = ROOT / 'scripts' / 'benchmark_baseline.json'
+
+
+def workload_paths(workdir, rows, seed, month):
+    out_dir = Path(workdir) / f"{rows}-seed{seed}-{month:%Y%m}"
+    marker = out_dir / 'complete'
+    if not marker.exists():
+        print(f"Generating {rows:,}-row workload in {out_dir}…", file=sys.stderr)
+        paths = generate_workload(str(out_dir), rows, seed, month)
+        marker.write_text(json.dumps(paths))
+    return json.loads(marker.read_text())
+
+
+def measure_pipeline(paths, rows, workdir, output_mode='full', compress_level=None):
+    from metrics import collect_spans
+    from workbook_consolidator import run_workbook_pipeline
+
+    start = time.perf_counter()
+    with collect_spans() as spans:
+        run_workbook_pipeline(paths['dms'], paths['rep'], paths['main'], None,
+                              output=str(Path(workdir) / 'output.xlsx'),
+                              output_mode=output_mode, compress_level=compress_level)
+    end = time.perf_counter()
+    # pipeline.load, pipeline.phase1 … pipeline.save
+    metrics = {name.split('.', 1)[1]: (seconds, rows) for name, seconds in spans if name.startswith('pipeline.')}
+    metrics['total'] = (end - start, rows)
+    return metrics
+
+
+def measure_excel(paths, rows, workdir):
+    from excel_handler import process_excel_file
+
+    start = time.perf_counter()
+    df = process_excel_file(paths['telemetry'])
+    return {'process_excel_file': (time.perf_counter() - start, len(df))}
+
+
+def measure_upsert(paths, rows, workdir):
+    import pandas as pd
+    import database
+    from excel_handler import process_excel_file
+
+    db_path = Path(workdir) / 'benchmark.db'
+    for suffix in ('', '-wal', '-shm'):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+    database.set_database_path(db_path)
+    database.init_db()
+    df = process_excel_file(paths['telemetry'])
+    # Second pass moves every sighting a day later, so every row is an update
+    later = df.assign(Last_Sighted_Date=(
+        pd.to_datetime(df['Last_Sighted_Date']) + pd.Timedelta(days=1)
+    ).dt.strftime('%Y-%m-%d %H:%M:%S'))
+
+    metrics = {}
+    for name, frame in (('insert', df), ('update', later)):
+        start = time.perf_counter()
+        database.update_or_insert_data(frame)
+        metrics[name] = (time.perf_counter() - start, len(frame))
+    return metrics
+
+
+MEASURES = {'pipeline': measure_pipeline, 'excel': measure_excel, 'upsert': measure_upsert}
+
+
+def run_child(stage, rows, workload, output_options):
+    """Run one stage in this process and print its metrics as JSON."""
+    paths = json.loads(workload)
+    options = output_options if stage == 'pipeline' else {}
+    with tempfile.TemporaryDirectory(prefix='cpecaps-bench-') as workdir:
+        metrics = MEASURES[stage](paths, rows, workdir, **options)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    print(json.dumps({
+        'peak_rss_mb': round(peak_mb, 1),
+        'metrics': {
+            name: {'seconds': round(seconds, 4), 'rows': count,
+                   'rows_per_s': round(count / seconds) if seconds > 0 else None}
+            for name, (seconds, count) in metrics.items()
+        },
+    }))
+
+
+def run_stage(stage, rows, paths, output_args):
+    completed = subprocess.run(
+        [sys.executable, __file__, '--child', stage, '--rows', str(rows), '--workload', json.dumps(paths)]
+        + output_args,
+        capture_output=True, text=True, cwd=ROOT,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{stage} benchmark failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance, min_seconds):
+    """Print every measurement next to its baseline; return the regressions found."""
+    regressions = []
+    print(f"{'rows':>9}  {'measurement':<28} {'seconds':>9} {'rows/s':>11} {'baseline':>9} {'change':>8}")
+    for rows, stages in results.items():
+        for stage, result in stages.items():
+            base_stage = baseline.get(rows, {}).get(stage, {})
+            for name, metric in result['metrics'].items():
+                base = base_stage.get('metrics', {}).get(name)
+                line = f"{int(rows):>9,}  {stage + '.' + name:<28} {metric['seconds']:>9.3f} {metric['rows_per_s'] or 0:>11,}"
+                if base:
+                    change = metric['seconds'] / base['seconds'] - 1 if base['seconds'] else 0
+                    line += f" {base['seconds']:>9.3f} {change:>+8.0%}"
+                    if change > tolerance and metric['seconds'] >= min_seconds:
+                        regressions.append(f"{rows} rows {stage}.{name}: {change:+.0%} time")
+                        line += '  REGRESSION'
+                print(line)
+            rss = result['peak_rss_mb']
+            line = f"{int(rows):>9,}  {stage + '.peak_rss_mb':<28} {rss:>9.1f} {'':>11}"
+            base_rss = base_stage.get('peak_rss_mb')
+            if base_rss:
+                change = rss / base_rss - 1
+                line += f" {base_rss:>9.1f} {change:>+8.0%}"
+                if change > tolerance:
+                    regressions.append(f"{rows} rows {stage}: {change:+.0%} peak RSS")
+                    line += '  REGRESSION'
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, action='append', help='Workload size (repeatable; default 10000)')
+    parser.add_argument('--stage', choices=STAGES, action='append', help='Stage to run (repeatable; default all)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--month', type=lambda value: datetime.strptime(value, '%Y-%m'), default=datetime(2025, 7, 1),
+                        help='YYYY-MM of the generated repJourney dates')
+    parser.add_argument('--workdir', default=str(Path(tempfile.gettempdir()) / 'cpecaps-workloads'))
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown/growth (0.2 = 20%%)')
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help='Ignore time regressions in measurements shorter than this')
+    parser.add_argument('--output', help='Also write the results JSON here')
+    parser.add_argument('--output-mode', choices=('full', 'modified'), default='full',
+                        help='How the pipeline saves MAIN: full rewrite or modified sheets only')
+    parser.add_argument('--compress-level', type=int, choices=range(10), metavar='0-9',
+                        help='Zip deflate level of the pipeline output (default: zlib default)')
+    parser.add_argument('--child', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--workload', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.rows[0], args.workload,
+                  {'output_mode': args.output_mode, 'compress_level': args.compress_level})
+        return 0
+
+    output_args = ['--output-mode', args.output_mode]
+    if args.compress_level is not None:
+        output_args += ['--compress-level', str(args.compress_level)]
+
+    results = {}
+    for rows in args.rows or [10000]:
+        paths = workload_paths(args.workdir, rows, args.seed, args.month)
+        for stage in args.stage or STAGES:
+            print(f"Running {stage} on {rows:,} rows…", file=sys.stderr)
+            results.setdefault(str(rows), {})[stage] = run_stage(stage, rows, paths, output_args)
+
+    baseline_path = Path(args.baseline)
+    stored = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    regressions = compare(results, stored.get('results', {}), args.tolerance, args.min_seconds)
+
+    report = {
+        'meta': {
+            'recorded_at': datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'output_mode': args.output_mode,
+            'compress_level': args.compress_level,
+        },
+        'results': results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        # Keep baseline entries for sizes/stages that were not re-run
+        merged = stored.get('results', {})
+        for rows, stages in results.items():
+            merged.setdefault(rows, {}).update(stages)
+        baseline_path.write_text(json.dumps(dict(report, results=merged), indent=2) + '\n')
+        print(f"Baseline saved to {baseline_path}")
+        return 0
+
+    if not stored:
+        print(f"No baseline at {baseline_path}; run with --save-baseline to record one.")
+    elif regressions:
+        print("Regressions:\n  " + "\n  ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Run the consolidation pipeline from the command line, for one set of workbooks or a whole batch.
+
+Run from project root:
+    python3 scripts/consolidate.py --dms DMS.xlsx --rep rep.xlsx --main MAIN.xlsx --output-dir out
+    python3 scripts/consolidate.py --manifest nightly.csv --output-dir out --jobs 4
+    python3 scripts/consolidate.py --folder exports/site-a --folder exports/site-b --output-dir out
+
+A manifest is a CSV file with dms, rep and main columns (and optionally name),
+or a JSON list of objects with the same keys; relative paths are resolved
+against the manifest's directory. A folder holds one .xlsx file each whose
+name contains "dms", "rep" and "main". Every set runs run_workbook_pipeline
+in its own worker process, exactly as /process does, and is saved to
+<output-dir>/<name>_Main_Consolidated_<timestamp>.xlsx. Per-phase timings are
+printed at the end; the exit code is 1 if any set failed.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from workbook_writer import OUTPUT_MODES  # noqa: E402
+
+ROLES = ('dms', 'rep', 'main')
+PHASES = ('load', 'phase1', 'phase2', 'phase3', 'save')
+
+
+def read_manifest(path):
+    """Return the ``{'name', 'dms', 'rep', 'main'}`` entries listed in a CSV or JSON manifest."""
+    path = Path(path)
+    with open(path, newline='') as handle:
+        if path.suffix.lower() == '.json':
+            rows = json.load(handle)
+        else:
+            rows = list(csv.DictReader(handle))
+    entries = []
+    for number, row in enumerate(rows, start=1):
+        row = {str(key).strip().lower(): str(value).strip() for key, value in row.items() if value}
+        missing = [role for role in ROLES if not row.get(role)]
+        if missing:
+            raise SystemExit(f"{path}: entry {number} is missing {', '.join(missing)}")
+        files = {role: str((path.parent / row[role]).resolve()) for role in ROLES}
+        entries.append(dict(files, name=row.get('name') or Path(files['main']).stem))
+    return entries
+
+
+def discover_folder(folder):
+    """Find the DMS, repJourney and MAIN workbooks in ``folder`` by file name."""
+    folder = Path(folder)
+    found = {role: [] for role in ROLES}
+    for path in sorted(folder.glob('*.xlsx')):
+        if path.name.startswith('~$'):
+            continue  # Excel lock files
+        for role in ROLES:
+            if role in path.stem.lower():
+                found[role].append(path)
+    for role, paths in found.items():
+        if len(paths) != 1:
+            names = ', '.join(path.name for path in paths) or 'none'
+            raise SystemExit(f"{folder}: expected one .xlsx file with '{role}' in its name, found {names}")
+    return dict({role: str(paths[0].resolve()) for role, paths in found.items()}, name=folder.resolve().name)
+
+
+def run_entry(entry, output_dir, options):
+    """Run one entry in this process; return its outcome, output path and span timings."""
+    from metrics import collect_spans
+    from workbook_consolidator import PhaseCache, PipelineError, run_workbook_pipeline
+
+    cache_dir = options.pop('phase_cache', None)
+    partial = Path(output_dir) / f".{entry['name']}.partial.xlsx"
+    result = {'name': entry['name'], 'output': None, 'error': None, 'phase': None}
+    start = time.perf_counter()
+    with collect_spans() as spans:
+        try:
+            _, filename = run_workbook_pipeline(
+                entry['dms'], entry['rep'], entry['main'], None, output=str(partial),
+                phase_cache=PhaseCache(cache_dir) if cache_dir else None, **options,
+            )
+            output = Path(output_dir) / f"{entry['name']}_{filename}"
+            os.replace(partial, output)
+            result['output'] = str(output)
+        except PipelineError as exc:
+            result.update(error=str(exc), phase=exc.phase)
+        except Exception as exc:
+            result['error'] = f"{type(exc).__name__}: {exc}"
+        finally:
+            if partial.exists():
+                partial.unlink()
+    result['timings'] = {name.split('.', 1)[1]: seconds for name, seconds in spans if name.startswith('pipeline.')}
+    result['timings']['total'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(entries, output_dir, jobs, options):
+    """Run every entry, ``jobs`` at a time in worker processes; yield results as they finish."""
+    if jobs == 1 or len(entries) == 1:
+        for entry in entries:
+            yield run_entry(entry, output_dir, dict(options))
+        return
+    # spawn, like run_workbook_pipeline_in_process: forked workers would inherit the parent's threads and state
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=get_context('spawn')) as pool:
+        futures = [pool.submit(run_entry, entry, output_dir, dict(options)) for entry in entries]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def print_timings(results):
+    width = max(len('name'), *(len(result['name']) for result in results))
+    columns = PHASES + ('total',)
+    print(f"{'name':<{width}}  " + ' '.join(f"{column:>8}" for column in columns) + '  result')
+    for result in results:
+        cells = ' '.join(
+            f"{result['timings'][column]:>8.2f}" if column in result['timings'] else f"{'-':>8}"
+            for column in columns
+        )
+        outcome = Path(result['output']).name if result['output'] else 'FAILED'
+        print(f"{result['name']:<{width}}  {cells}  {outcome}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dms', help='DMS export (with --rep and --main)')
+    parser.add_argument('--rep', help='repJourney export')
+    parser.add_argument('--main', help='MAIN workbook to consolidate into')
+    parser.add_argument('--name', help='Output name prefix for --dms/--rep/--main (default: MAIN file name)')
+    parser.add_argument('--manifest', action='append', default=[], help='CSV or JSON manifest (repeatable)')
+    parser.add_argument('--folder', action='append', default=[], help='Folder holding one set (repeatable)')
+    parser.add_argument('--output-dir', default='consolidated', help='Where outputs are written')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Sets processed in parallel')
+    parser.add_argument('--output-mode', choices=OUTPUT_MODES, default='full',
+                        help='Save MAIN in full or rewrite only the modified sheets')
+    parser.add_argument('--compress-level', type=int, choices=range(10), metavar='0-9',
+                        help='Zip deflate level of the outputs (default: zlib default)')
+    parser.add_argument('--phase-cache', help='Directory for cached phase results shared across runs')
+    parser.add_argument('--report', help='Also write the results and timings as JSON here')
+    args = parser.parse_args()
+
+    entries = []
+    single = [args.dms, args.rep, args.main]
+    if any(single):
+        if not all(single):
+            parser.error('--dms, --rep and --main must be given together')
+        files = {role: str(Path(path).resolve()) for role, path in zip(ROLES, single)}
+        entries.append(dict(files, name=args.name or Path(files['main']).stem))
+    for manifest in args.manifest:
+        entries.extend(read_manifest(manifest))
+    for folder in args.folder:
+        entries.append(discover_folder(folder))
+    if not entries:
+        parser.error('give --dms/--rep/--main, --manifest or --folder')
+    names = [entry['name'] for entry in entries]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise SystemExit(f"Duplicate output names: {', '.join(duplicates)}; set distinct names in the manifest")
+    missing = [entry[role] for entry in entries for role in ROLES if not os.path.isfile(entry[role])]
+    if missing:
+        raise SystemExit('Input files not found:\n  ' + '\n  '.join(missing))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    options = {'output_mode': args.output_mode, 'compress_level': args.compress_level}
+    if args.phase_cache:
+        options['phase_cache'] = args.phase_cache
+    jobs = max(1, min(args.jobs, len(entries)))
+    print(f"Consolidating {len(entries)} set(s) with {jobs} worker(s)…", file=sys.stderr)
+
+    results = []
+    for result in run_batch(entries, args.output_dir, jobs, options):
+        results.append(result)
+        if result['error']:
+            print(f"[{len(results)}/{len(entries)}] {result['name']}: failed – {result['error']}", file=sys.stderr)
+        else:
+            print(f"[{len(results)}/{len(entries)}] {result['name']}: {result['output']} "
+                  f"({result['timings']['total']:.1f} s)", file=sys.stderr)
+
+    # Report in input order, whatever order the workers finished in
+    results.sort(key=lambda result: names.index(result['name']))
+    print_timings(results)
+    if args.report:
+        Path(args.report).write_text(json.dumps(results, indent=2))
+    return 1 if any(result['error'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
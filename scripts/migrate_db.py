@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Upgrade data.db (or DATABASE_PATH) to the latest schema version in place (creates a backup).
+
+Run from project root: python3 scripts/migrate_db.py
+"""
+import sqlite3
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from database import DATABASE_PATH, MIGRATIONS, apply_migrations, get_schema_version  # noqa: E402
+
+DB = ROOT / DATABASE_PATH
+BACKUP = DB.with_suffix('.db.bak')
+
+if not DB.exists():
+    print(f"Database not found at {DB}")
+    raise SystemExit(1)
+
+conn = sqlite3.connect(str(DB))
+current = get_schema_version(conn)
+latest = MIGRATIONS[-1][0]
+print(f"Schema version: {current} (latest: {latest})")
+
+if current >= latest:
+    print("Schema is up to date; nothing to do.")
+    conn.close()
+    raise SystemExit(0)
+
+print(f"Backing up {DB} -> {BACKUP}")
+# The backup API also captures pages still in the WAL file
+backup = sqlite3.connect(str(BACKUP))
+conn.backup(backup)
+backup.close()
+
+for version in apply_migrations(conn):
+    description = next(desc for v, desc, _ in MIGRATIONS if v == version)
+    print(f"Applied migration {version}: {description}")
+
+conn.close()
+print("Done.")
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""Send a test alert digest through the configured SMTP server and report the outcome.
+
+Run from project root against a local stand-in, e.g.:
+    python -m aiosmtpd -n -l localhost:8025 &
+    SMTP_HOST=localhost SMTP_PORT=8025 SMTP_SSL=0 python3 scripts/send_test_alert.py DEV1 DEV2
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from email_alerts import dispatcher, send_alert  # noqa: E402
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('devices', nargs='+', help='Device IDs to include in the digest')
+parser.add_argument('--to', action='append', help='Recipient (repeatable; defaults to ALERT_RECIPIENTS)')
+parser.add_argument('--timeout', type=float, default=60)
+args = parser.parse_args()
+
+print(send_alert(args.devices, recipients=args.to)["msg"])
+if not dispatcher.flush(timeout=args.timeout):
+    print(f"Still sending after {args.timeout:.0f} s")
+print(dispatcher.stats())
+raise SystemExit(0 if dispatcher.stats()["failed"] == 0 else 1)
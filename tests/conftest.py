@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules live at the project root, as for the scripts/ tools
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,169 @@
+import time
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from openpyxl import Workbook
+
+import database
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    monkeypatch.setenv('PIPELINE_SPOOL_DIR', str(tmp_path / 'spool'))
+    previous = database.DATABASE_PATH
+    database.set_database_path(tmp_path / 'app.db')
+    import app as app_module
+    from content_cache import ContentCache
+
+    database.init_db()
+    monkeypatch.setattr(app_module, 'upload_cache', ContentCache(max_age=60, max_entries=10))
+    yield app_module
+    database.set_database_path(previous)
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def _telemetry_file(rows):
+    workbook = Workbook()
+    workbook.active.append(['#', 'Device_ID', 'Last_Sighted_Date', 'Last_Sighted_Location', 'Location_Code'])
+    for row in rows:
+        workbook.active.append([None, *row])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def _upload(client, data, name='telemetry.xlsx'):
+    return client.post('/upload', data={'file': (BytesIO(data), name)})
+
+
+def test_upload_with_every_row_rejected_fails_and_is_not_cached(client):
+    with open(ROOT / 'sample_telemetry.xlsx', 'rb') as handle:
+        data = handle.read()
+
+    for _ in range(2):
+        response = _upload(client, data)
+        assert response.status_code == 400
+        body = response.get_json()
+        assert body['rejected'] == 51
+        assert body['inserted'] + body['updated'] + body['unchanged'] == 0
+        assert 'rejected' in body['error']
+        assert not body.get('cached')
+
+
+def test_upload_with_rejects_is_retried(client):
+    data = _telemetry_file([
+        ('D1', datetime(2025, 1, 1), 'Port', 'MICP'),
+        ('D2', 'not a date', 'Port', 'MICP'),
+    ])
+    first = _upload(client, data).get_json()
+    second = _upload(client, data).get_json()
+    assert (first['inserted'], first['rejected'], first['cached']) == (1, 1, False)
+    assert (second['unchanged'], second['rejected'], second['cached']) == (1, 1, False)
+
+    clean = _telemetry_file([('D3', datetime(2025, 1, 1), 'Port', 'MICP')])
+    assert _upload(client, clean).get_json()['cached'] is False
+    assert _upload(client, clean).get_json()['cached'] is True
+
+
+def test_float_device_ids_are_stored_as_integers(client):
+    response = _upload(client, _telemetry_file([(11592.0, datetime(2025, 1, 1), 'Port', 'MICP')]))
+    assert response.status_code == 200
+    rows, _, _ = database.query_data()
+    assert [row['Device_ID'] for row in rows] == ['11592']
+
+
+
+def test_viewing_alerts_does_not_write(client, app_module, monkeypatch):
+    _upload(client, _telemetry_file([('D1', datetime(2020, 1, 1), 'Port', 'MICP')]))
+
+    def refuse():
+        raise AssertionError('GET handlers must not re-evaluate alerts')
+
+    monkeypatch.setattr(app_module, 'refresh_alerts', refuse)
+    assert client.get('/alerts').status_code == 200
+    response = client.get('/alerts/data')
+    assert [alert['Device_ID'] for alert in response.get_json()['alerts']] == ['D1']
+
+
+@pytest.fixture
+def fake_pipeline(app_module, tmp_path, monkeypatch):
+    from content_cache import ContentCache
+
+    runs = []
+
+    def run(dms, rep, main, progress_callback, output, **options):
+        runs.append(options)
+        with open(output, 'wb') as handle:
+            handle.write(b'consolidated')
+        return output, 'Main_Consolidated.xlsx'
+
+    monkeypatch.setattr(app_module, 'PIPELINE_EXECUTION', 'thread')
+    monkeypatch.setattr(app_module, 'run_workbook_pipeline', run)
+    monkeypatch.setattr(app_module, 'process_cache', ContentCache(
+        max_age=60, max_entries=10, directory=str(tmp_path / 'process-cache'),
+    ))
+    return runs
+
+
+def _process(client, **fields):
+    files = {key: (BytesIO(b'workbook ' + key.encode()), f'{key}.xlsx')
+             for key in ('dms_file', 'rep_file', 'main_file')}
+    return client.post('/process', data=dict(files, **fields)).get_json()
+
+
+def _wait(client, job_id):
+    for _ in range(200):
+        snapshot = client.get(f'/progress/{job_id}').get_json()
+        if snapshot['overall_status'] in ('completed', 'error'):
+            return snapshot
+        time.sleep(0.01)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+def test_cache_entry_evicted_after_lookup_runs_the_pipeline(client, app_module, fake_pipeline, monkeypatch):
+    first = _process(client)
+    assert _wait(client, first['job_id'])['overall_status'] == 'completed'
+    assert _process(client)['cached'] is True
+
+    # The file disappears between the lookup and the copy
+    lookup = app_module.process_cache.get
+
+    def get_then_evict(key):
+        entry = lookup(key)
+        app_module.process_cache.clear()
+        return entry
+
+    monkeypatch.setattr(app_module.process_cache, 'get', get_then_evict)
+    response = _process(client)
+    assert response['cached'] is False
+    assert _wait(client, response['job_id'])['overall_status'] == 'completed'
+    assert client.get(f"/download/{response['job_id']}").data == b'consolidated'
+    assert len(fake_pipeline) == 2
+
+
+def test_profiled_run_skips_the_caches(client, fake_pipeline):
+    assert _wait(client, _process(client)['job_id'])['overall_status'] == 'completed'
+
+    response = _process(client, profile='1')
+    assert response['cached'] is False
+    _wait(client, response['job_id'])
+    assert len(fake_pipeline) == 2
+    assert fake_pipeline[-1]['phase_cache'] is None
+    assert fake_pipeline[-1]['profile_path']
+
+
+def test_jobs_are_only_reachable_by_id(client, fake_pipeline):
+    job_id = _process(client)['job_id']
+    assert _wait(client, job_id)['download_ready']
+
+    assert client.get('/progress').get_json()['overall_status'] == 'idle'
+    assert client.get('/download').status_code == 400
+    assert client.get(f'/download/{job_id}').data == b'consolidated'
@@ -0,0 +1,32 @@
+import os
+
+from content_cache import ContentCache
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_put_same_key_replaces_file(tmp_path):
+    cache = ContentCache(max_age=3600, max_entries=10, directory=str(tmp_path / 'cache'))
+    cache.put('key', {'filename': 'a.xlsx'}, path=_write(tmp_path / 'a.xlsx', b'first'))
+    cache.put('key', {'filename': 'b.xlsx'}, path=_write(tmp_path / 'b.xlsx', b'second'))
+
+    cached = cache.get('key')
+    assert cached is not None
+    assert cached['filename'] == 'b.xlsx'
+    with open(cached['path'], 'rb') as handle:
+        assert handle.read() == b'second'
+    # No staged copies are left behind
+    assert os.listdir(tmp_path / 'cache') == ['key.xlsx']
+
+
+def test_eviction_removes_files(tmp_path):
+    cache = ContentCache(max_age=3600, max_entries=1, directory=str(tmp_path / 'cache'))
+    cache.put('one', {}, path=_write(tmp_path / 'one.xlsx', b'1'))
+    cache.put('two', {}, path=_write(tmp_path / 'two.xlsx', b'2'))
+
+    assert cache.get('one') is None
+    assert cache.get('two') is not None
+    assert os.listdir(tmp_path / 'cache') == ['two.xlsx']
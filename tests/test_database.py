@@ -0,0 +1,251 @@
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import database
+
+
+@pytest.fixture
+def fresh_db(tmp_path):
+    previous = database.DATABASE_PATH
+
+    def make(name):
+        database.set_database_path(tmp_path / name)
+        database.init_db()
+
+    yield make
+    database.set_database_path(previous)
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=database.TELEMETRY_COLUMNS)
+
+
+def _table():
+    conn = database.connect()
+    try:
+        return conn.execute('''
+            SELECT Device_ID, Last_Sighted_Date, Last_Sighted_Location, Location_Code, Last_Sighted_Epoch
+            FROM telemetry ORDER BY Device_ID
+        ''').fetchall()
+    finally:
+        database.release(conn)
+
+
+EXISTING = [
+    ('D1', '2025-01-01 00:00:00', 'Head Office', 'HQ'),
+    ('D2', '2025-03-01 00:00:00', 'Port', 'MICP'),
+    # Stored without a usable date
+    ('D4', None, 'Port', 'MICP'),
+    ('D5', '', 'Depot', 'DVO'),
+    ('D6', 'not a date', 'Depot', 'DVO'),
+]
+BATCH = [
+    # Repeated new device: one insert, then a newer and an older sighting
+    ('D3', '2025-02-01 00:00:00', 'Port', 'MICP'),
+    ('D3', '2025-02-05 00:00:00', 'Depot', 'DVO'),
+    ('D3', '2025-02-03 00:00:00', 'Head Office', 'HQ'),
+    # Existing device sighted twice, each newer than the last
+    ('D1', '2025-01-02 00:00:00', 'Port', 'MICP'),
+    ('D1', '2025-01-03 00:00:00', 'Depot', 'DVO'),
+    # Existing device: older, equal and unparseable sightings leave it alone
+    ('D2', '2025-02-01 00:00:00', 'Depot', 'DVO'),
+    ('D2', '2025-03-01 00:00:00', 'Depot', 'DVO'),
+    ('D2', 'not a date', 'Depot', 'DVO'),
+    # Existing devices without a usable date: an unreadable date leaves them, a readable one replaces them
+    ('D4', '2025-01-05 00:00:00', 'Head Office', 'HQ'),
+    ('D5', 'still not a date', 'Port', 'MICP'),
+    ('D5', '2025-01-06 00:00:00', 'Head Office', 'HQ'),
+    ('D6', '', 'Port', 'MICP'),
+]
+
+
+@pytest.mark.parametrize('batch', [BATCH, list(reversed(BATCH))])
+def test_bulk_upsert_matches_row_by_row(fresh_db, batch):
+    results = {}
+    for name, upsert in (('bulk', database.update_or_insert_data),
+                         ('reference', database.update_or_insert_data_row_by_row)):
+        fresh_db(f'{name}.db')
+        upsert(_frame(EXISTING))
+        counts = upsert(_frame(batch))
+        results[name] = (counts, _table())
+
+    assert results['bulk'] == results['reference']
+    assert sum(results['bulk'][0]) == len(batch)
+
+
+def test_row_by_row_rolls_back_on_error(fresh_db, monkeypatch):
+    fresh_db('rollback.db')
+
+    def fail(*args):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(database, '_evaluate_alerts', fail)
+    with pytest.raises(RuntimeError):
+        database.update_or_insert_data_row_by_row(_frame(EXISTING))
+    assert _table() == []
+
+    # The failed run must not keep holding the write lock
+    monkeypatch.undo()
+    assert database.update_or_insert_data(_frame(EXISTING)) == (len(EXISTING), 0, 0)
+
+
+@pytest.mark.parametrize('sort', sorted(database.SORT_COLUMNS))
+@pytest.mark.parametrize('direction', ['asc', 'desc'])
+def test_keyset_pages_match_offset_pages(fresh_db, sort, direction):
+    fresh_db('paging.db')
+    rows = [(f'D{i:03}', None if i % 7 == 0 else f'2025-01-{i % 5 + 1:02} 00:00:00',
+             None if i % 4 == 0 else f'Site {i % 3}', None if i % 6 == 0 else f'C{i % 2}')
+            for i in range(50)]
+    database.update_or_insert_data(_frame(rows))
+
+    expected, total, _ = database.query_data(sort=sort, direction=direction, limit=100)
+    assert total == 50
+    paged, cursor = [], None
+    while True:
+        page, page_total, cursor = database.query_data(sort=sort, direction=direction, limit=8,
+                                                       after=cursor, count=False)
+        assert page_total is None
+        paged.extend(page)
+        if cursor is None:
+            break
+    assert paged == expected
+
+
+FILTER_ROWS = [
+    ('D1', '2025-01-01 00:00:00', 'Head Office', 'HQ'),
+    ('D2', '2025-01-02 00:00:00', 'Port Head', 'HQ2'),
+    ('D3', None, 'Branch office', 'BR'),
+    ('D4', '2024-12-31 00:00:00', 'Depot "North"', '50%'),
+]
+
+
+@pytest.mark.parametrize('filters, expected', [
+    ({'location': 'office'}, ['D1', 'D3']),
+    ({'location': 'HEAD'}, ['D1', 'D2']),
+    ({'location': 'head', 'location_code': 'hq'}, ['D1', 'D2']),
+    ({'location': 'ort h', 'device': 'd'}, ['D2']),
+    ({'location': '"North"'}, ['D4']),
+    ({'location_code': '%'}, ['D4']),
+    ({'location_code': '0%'}, ['D4']),
+])
+def test_text_filters_match_substrings(fresh_db, filters, expected):
+    fresh_db('filters.db')
+    database.update_or_insert_data(_frame(FILTER_ROWS))
+    rows, total, _ = database.query_data(**filters)
+    assert [row['Device_ID'] for row in rows] == expected
+    assert total == len(expected)
+
+
+@pytest.mark.parametrize('date_type, expected', [
+    ('on', ['D1', 'D3']),
+    ('before', ['D3', 'D4']),
+    ('after', ['D2', 'D3']),
+])
+def test_date_filter_keeps_undated_rows(fresh_db, date_type, expected):
+    fresh_db('dates.db')
+    database.update_or_insert_data(_frame(FILTER_ROWS))
+    rows, total, _ = database.query_data(date_type=date_type, date='2025-01-01')
+    assert [row['Device_ID'] for row in rows] == expected
+    assert total == len(expected)
+
+
+def test_search_index_follows_updates_and_deletes(fresh_db):
+    fresh_db('search.db')
+    database.update_or_insert_data(_frame(FILTER_ROWS))
+    database.update_or_insert_data(_frame([('D1', '2025-02-01 00:00:00', 'Warehouse', 'WH')]))
+    assert database.query_data(location='office')[1] == 1
+    assert [row['Device_ID'] for row in database.query_data(location='wareh')[0]] == ['D1']
+
+    conn = database.connect()
+    try:
+        plan = conn.execute(
+            'EXPLAIN QUERY PLAN SELECT rowid FROM telemetry_search WHERE telemetry_search MATCH ?',
+            ('Last_Sighted_Location : "office"',),
+        ).fetchall()
+    finally:
+        database.release(conn)
+    assert 'VIRTUAL TABLE INDEX' in str(plan)
+
+    database.clear_data()
+    assert database.query_data(location='ware') == ([], 0, None)
+
+
+def test_migration_stores_float_device_ids_as_integers(fresh_db, monkeypatch):
+    monkeypatch.setattr(database, 'MIGRATIONS', database.MIGRATIONS[:7])
+    fresh_db('legacy.db')
+    # Keys as older uploads stored Excel's float IDs, next to ones stored as integers
+    database.update_or_insert_data(_frame([
+        ('11592.0', '2025-01-01 00:00:00', 'Port', 'MICP'),
+        ('200.0', '2025-03-01 00:00:00', 'Depot', 'DVO'),
+        ('200', '2025-02-01 00:00:00', 'Port', 'MICP'),
+        ('300.0', '2025-01-01 00:00:00', 'Port', 'MICP'),
+        ('300', '2025-02-01 00:00:00', 'Head Office', 'HQ'),
+        ('A1.0', '2025-01-01 00:00:00', 'Port', 'MICP'),
+    ]))
+    monkeypatch.undo()
+    conn = database.connect()
+    try:
+        assert database.apply_migrations(conn) == [8]
+    finally:
+        database.release(conn)
+
+    assert [row[:4] for row in _table()] == [
+        ('11592', '2025-01-01 00:00:00', 'Port', 'MICP'),
+        ('200', '2025-03-01 00:00:00', 'Depot', 'DVO'),
+        ('300', '2025-02-01 00:00:00', 'Head Office', 'HQ'),
+        ('A1.0', '2025-01-01 00:00:00', 'Port', 'MICP'),
+    ]
+    assert database.query_data(device='1159')[1] == 1
+    summary = database.get_dashboard_summary(today=date(2025, 3, 2))
+    assert summary['total_devices'] == 4
+
+
+@pytest.fixture
+def local_timezone(monkeypatch):
+    def use(name):
+        monkeypatch.setenv('TZ', name)
+        time.tzset()
+
+    yield use
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.parametrize('zone', ['Asia/Manila', 'America/New_York', 'UTC'])
+def test_alerts_compare_local_sighting_times_with_local_now(fresh_db, local_timezone, zone):
+    local_timezone(zone)
+    fresh_db('alerts.db')
+    # Just past the default 14 day soft threshold in local time, whatever the UTC offset
+    sighted = datetime.now() - timedelta(days=14, hours=1)
+    recent = datetime.now() - timedelta(days=13, hours=23)
+    database.update_or_insert_data(_frame([
+        ('D1', sighted.strftime('%Y-%m-%d %H:%M:%S'), 'Port', 'MICP'),
+        ('D2', recent.strftime('%Y-%m-%d %H:%M:%S'), 'Port', 'MICP'),
+    ]))
+
+    alerts = database.get_active_alerts()
+    assert [(alert['Device_ID'], alert['level'], alert['days_unseen']) for alert in alerts] == [('D1', 'soft', 14)]
+
+
+def test_failed_migration_leaves_no_partial_schema(fresh_db, monkeypatch):
+    fresh_db('migrate.db')
+    latest = database.MIGRATIONS[-1][0]
+
+    def half_done(conn):
+        conn.execute('CREATE TABLE half_done (id INTEGER)')
+        conn.execute('CREATE INDEX idx_half_done ON half_done (id)')
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(database, 'MIGRATIONS', database.MIGRATIONS + [(latest + 1, 'fails', half_done)])
+    with pytest.raises(RuntimeError):
+        database.init_db()
+
+    conn = database.connect()
+    try:
+        assert database.get_schema_version(conn) == latest
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '%half_done'").fetchall() == []
+    finally:
+        database.release(conn)
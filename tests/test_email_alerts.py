@@ -0,0 +1,40 @@
+from email_alerts import AlertDispatcher
+
+
+def _dispatcher(deliver):
+    dispatcher = AlertDispatcher(batch_window=0, max_retries=3, backoff=0)
+    dispatcher._deliver = deliver
+    return dispatcher
+
+
+def test_unexpected_delivery_error_fails_the_batch_and_keeps_the_thread():
+    calls = []
+
+    def deliver(digests):
+        calls.append(dict(digests))
+        if len(calls) == 1:
+            raise ValueError('bad address')
+        digests.clear()
+
+    dispatcher = _dispatcher(deliver)
+    dispatcher.enqueue(['D1'], ['bad'])
+    assert dispatcher.flush(timeout=5)
+    stats = dispatcher.stats()
+    assert (stats['pending'], stats['failed']) == (0, 1)
+    assert 'ValueError' in stats['last_error']
+    # Not retried: the same input would fail again
+    assert len(calls) == 1
+
+    dispatcher.enqueue(['D2'], ['ops@example.com'])
+    assert dispatcher.flush(timeout=5)
+    assert calls[-1] == {'ops@example.com': ['D2']}
+    dispatcher.stop(timeout=5)
+
+
+def test_error_outside_delivery_still_releases_flush():
+    dispatcher = _dispatcher(lambda digests: digests.clear())
+    # Unhashable device IDs make coalescing the batch fail
+    dispatcher.enqueue([['D1']], ['ops@example.com'])
+    assert dispatcher.flush(timeout=5)
+    assert dispatcher.stats()['failed'] == 1
+    dispatcher.stop(timeout=5)
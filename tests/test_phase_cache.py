@@ -0,0 +1,28 @@
+import os
+import stat
+
+import pytest
+
+from workbook_consolidator import PhaseCache, ensure_private_directory
+
+
+def test_cache_directory_is_private(tmp_path):
+    cache = PhaseCache(tmp_path / 'phase-cache')
+    assert stat.S_IMODE(os.stat(cache.directory).st_mode) == 0o700
+
+    cache.store(1, 'abc', (['header'], [[1, 2]]))
+    assert cache.load(1, 'abc') == (['header'], [[1, 2]])
+
+
+def test_open_directory_is_tightened(tmp_path):
+    shared = tmp_path / 'shared'
+    shared.mkdir(mode=0o777)
+    os.chmod(shared, 0o777)
+    ensure_private_directory(shared)
+    assert stat.S_IMODE(os.stat(shared).st_mode) == 0o700
+
+
+def test_foreign_directory_is_refused(tmp_path, monkeypatch):
+    monkeypatch.setattr(os, 'geteuid', lambda: os.stat(tmp_path).st_uid + 1)
+    with pytest.raises(PermissionError):
+        PhaseCache(tmp_path)
@@ -0,0 +1,153 @@
+from datetime import datetime
+from io import BytesIO
+
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.formula.translate import Translator
+from openpyxl.styles import Font
+
+import workbook_consolidator as consolidator
+
+
+def _reload(workbook):
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return load_workbook(BytesIO(buffer.getvalue()))
+
+
+def _values(sheet):
+    return [list(row) for row in sheet.iter_rows(values_only=True)]
+
+
+@pytest.mark.parametrize('formula', [
+    '=A10+B10',
+    '=SUM($A$1:A10)',
+    '=A$10+$B10*C10',
+    '=VLOOKUP(A10,Lookup!$A:$C,3,FALSE)',
+    "='Other Sheet'!B10*2",
+    '=SUM(10:12)',
+    '=SUM(A10:B12,C3)',
+    '=IF(C10="{x}",D10,"")',
+    '=Rate*A10',
+    '=TODAY()-B10',
+])
+@pytest.mark.parametrize('delta', [1, 7, 250])
+def test_formula_row_shifter_matches_translator(formula, delta):
+    expected = Translator(formula, origin='D10').translate_formula(f'D{10 + delta}')
+    assert consolidator._FormulaRowShifter(formula).shift(delta) == expected
+
+
+def test_replace_data_rows_rebuilds_rows_below_header():
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Title'])
+    sheet.append(['Device', 'Date', 'Note'])
+    for index in range(5):
+        sheet.append([f'OLD{index}', index, 'stale'])
+    sheet['A1'].font = Font(bold=True)
+
+    written = consolidator._replace_data_rows(sheet, 3, [['D1', 1], ['D2', None, 'kept'], [None, 3]])
+
+    assert written == 3
+    assert sheet.max_row == 5
+    sheet.append(['next'])
+    reloaded = _reload(workbook)
+    assert _values(reloaded.active) == [
+        ['Title', None, None],
+        ['Device', 'Date', 'Note'],
+        ['D1', 1, None],
+        ['D2', None, 'kept'],
+        [None, 3, None],
+        ['next', None, None],
+    ]
+    assert reloaded.active['A1'].font.bold
+
+
+def test_rewrite_month_rows_clears_blanks_and_shifts_formulas():
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Device ID', 'Disarm Date', 'Destination'])
+    sheet.append(['A', 'stale-1', '=B2&"@"'])
+    sheet.append(['B', 'stale-2', '=B3&"@"'])
+    sheet['B2'].font = Font(italic=True)
+
+    rows = [
+        {'device id': 'X', 'disarm date': None},
+        {'device id': 'Y', 'disarm date': 'new-2'},
+        {'device id': 'Z', 'disarm date': 'new-3'},
+        {'device id': 'W'},
+    ]
+    written = consolidator._rewrite_month_rows(
+        sheet, 2, rows, [(1, 'device id'), (2, 'disarm date')], {3: '=B3&"@"'}, 3, 2,
+    )
+
+    assert written == 4
+    reloaded = _reload(workbook).active
+    assert _values(reloaded) == [
+        ['Device ID', 'Disarm Date', 'Destination'],
+        # A blank value clears what the row held before instead of keeping another device's date
+        ['X', None, '=B2&"@"'],
+        ['Y', 'new-2', '=B3&"@"'],
+        # Added rows get the last row's formulas moved down to their own row
+        ['Z', 'new-3', '=B4&"@"'],
+        ['W', None, '=B5&"@"'],
+    ]
+    assert reloaded['B2'].font.italic
+
+
+def test_rewrite_month_rows_drops_surplus_rows():
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Device ID', 'Destination'])
+    for device in 'ABCD':
+        sheet.append([device, 'somewhere'])
+
+    consolidator._rewrite_month_rows(sheet, 2, [{'device id': 'X'}], [(1, 'device id')], {}, 5, 4)
+
+    assert sheet.max_row == 2
+    sheet.append(['next'])
+    assert _values(_reload(workbook).active) == [['Device ID', 'Destination'], ['X', 'somewhere'], ['next', None]]
+
+
+def _rep_workbook(rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Begin Journey Date', 'Device ID', 'Disarm Date'])
+    for row in rows:
+        sheet.append(row)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def test_blank_rep_disarm_date_does_not_leak_into_main():
+    main_wb = Workbook()
+    main = main_wb.active
+    main.title = 'MAIN'
+    main.append(['Device Nos', 'Last Disarmed Date', 'Last Disarmed Area'])
+    for device in ('100', '200', '300'):
+        main.append([device, None, None])
+    month = main_wb.create_sheet('Oct2026')
+    month.append(['Begin Journey Date', 'Device ID', 'Disarm Date', 'Destination'])
+    month.append([datetime(2026, 9, 30), 900, 'stale-900', '=C2&" area"'])
+    month.append([datetime(2026, 9, 29), 901, 'stale-901', '=C3&" area"'])
+
+    rep = _rep_workbook([
+        [datetime(2026, 10, 1), 300, 'disarm-300'],
+        [datetime(2026, 10, 3), 100, None],
+        [datetime(2026, 10, 2), 200, 'disarm-200'],
+    ])
+    context = consolidator._phase_two_merge_rep(rep, main_wb, None)
+    consolidator._phase_three_update_main(main_wb, context, None)
+
+    assert _values(month) == [
+        ['Begin Journey Date', 'Device ID', 'Disarm Date', 'Destination'],
+        [datetime(2026, 10, 3), 100, None, '=C2&" area"'],
+        [datetime(2026, 10, 2), 200, 'disarm-200', '=C3&" area"'],
+        [datetime(2026, 10, 1), 300, 'disarm-300', '=C4&" area"'],
+    ]
+    assert _values(main)[1:] == [
+        ['100', None, '=C2&" area"'],
+        ['200', 'disarm-200', '=C3&" area"'],
+        ['300', 'disarm-300', '=C4&" area"'],
+    ]
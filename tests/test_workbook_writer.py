@@ -0,0 +1,152 @@
+import zipfile
+from datetime import datetime
+from io import BytesIO
+
+import pytest
+from openpyxl import Workbook, load_workbook
+from openpyxl.chart import BarChart, Reference
+from openpyxl.comments import Comment
+from openpyxl.styles import Font
+
+from workbook_consolidator import run_workbook_pipeline
+from workbook_writer import save_modified_sheets, save_workbook
+
+
+def _save(workbook):
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def _main_workbook():
+    workbook = Workbook()
+    main = workbook.active
+    main.title = 'MAIN'
+    main.append(['Device Nos', 'Last Disarmed Date', 'Last Disarmed Area'])
+    for device in range(100, 110):
+        main.append([str(device), None, None])
+    main['A1'].font = Font(bold=True)
+    month = workbook.create_sheet('Oct2026')
+    month.append(['Begin Journey Date', 'Device ID', 'Disarm Date', 'Destination'])
+    month.append([datetime(2026, 9, 30), 900, datetime(2026, 9, 30), '=C2&" area"'])
+    dms = workbook.create_sheet('DMS Dump')
+    dms.append(['Device_ID', 'Status'])
+    dms.append(['old', 'stale'])
+    notes = workbook.create_sheet('Notes')
+    notes.append(['Owner', 'Count'])
+    notes.append(['Ops', 3])
+    notes['B3'] = '=SUM(B2:B2)*2'
+    notes['B3'].number_format = '0.00'
+    notes.merge_cells('A5:B5')
+    notes['A5'] = 'Merged note'
+    return workbook
+
+
+def _inputs():
+    dms = Workbook()
+    dms.active.append(['Device_ID', 'Status'])
+    for device in range(100, 120):
+        dms.active.append([f'000{device}', 'armed'])
+    rep = Workbook()
+    rep.active.append(['Begin Journey Date', 'Device ID', 'Disarm Date'])
+    for offset, device in enumerate(range(100, 115)):
+        rep.active.append([datetime(2026, 10, 1 + offset), device, datetime(2026, 10, 2 + offset)])
+    return _save(dms), _save(rep)
+
+
+def _run(main_bytes, output_mode):
+    dms, rep = _inputs()
+    output, _ = run_workbook_pipeline(dms, rep, main_bytes, None, output_mode=output_mode)
+    return output.getvalue()
+
+
+def _sheets(data):
+    workbook = load_workbook(BytesIO(data))
+    return {
+        sheet.title: (
+            [[(cell.value, cell.number_format, cell.font.b) for cell in row] for row in sheet.iter_rows()],
+            sorted(str(merged) for merged in sheet.merged_cells.ranges),
+        )
+        for sheet in workbook.worksheets
+    }
+
+
+def _part(data, name):
+    with zipfile.ZipFile(BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        return archive.read(name)
+
+
+def test_modified_output_matches_full_save():
+    main_bytes = _save(_main_workbook())
+    full = _run(main_bytes, 'full')
+    modified = _run(main_bytes, 'modified')
+
+    assert _sheets(modified) == _sheets(full)
+    # The untouched sheet is copied through byte for byte
+    notes_part = 'xl/worksheets/sheet4.xml'
+    assert _part(modified, notes_part) == _part(main_bytes, notes_part)
+
+
+def test_untouched_sheet_keeps_its_chart():
+    workbook = _main_workbook()
+    chart = BarChart()
+    chart.add_data(Reference(workbook['Notes'], min_col=2, min_row=1, max_row=2), titles_from_data=True)
+    workbook['Notes'].add_chart(chart, 'D2')
+    main_bytes = _save(workbook)
+
+    modified = _run(main_bytes, 'modified')
+
+    assert _sheets(modified) == _sheets(_run(main_bytes, 'full'))
+    assert _part(modified, 'xl/charts/chart1.xml') == _part(main_bytes, 'xl/charts/chart1.xml')
+    assert len(load_workbook(BytesIO(modified))['Notes']._charts) == 1
+
+
+def _with_chart(workbook):
+    chart = BarChart()
+    chart.add_data(Reference(workbook['MAIN'], min_col=1, min_row=1, max_row=3))
+    workbook['MAIN'].add_chart(chart, 'E2')
+
+
+def _with_comment(workbook):
+    workbook['MAIN']['A2'].comment = Comment('checked', 'ops')
+
+
+def _with_image(workbook):
+    pytest.importorskip('PIL')
+    from openpyxl.drawing.image import Image
+    from PIL import Image as PILImage
+
+    picture = BytesIO()
+    PILImage.new('RGB', (4, 4)).save(picture, format='PNG')
+    workbook['MAIN'].add_image(Image(picture), 'E2')
+
+
+@pytest.mark.parametrize('decorate', [_with_chart, _with_comment, _with_image])
+def test_rewritten_sheet_with_drawings_falls_back_to_full_save(decorate):
+    workbook = _main_workbook()
+    decorate(workbook)
+    main_bytes = _save(workbook)
+
+    loaded = load_workbook(BytesIO(main_bytes))
+    assert save_modified_sheets(loaded, BytesIO(), main_bytes, ['MAIN']) is False
+
+    modified = _run(main_bytes, 'modified')
+    assert _sheets(modified) == _sheets(_run(main_bytes, 'full'))
+    reopened = load_workbook(BytesIO(modified))['MAIN']
+    assert len(reopened._charts) + len(reopened._images) + (reopened['A2'].comment is not None) == 1
+
+
+def test_renamed_or_added_sheets_fall_back():
+    main_bytes = _save(_main_workbook())
+    renamed = load_workbook(BytesIO(main_bytes))
+    renamed['Notes'].title = 'Renamed'
+    assert save_modified_sheets(renamed, BytesIO(), main_bytes, ['MAIN']) is False
+    added = load_workbook(BytesIO(main_bytes))
+    added.create_sheet('Extra')
+    assert save_modified_sheets(added, BytesIO(), main_bytes, ['MAIN']) is False
+
+
+def test_compress_level_is_validated():
+    with pytest.raises(ValueError):
+        save_workbook(Workbook(), BytesIO(), compress_level=10)
@@ -1,14 +1,53 @@
 from __future__ import annotations
 
+import hashlib
+import multiprocessing
+import os
+import pickle
+import queue
 import re
+import stat
+import tempfile
+import time
+from contextlib import nullcontext
 from datetime import datetime
 from io import BytesIO
-from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 from openpyxl import load_workbook
-from openpyxl.utils.datetime import from_excel as excel_date
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE, Cell
+from openpyxl.formula.tokenizer import Token, Tokenizer, TokenizerError
+from openpyxl.formula.translate import Translator
+from openpyxl.utils.datetime import WINDOWS_EPOCH
 from openpyxl.worksheet.worksheet import Worksheet
 
+from date_parser import DateParser
+from metrics import collect_spans, observe_span, profiled, span
+from workbook_writer import OUTPUT_MODES, save_modified_sheets, save_workbook
+
+MAX_CELL_TEXT = 32767  # Excel's per-cell character limit
+# Integers up to this size survive the int(float(...)) round trip of device ID normalization
+_EXACT_FLOAT_INT = 2 ** 53
+
+
+PROGRESS_INTERVAL = 0.2  # seconds between row-progress reports per phase
+
+
+class ProgressThrottle:
+    """Time-based gate for progress reports, so hot loops report at a steady rate."""
+
+    def __init__(self, interval: float = PROGRESS_INTERVAL):
+        self.interval = interval
+        self._next_report = 0.0
+
+    def ready(self) -> bool:
+        now = time.monotonic()
+        if now < self._next_report:
+            return False
+        self._next_report = now + self.interval
+        return True
+
+
 class PipelineError(Exception):
     """Custom exception for consolidation pipeline errors."""
 
@@ -17,43 +56,324 @@ class PipelineError(Exception):
         self.phase = phase
 
 
-def run_workbook_pipeline(
-    dms_bytes: bytes,
-    rep_bytes: bytes,
-    main_bytes: bytes,
-    progress_callback: Callable[..., None],
-) -> Tuple[BytesIO, str]:
-    """Execute all pipeline phases and return the consolidated workbook buffer."""
+WorkbookSource = Union[str, os.PathLike, bytes]
+WorkbookTarget = Union[str, os.PathLike, BinaryIO]
+
+# Bump when the shape of cached phase results changes so stale pickles are ignored
+PHASE_CACHE_VERSION = 1
+
+
+def ensure_private_directory(path: Union[str, os.PathLike]) -> str:
+    """Create ``path`` accessible only to this user, or check that an existing one is.
+
+    Files in spool and cache directories are trusted (phase results are
+    unpickled), so a directory owned by another user raises ``PermissionError``
+    instead of being used. One of ours that is open to others is tightened.
+    """
+    path = os.fspath(path)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if os.name != 'posix':
+        return path
+    info = os.stat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.geteuid():
+        raise PermissionError(f"{path} is not a directory owned by the current user; refusing to use it.")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+class PhaseCache:
+    """On-disk store of intermediate phase results keyed by input fingerprints.
+
+    Phase 1 keeps the normalized DMS rows, phase 2 the sorted repJourney rows
+    and phase 3 the device lookup built from the refreshed month sheet, so a run
+    where only some inputs changed skips re-reading the unchanged ones. Only the
+    ``max_entries`` most recently used results are kept per phase. Entries are
+    plain files, so the cache is shared with pipelines run in child processes.
+    Entries are pickles, so ``directory`` must be private to this user (see
+    :func:`ensure_private_directory`).
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike], max_entries: int = 4):
+        self.directory = ensure_private_directory(directory)
+        self.max_entries = max_entries
+
+    def load(self, phase: int, fingerprint: str):
+        """Return the stored result for ``phase`` and ``fingerprint``, or ``None``."""
+        path = self._path(phase, fingerprint)
+        try:
+            with open(path, 'rb') as handle:
+                value = pickle.load(handle)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # Truncated or incompatible entry; drop it and recompute
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def store(self, phase: int, fingerprint: str, value):
+        path = self._path(phase, fingerprint)
+        fd, temp_path = tempfile.mkstemp(prefix=f"phase{phase}-", suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                pickle.dump(value, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except BaseException:
+            self._remove(temp_path)
+            raise
+        self._evict(phase)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.pickle'):
+                self._remove(os.path.join(self.directory, name))
+
+    def _path(self, phase: int, fingerprint: str) -> str:
+        return os.path.join(self.directory, f"phase{phase}-{fingerprint}.pickle")
+
+    def _evict(self, phase: int):
+        prefix = f"phase{phase}-"
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith('.pickle'):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
-    dms_wb = load_workbook(filename=BytesIO(dms_bytes), data_only=False, keep_links=True)
-    rep_wb = load_workbook(filename=BytesIO(rep_bytes), data_only=False, keep_links=True)
-    main_wb = load_workbook(filename=BytesIO(main_bytes), data_only=False, keep_links=True)
 
-    _phase_one_normalize_dms(dms_wb, main_wb, progress_callback)
-    phase_two_context = _phase_two_merge_rep(rep_wb, main_wb, progress_callback)
-    _phase_three_update_main(main_wb, phase_two_context, progress_callback)
+def run_workbook_pipeline(
+    dms_source: WorkbookSource,
+    rep_source: WorkbookSource,
+    main_source: WorkbookSource,
+    progress_callback: Callable[..., None],
+    output: Optional[WorkbookTarget] = None,
+    phase_cache: Optional[PhaseCache] = None,
+    profile_path: Optional[str] = None,
+    output_mode: str = 'full',
+    compress_level: Optional[int] = None,
+) -> Tuple[WorkbookTarget, str]:
+    """Execute all pipeline phases and save the consolidated workbook.
+
+    Sources may be file paths or raw bytes. The workbook is saved to ``output``
+    (a path or binary file object), or to a new ``BytesIO`` when omitted, and
+    ``(output, filename)`` is returned. With a ``phase_cache``, phases whose
+    inputs were seen before reuse their cached intermediate results. Each
+    stage is timed as a ``pipeline.*`` span; with ``profile_path``, the run is
+    also profiled with cProfile into that file.
+
+    ``output_mode='modified'`` rewrites only the DMS Dump, month and MAIN
+    sheets and copies the rest of the MAIN package through unchanged, falling
+    back to a full save when that is not possible. ``compress_level`` (0-9)
+    sets the zip compression of the written parts.
+    """
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"output_mode must be one of {OUTPUT_MODES}, got {output_mode!r}")
+    with profiled(profile_path) if profile_path else nullcontext():
+        return _run_pipeline_phases(dms_source, rep_source, main_source, progress_callback, output, phase_cache,
+                                    output_mode, compress_level)
+
+
+def _run_pipeline_phases(dms_source, rep_source, main_source, progress_callback, output, phase_cache,
+                         output_mode='full', compress_level=None):
+    # Only MAIN is edited; the DMS and repJourney workbooks are streamed once
+    with span('pipeline.load'):
+        main_wb = load_workbook(filename=_workbook_file(main_source), data_only=False, keep_links=True)
+    with span('pipeline.phase1'):
+        _phase_one_normalize_dms(dms_source, main_wb, progress_callback, phase_cache)
+    with span('pipeline.phase2'):
+        phase_two_context = _phase_two_merge_rep(rep_source, main_wb, progress_callback, phase_cache)
+    with span('pipeline.phase3'):
+        if phase_cache:
+            # The month sheet formulas come from MAIN, so the lookup depends on both files
+            phase_two_context['fingerprint'] = _combine_fingerprints(
+                phase_two_context['fingerprint'], _phase_fingerprint(3, main_source)
+            )
+        _phase_three_update_main(main_wb, phase_two_context, progress_callback, phase_cache)
 
     _report(progress_callback, 4, status="done", percent=100, message="Phase 4: Completed, ready for human review.")
 
-    output = BytesIO()
-    main_wb.save(output)
-    output.seek(0)
+    if output is None:
+        output = BytesIO()
+    with span('pipeline.save'):
+        modified = ['DMS Dump', phase_two_context['month_sheet'].title, _locate_main_sheet(main_wb).title]
+        if output_mode != 'modified' or not save_modified_sheets(
+            main_wb, output, main_source, modified, compress_level
+        ):
+            save_workbook(main_wb, output, compress_level)
+    if hasattr(output, 'seek'):
+        output.seek(0)
     filename = f"Main_Consolidated_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
     return output, filename
 
 
-def _phase_one_normalize_dms(dms_wb, main_wb, progress_callback):
-    sheet = dms_wb['DMS Dump'] if 'DMS Dump' in dms_wb.sheetnames else dms_wb.worksheets[0]
-    headers, header_map, header_row = _build_header_index(sheet, required_headers=['Device_ID'])
-    device_idx = header_map.get('device_id')
-    if not device_idx:
-        _report(progress_callback, 1, status='error', message="Phase 1 error: column 'Device_ID' not found in DMS file")
-        raise PipelineError("Phase 1 error: column 'Device_ID' not found in DMS file", phase=1)
+def run_workbook_pipeline_in_process(
+    dms_source: WorkbookSource,
+    rep_source: WorkbookSource,
+    main_source: WorkbookSource,
+    progress_callback: Callable[..., None],
+    output: Optional[Union[str, os.PathLike]] = None,
+    phase_cache: Optional[PhaseCache] = None,
+    profile_path: Optional[str] = None,
+    output_mode: str = 'full',
+    compress_level: Optional[int] = None,
+) -> Tuple[WorkbookTarget, str]:
+    """Run :func:`run_workbook_pipeline` in a child process to keep the caller's GIL free.
+
+    Progress events and timing spans are relayed to this process over a queue.
+    The child saves straight to the ``output`` path; without one, the result is
+    returned as a ``BytesIO`` read back from a temporary file. ``profile_path``
+    is profiled in the child; the output options are passed through.
+    """
+    output_path = output
+    if output_path is None:
+        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as handle:
+            output_path = handle.name
+
+    ctx = multiprocessing.get_context('spawn')
+    events = ctx.Queue()
+    process = ctx.Process(
+        target=_pipeline_process_entry,
+        args=(dms_source, rep_source, main_source, output_path, events,
+              phase_cache.directory if phase_cache else None,
+              phase_cache.max_entries if phase_cache else None, profile_path, output_mode, compress_level),
+        daemon=True,
+    )
+    process.start()
+    try:
+        while True:
+            try:
+                kind, *payload = events.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive():
+                    raise PipelineError(f'Pipeline worker exited unexpectedly (exit code {process.exitcode}).')
+                continue
+            if kind == 'progress':
+                phase, update = payload
+                _report(progress_callback, phase, **update)
+            elif kind == 'spans':
+                for name, seconds in payload[0]:
+                    observe_span(name, seconds)
+            elif kind == 'error':
+                message, phase = payload
+                raise PipelineError(message, phase=phase)
+            elif kind == 'result':
+                filename = payload[0]
+                if output is not None:
+                    return output, filename
+                with open(output_path, 'rb') as handle:
+                    return BytesIO(handle.read()), filename
+    finally:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+        if output is None and os.path.exists(output_path):
+            os.remove(output_path)
+
+
+def _pipeline_process_entry(dms_source, rep_source, main_source, output_path, events,
+                            cache_dir=None, cache_entries=None, profile_path=None,
+                            output_mode='full', compress_level=None):
+    def relay(phase, **payload):
+        events.put(('progress', phase, payload))
+
+    with collect_spans() as spans:
+        try:
+            phase_cache = PhaseCache(cache_dir, cache_entries) if cache_dir else None
+            _, filename = run_workbook_pipeline(
+                dms_source, rep_source, main_source, progress_callback=relay, output=output_path,
+                phase_cache=phase_cache, profile_path=profile_path,
+                output_mode=output_mode, compress_level=compress_level,
+            )
+            outcome = ('result', filename)
+        except PipelineError as exc:
+            outcome = ('error', str(exc), exc.phase)
+        except Exception as exc:
+            outcome = ('error', str(exc), None)
+    # Spans first, so they are recorded before the caller returns or raises
+    events.put(('spans', spans))
+    events.put(outcome)
+
+
+def _workbook_file(source: WorkbookSource):
+    return BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+def _load_source_workbook(source: WorkbookSource):
+    """Open an input workbook in read-only mode for a single streamed pass."""
+    workbook = load_workbook(filename=_workbook_file(source), read_only=True, data_only=False)
+    for sheet in workbook.worksheets:
+        # Stored <dimension> tags are often stale; stream until the real last row
+        sheet.reset_dimensions()
+    return workbook
+
+
+def _source_digest(source: WorkbookSource) -> str:
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray)):
+        digest.update(source)
+    else:
+        with open(source, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _phase_fingerprint(phase: int, source: WorkbookSource) -> str:
+    return _combine_fingerprints(f"v{PHASE_CACHE_VERSION}-phase{phase}", _source_digest(source))
 
-    data_rows = list(sheet.iter_rows(min_row=header_row + 1, max_row=sheet.max_row, max_col=sheet.max_column, values_only=True))
+
+def _combine_fingerprints(*parts: str) -> str:
+    return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+
+def _with_progress(rows: List[list], progress_callback, phase: int, label: str):
+    """Yield ``rows`` while reporting throttled row progress for ``phase``."""
+    total = len(rows)
+    throttle = ProgressThrottle()
+    for idx, row in enumerate(rows, start=1):
+        yield row
+        if throttle.ready():
+            _report(progress_callback, phase, processed_rows=idx, total_rows=total,
+                    message=f"{label} – {idx:,} / {total:,} rows")
+
+
+def _pad_row(values, width: int) -> list:
+    row = list(values)
+    if len(row) < width:
+        row.extend([None] * (width - len(row)))
+    return row
+
+
+def _phase_one_normalize_dms(dms_source, main_wb, progress_callback, phase_cache=None):
+    _report(progress_callback, 1, status='running', message='Phase 1: Reading DMS file…')
+    fingerprint = _phase_fingerprint(1, dms_source) if phase_cache else None
+    cached = phase_cache.load(1, fingerprint) if phase_cache else None
+    if cached is not None:
+        headers, data_rows = cached
+        _report(progress_callback, 1, status='running', total_rows=len(data_rows), processed_rows=0, cached=True,
+                message='Phase 1: Reusing normalized DMS rows from cache…')
+    else:
+        headers, data_rows = _read_normalized_dms(dms_source, progress_callback)
+        if phase_cache:
+            phase_cache.store(1, fingerprint, (headers, data_rows))
     total = len(data_rows)
-    _report(progress_callback, 1, status='running', total_rows=total, processed_rows=0,
-            message='Phase 1: Normalizing Device_ID values…')
 
     dms_sheet_main = main_wb['DMS Dump'] if 'DMS Dump' in main_wb.sheetnames else main_wb.create_sheet(title='DMS Dump')
 
@@ -67,51 +387,62 @@ def _phase_one_normalize_dms(dms_wb, main_wb, progress_callback):
             for extra_col in range(len(headers) + 1, dms_sheet_main.max_column + 1):
                 dms_sheet_main.cell(row=1, column=extra_col, value=None)
 
-    if dms_sheet_main.max_row > 1:
-        dms_sheet_main.delete_rows(2, dms_sheet_main.max_row - 1)
-
-    for idx, row in enumerate(data_rows, start=1):
-        normalized_row = list(row)
-        device_value = normalized_row[device_idx - 1]
-        normalized_row[device_idx - 1] = _normalize_device_id(device_value)
-        dms_sheet_main.append(normalized_row)
-        if idx % 50 == 0 or idx == total:
-            _report(progress_callback, 1, processed_rows=idx, total_rows=total,
-                    message=f"Phase 1: DMS normalization – {idx:,} / {total:,} rows")
-
-    _report(progress_callback, 1, status='done', processed_rows=total, total_rows=total,
-            message='Phase 1 complete – DMS Dump sheet refreshed inside MAIN.')
-
-
-def _phase_two_merge_rep(rep_wb, main_wb, progress_callback):
-    sheet = rep_wb.worksheets[0]
-    headers, header_map, header_row = _build_header_index(sheet, required_headers=['Begin Journey Date'])
-    begin_key = header_map.get('begin journey date')
-    if not begin_key:
-        _report(progress_callback, 2, status='error', message="Phase 2 error: column 'Begin Journey Date' not found in repJourney file")
-        raise PipelineError("Phase 2 error: column 'Begin Journey Date' not found in repJourney file", phase=2)
-
-    rep_rows: List[Dict[str, object]] = []
-    header_keys = [ _normalize_header(h) for h in headers ]
-    for values in sheet.iter_rows(min_row=header_row + 1, max_row=sheet.max_row, max_col=sheet.max_column, values_only=True):
-        if not any(values):
-            continue
-        row_dict = { header_keys[i]: values[i] for i in range(len(header_keys)) if header_keys[i] }
-        rep_rows.append(row_dict)
+    _replace_data_rows(dms_sheet_main, 2, _with_progress(
+        data_rows, progress_callback, 1, 'Phase 1: DMS normalization'
+    ))
+
+    message = 'Phase 1 complete – DMS Dump sheet refreshed inside MAIN.'
+    if cached is not None:
+        message = 'Phase 1 complete – DMS Dump sheet refreshed inside MAIN from cached rows.'
+    _report(progress_callback, 1, status='done', processed_rows=total, total_rows=total, message=message)
+
+
+def _read_normalized_dms(dms_source, progress_callback) -> Tuple[List[object], List[list]]:
+    """Stream the DMS workbook once and return its headers and normalized data rows."""
+    dms_wb = _load_source_workbook(dms_source)
+    try:
+        sheet = dms_wb['DMS Dump'] if 'DMS Dump' in dms_wb.sheetnames else dms_wb.worksheets[0]
+        headers, header_map, header_row = _build_header_index(sheet, required_headers=['Device_ID'])
+        device_idx = header_map.get('device_id')
+        if not device_idx:
+            _report(progress_callback, 1, status='error', message="Phase 1 error: column 'Device_ID' not found in DMS file")
+            raise PipelineError("Phase 1 error: column 'Device_ID' not found in DMS file", phase=1)
+
+        width = len(headers)
+        data_rows = [
+            _pad_row(values, width)
+            for values in sheet.iter_rows(min_row=header_row + 1, max_row=sheet.max_row, max_col=sheet.max_column, values_only=True)
+        ]
+    finally:
+        dms_wb.close()
+
+    _report(progress_callback, 1, status='running', total_rows=len(data_rows), processed_rows=0,
+            message='Phase 1: Normalizing Device_ID values…')
 
-    epoch = getattr(rep_wb, 'epoch', None)
-    rep_rows.sort(key=lambda r: _coerce_datetime(r.get('begin journey date'), epoch) or datetime.min, reverse=True)
+    column = device_idx - 1
+    for row, device_key in zip(data_rows, _normalize_device_ids([row[column] for row in data_rows])):
+        row[column] = device_key
+    return headers, data_rows
+
+
+def _phase_two_merge_rep(rep_source, main_wb, progress_callback, phase_cache=None):
+    _report(progress_callback, 2, status='running', message='Phase 2: Reading repJourney file…')
+    fingerprint = _phase_fingerprint(2, rep_source) if phase_cache else None
+    cached = phase_cache.load(2, fingerprint) if phase_cache else None
+    if cached is not None:
+        header_keys, rep_rows, latest_date = cached
+    else:
+        header_keys, rep_rows, latest_date = _read_sorted_rep_rows(rep_source, progress_callback)
+        if phase_cache:
+            phase_cache.store(2, fingerprint, (header_keys, rep_rows, latest_date))
 
     total = len(rep_rows)
-    _report(progress_callback, 2, status='running', processed_rows=0, total_rows=total,
-            message='Phase 2: Writing repJourney data into MAIN month sheet…')
-
-    latest_date = None
-    for row in rep_rows:
-        candidate = _coerce_datetime(row.get('begin journey date'), epoch)
-        if candidate:
-            latest_date = candidate
-            break
+    if cached is not None:
+        _report(progress_callback, 2, status='running', processed_rows=0, total_rows=total, cached=True,
+                message='Phase 2: Writing cached repJourney rows into MAIN month sheet…')
+    else:
+        _report(progress_callback, 2, status='running', processed_rows=0, total_rows=total,
+                message='Phase 2: Writing repJourney data into MAIN month sheet…')
 
     month_sheet = _locate_month_sheet(main_wb, latest_date)
     _, month_header_map, month_header_row = _build_header_index(month_sheet, required_headers=['Destination'])
@@ -130,33 +461,26 @@ def _phase_two_merge_rep(rep_wb, main_wb, progress_callback):
         raise PipelineError('Phase 2 error: No overlapping headers between repJourney and month sheet before Destination column', phase=2)
 
     data_start_row = month_header_row + 1
-    original_last_row = month_sheet.max_row
-    original_data_count = max(original_last_row - month_header_row, 0)
-    formula_columns = list(range(destination_col, month_sheet.max_column + 1))
+    original_data_count = max(month_sheet.max_row - month_header_row, 0)
+    template_row = data_start_row + original_data_count - 1
     formula_template = {}
     if original_data_count > 0:
-        template_row_idx = data_start_row + original_data_count - 1
-        for col in formula_columns:
-            formula_template[col] = month_sheet.cell(row=template_row_idx, column=col).value
-
-    for row_idx, row in enumerate(rep_rows):
-        target_row = data_start_row + row_idx
-        for header in shared_headers:
-            col_idx = month_header_map[header]
-            month_sheet.cell(row=target_row, column=col_idx, value=row.get(header))
-        if (row_idx + 1) % 50 == 0 or (row_idx + 1) == total:
-            _report(progress_callback, 2, processed_rows=row_idx + 1, total_rows=total,
-                    message=f"Phase 2: repJourney merge – {row_idx + 1:,} / {total:,} rows")
-
-    if original_data_count > len(rep_rows):
-        rows_to_remove = original_data_count - len(rep_rows)
-        month_sheet.delete_rows(data_start_row + len(rep_rows), rows_to_remove)
-
-    if formula_columns and formula_template:
-        for row_idx in range(original_data_count, len(rep_rows)):
-            target_row = data_start_row + row_idx
-            for col in formula_columns:
-                month_sheet.cell(row=target_row, column=col, value=formula_template.get(col))
+        # The last existing row supplies the formulas (and constants) for rows added after it
+        cells = month_sheet._cells
+        for col in range(destination_col, month_sheet.max_column + 1):
+            template_cell = cells.get((template_row, col))
+            if template_cell is not None and template_cell.value is not None:
+                formula_template[col] = template_cell.value
+
+    _rewrite_month_rows(
+        month_sheet,
+        data_start_row,
+        _with_progress(rep_rows, progress_callback, 2, 'Phase 2: repJourney merge'),
+        [(month_header_map[header], header) for header in shared_headers],
+        formula_template,
+        template_row,
+        original_data_count,
+    )
 
     _report(progress_callback, 2, status='done', processed_rows=total, total_rows=total,
             message='Phase 2 complete – repJourney data refreshed in latest month sheet.')
@@ -165,11 +489,55 @@ def _phase_two_merge_rep(rep_wb, main_wb, progress_callback):
         'month_sheet': month_sheet,
         'month_header_map': month_header_map,
         'month_header_row': month_header_row,
-        'formula_start_col': destination_col
+        'formula_start_col': destination_col,
+        'fingerprint': fingerprint,
     }
 
 
-def _phase_three_update_main(main_wb, context, progress_callback):
+def _read_sorted_rep_rows(rep_source, progress_callback):
+    """Stream the repJourney workbook once; return header keys, rows sorted newest first and the latest date."""
+    rep_wb = _load_source_workbook(rep_source)
+    try:
+        sheet = rep_wb.worksheets[0]
+        headers, header_map, header_row = _build_header_index(sheet, required_headers=['Begin Journey Date'])
+        begin_key = header_map.get('begin journey date')
+        if not begin_key:
+            _report(progress_callback, 2, status='error', message="Phase 2 error: column 'Begin Journey Date' not found in repJourney file")
+            raise PipelineError("Phase 2 error: column 'Begin Journey Date' not found in repJourney file", phase=2)
+
+        rep_rows: List[Dict[str, object]] = []
+        source_rows: List[int] = []
+        header_keys = [ _normalize_header(h) for h in headers ]
+        for row_number, values in enumerate(
+            sheet.iter_rows(min_row=header_row + 1, max_row=sheet.max_row, max_col=sheet.max_column, values_only=True),
+            start=header_row + 1,
+        ):
+            if not any(values):
+                continue
+            values = _pad_row(values, len(header_keys))
+            row_dict = { header_keys[i]: values[i] for i in range(len(header_keys)) if header_keys[i] }
+            rep_rows.append(row_dict)
+            source_rows.append(row_number)
+        epoch = getattr(rep_wb, 'epoch', WINDOWS_EPOCH)
+    finally:
+        rep_wb.close()
+
+    # Parse the whole date column once; rows without a date sort last
+    parser = DateParser(epoch=epoch)
+    begin_dates = parser.parse_column([row.get('begin journey date') for row in rep_rows])
+    if parser.failure_count:
+        position, value = parser.failures[0]
+        _report(progress_callback, 2, status='running',
+                message=f"Phase 2: {parser.failure_count:,} 'Begin Journey Date' values could not be read as dates "
+                        f"(first at row {source_rows[position]}: {value!r}); those rows are placed last.")
+    ordered = sorted(zip(begin_dates, rep_rows), key=lambda pair: pair[0] or datetime.min, reverse=True)
+    rep_rows = [row for _, row in ordered]
+    latest_date = next((begin for begin, _ in ordered if begin), None)
+
+    return header_keys, rep_rows, latest_date
+
+
+def _phase_three_update_main(main_wb, context, progress_callback, phase_cache=None):
     month_sheet: Worksheet = context['month_sheet']
     month_header_map = context['month_header_map']
     month_header_row = context.get('month_header_row', 1)
@@ -184,18 +552,13 @@ def _phase_three_update_main(main_wb, context, progress_callback):
         _report(progress_callback, 3, status='error', message='Phase 3 error: Missing device, Disarm Date, or Destination columns in month sheet')
         raise PipelineError('Phase 3 error: Missing device, Disarm Date, or Destination columns in month sheet', phase=3)
 
-    device_lookup: Dict[str, Tuple[object, object]] = {}
-    for row in month_sheet.iter_rows(min_row=month_header_row + 1, max_row=month_sheet.max_row, values_only=False):
-        device_value = row[month_device_col - 1].value
-        if not device_value:
-            continue
-        device_key = _normalize_device_id(device_value)
-        if not device_key or device_key in device_lookup:
-            continue
-        device_lookup[device_key] = (
-            row[disarm_col - 1].value,
-            row[destination_col - 1].value,
-        )
+    fingerprint = context.get('fingerprint') if phase_cache else None
+    device_lookup = phase_cache.load(3, fingerprint) if fingerprint else None
+    lookup_cached = device_lookup is not None
+    if not lookup_cached:
+        device_lookup = _build_device_lookup(month_sheet, month_header_row, month_device_col, disarm_col, destination_col)
+        if fingerprint:
+            phase_cache.store(3, fingerprint, device_lookup)
 
     main_sheet = _locate_main_sheet(main_wb)
     _, main_header_map, main_header_row = _build_header_index(main_sheet, required_headers=['Device Nos', 'Device_ID', 'Device ID'])
@@ -212,25 +575,214 @@ def _phase_three_update_main(main_wb, context, progress_callback):
         _report(progress_callback, 3, status='done', message='Phase 3 complete – MAIN sheet contains no rows to update.')
         return
 
-    _report(progress_callback, 3, status='running', processed_rows=0, total_rows=total_rows,
-            message='Phase 3: Updating MAIN last disarmed fields…')
-
-    for idx, row in enumerate(main_sheet.iter_rows(min_row=main_header_row + 1, max_row=main_sheet.max_row, values_only=False), start=1):
-        device_value = row[main_device_col - 1].value
-        if device_value is not None:
-            device_key = _normalize_device_id(device_value)
-            if device_key and device_key in device_lookup:
-                last_date, last_area = device_lookup[device_key]
-                row[last_disarmed_col - 1].value = last_date
-                row[last_area_col - 1].value = last_area
-        if idx % 50 == 0 or idx == total_rows:
-            _report(progress_callback, 3, processed_rows=idx, total_rows=total_rows,
-                    message=f"Phase 3: Updating MAIN last disarmed fields – {idx:,} / {total_rows:,} rows")
+    if lookup_cached:
+        _report(progress_callback, 3, status='running', processed_rows=0, total_rows=total_rows, cached=True,
+                message='Phase 3: Updating MAIN last disarmed fields from cached device lookup…')
+    else:
+        _report(progress_callback, 3, status='running', processed_rows=0, total_rows=total_rows,
+                message='Phase 3: Updating MAIN last disarmed fields…')
+
+    # Join MAIN's device column against the lookup in one pass, then write only the matched rows
+    first_row = main_header_row + 1
+    device_keys = _normalize_device_ids(_column_values(main_sheet, main_device_col, first_row))
+    matches = [
+        (row_idx, device_lookup[device_key])
+        for row_idx, device_key in enumerate(device_keys, start=first_row)
+        if device_key and device_key in device_lookup
+    ]
+    _report(progress_callback, 3, processed_rows=0, total_rows=total_rows,
+            message=f"Phase 3: Writing disarm details for {len(matches):,} matched devices…")
+
+    throttle = ProgressThrottle()
+    for row_idx, (last_date, last_area) in matches:
+        main_sheet.cell(row=row_idx, column=last_disarmed_col).value = last_date
+        main_sheet.cell(row=row_idx, column=last_area_col).value = last_area
+        if throttle.ready():
+            processed = row_idx - main_header_row
+            _report(progress_callback, 3, processed_rows=processed, total_rows=total_rows,
+                    message=f"Phase 3: Updating MAIN last disarmed fields – {processed:,} / {total_rows:,} rows")
 
     _report(progress_callback, 3, status='done', processed_rows=total_rows, total_rows=total_rows,
             message='Phase 3 complete – MAIN sheet enriched with disarm details.')
 
 
+def _build_device_lookup(month_sheet: Worksheet, header_row: int, device_col: int,
+                         disarm_col: int, destination_col: int) -> Dict[str, Tuple[object, object]]:
+    """Map each normalized month sheet device ID to its first row's Disarm Date and Destination."""
+    first_row = header_row + 1
+    device_values = _column_values(month_sheet, device_col, first_row)
+    disarm_values = _column_values(month_sheet, disarm_col, first_row)
+    destination_values = _column_values(month_sheet, destination_col, first_row)
+
+    device_lookup: Dict[str, Tuple[object, object]] = {}
+    for device_value, device_key, disarm, destination in zip(
+        device_values, _normalize_device_ids(device_values), disarm_values, destination_values
+    ):
+        if device_value and device_key and device_key not in device_lookup:
+            device_lookup[device_key] = (disarm, destination)
+    return device_lookup
+
+
+def _column_values(sheet: Worksheet, column: int, first_row: int) -> List[object]:
+    """Return ``column``'s values from ``first_row`` to the last row, without creating empty cells."""
+    cells = sheet._cells
+    values = []
+    for row in range(first_row, sheet.max_row + 1):
+        cell = cells.get((row, column))
+        values.append(None if cell is None else cell.value)
+    return values
+
+
+def _replace_data_rows(sheet: Worksheet, first_row: int, rows: Iterable[Iterable[object]]) -> int:
+    """Replace every row from ``first_row`` down with ``rows`` without shifting cells.
+
+    ``delete_rows`` moves cells one at a time, so the data cells are dropped from
+    the worksheet's cell store in one pass and rebuilt directly. Rows above
+    ``first_row``, column widths, row heights and sheet settings are left
+    untouched. Returns the number of rows written.
+    """
+    sheet._cells = {key: cell for key, cell in sheet._cells.items() if key[0] < first_row}
+    cells = sheet._cells
+
+    last_row = first_row - 1
+    for last_row, values in enumerate(rows, start=first_row):
+        for col_idx, value in enumerate(values, start=1):
+            if value is not None:
+                cells[(last_row, col_idx)] = _make_cell(sheet, last_row, col_idx, value)
+    # Keep Worksheet.append() in step with the rewritten contents
+    sheet._current_row = max(last_row, first_row - 1)
+    return last_row - first_row + 1
+
+
+def _rewrite_month_rows(sheet: Worksheet, first_row: int, rows: Iterable[Dict[str, object]],
+                        columns: List[Tuple[int, str]], formula_template: Dict[int, object],
+                        template_row: int, existing_rows: int) -> int:
+    """Write ``rows`` into a month sheet from ``first_row`` down and drop any rows left below them.
+
+    Each ``(column, key)`` in ``columns`` takes ``row[key]``, clearing the cell
+    when the row has no value. Rows past the ``existing_rows`` already in the
+    sheet get ``formula_template`` (column -> value of ``template_row``), with
+    formula references moved to the new row. Existing cells are updated in
+    place, so their styles survive; nothing is shifted. Returns the number of
+    rows written.
+    """
+    cells = sheet._cells
+    shifters = {}
+    for col, value in formula_template.items():
+        if isinstance(value, str) and len(value) > 1 and value.startswith('='):
+            try:
+                shifters[col] = _FormulaRowShifter(value)
+            except TokenizerError:
+                pass  # Copied verbatim, as Excel would keep a formula it cannot parse
+
+    last_row = first_row - 1
+    for last_row, row in enumerate(rows, start=first_row):
+        for col, key in columns:
+            value = row.get(key)
+            cell = cells.get((last_row, col))
+            if cell is not None:
+                _set_cell_value(cell, value)
+            elif value is not None:
+                cells[(last_row, col)] = _make_cell(sheet, last_row, col, value)
+        if last_row - first_row < existing_rows:
+            continue
+        for col, value in formula_template.items():
+            shifter = shifters.get(col)
+            if shifter is not None:
+                cell = Cell(sheet, row=last_row, column=col)
+                cell._value = shifter.shift(last_row - template_row)
+                cell.data_type = 'f'
+                cells[(last_row, col)] = cell
+            else:
+                cells[(last_row, col)] = _make_cell(sheet, last_row, col, value)
+
+    if last_row < first_row + existing_rows - 1:
+        # Fewer rows than before: drop the surplus instead of delete_rows() shifting them
+        sheet._cells = {key: cell for key, cell in cells.items() if key[0] <= last_row}
+        sheet._current_row = max(last_row, first_row - 1)
+    return last_row - first_row + 1
+
+
+class _FormulaRowShifter:
+    """A formula compiled so that copying it ``delta`` rows down is a string join.
+
+    Produces what openpyxl's ``Translator`` does for a move straight down, but
+    the formula is tokenized once instead of on every row.
+    """
+
+    def __init__(self, formula: str):
+        pieces: List[object] = ['=']
+        for token in Tokenizer(formula).items:
+            if token.type == Token.OPERAND and token.subtype == Token.RANGE:
+                pieces.extend(_range_row_pieces(token.value))
+            else:
+                pieces.append(token.value)
+        # Relative row numbers become format fields, one per distinct row
+        self._rows: List[int] = []
+        template = []
+        for piece in pieces:
+            if isinstance(piece, int):
+                if piece not in self._rows:
+                    self._rows.append(piece)
+                template.append(f"{{{self._rows.index(piece)}}}")
+            else:
+                template.append(piece.replace('{', '{{').replace('}', '}}'))
+        self._template = ''.join(template)
+
+    def shift(self, delta: int) -> str:
+        return self._template.format(*[row + delta for row in self._rows])
+
+
+def _range_row_pieces(range_str: str) -> List[object]:
+    # Mirrors Translator.translate_range with no column shift: relative row numbers become ints
+    ws_part, reference = Translator.strip_ws_name(range_str)
+    match = Translator.ROW_RANGE_RE.match(reference)
+    if match is not None:
+        return [ws_part, _row_piece(match.group(1)), ':', _row_piece(match.group(2))]
+    if Translator.COL_RANGE_RE.match(reference) is not None:
+        return [ws_part, reference]
+    if ':' in reference:
+        pieces: List[object] = [ws_part]
+        for idx, part in enumerate(reference.split(':')):
+            if idx:
+                pieces.append(':')
+            pieces.extend(_range_row_pieces(part))
+        return pieces
+    match = Translator.CELL_REF_RE.match(reference)
+    if match is None:  # A named range
+        return [ws_part, reference]
+    return [ws_part, match.group(1), _row_piece(match.group(2))]
+
+
+def _row_piece(row_str: str):
+    return row_str if row_str.startswith('$') else int(row_str)
+
+
+def _make_cell(sheet: Worksheet, row: int, column: int, value) -> Cell:
+    """Build a cell, skipping openpyxl's type sniffing for plain text and numbers."""
+    cell = Cell(sheet, row=row, column=column)
+    _set_cell_value(cell, value)
+    return cell
+
+
+def _set_cell_value(cell: Cell, value):
+    value_type = type(value)
+    if value_type is int or value_type is float:
+        cell._value = value
+        cell.data_type = 'n'
+    elif (
+        value_type is str
+        and value[:1] not in ('=', '#')
+        and len(value) <= MAX_CELL_TEXT
+        and not ILLEGAL_CHARACTERS_RE.search(value)
+    ):
+        cell._value = value
+        cell.data_type = 's'
+    else:
+        # Formulas, error codes, dates and anything unusual take the checked path
+        cell.value = value
+
+
 def _build_header_index(
     sheet: Worksheet,
     required_headers: Optional[Iterable[str]] = None,
@@ -240,11 +792,12 @@ def _build_header_index(
     header_row_idx: Optional[int] = None
     headers: List[str] = []
 
+    # values_only rows work for both regular and read-only (streamed) worksheets
     for row_idx, row in enumerate(
-        sheet.iter_rows(min_row=1, max_row=max_scan_rows, max_col=sheet.max_column, values_only=False),
+        sheet.iter_rows(min_row=1, max_row=max_scan_rows, max_col=sheet.max_column, values_only=True),
         start=1,
     ):
-        values = [cell.value if cell.value is not None else '' for cell in row]
+        values = [value if value is not None else '' for value in row]
         normalized = [_normalize_header(value) for value in values]
         if required:
             if required.intersection(normalized):
@@ -258,8 +811,8 @@ def _build_header_index(
 
     if header_row_idx is None:
         header_row_idx = 1
-        row = next(sheet.iter_rows(min_row=1, max_row=1, values_only=False))
-        headers = [cell.value if cell.value is not None else '' for cell in row]
+        row = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        headers = [value if value is not None else '' for value in row]
 
     header_map: Dict[str, int] = {}
     for idx, title in enumerate(headers, start=1):
@@ -296,26 +849,26 @@ def _normalize_device_id(value) -> str:
     return stripped or '0'
 
 
-def _coerce_datetime(value, epoch=None) -> Optional[datetime]:
-    if value is None or value == '':
-        return None
-    if isinstance(value, datetime):
-        return value
-    if isinstance(value, (int, float)):
-        try:
-            return excel_date(value, epoch)
-        except Exception:
-            return None
-    if isinstance(value, str):
-        text = value.strip()
-        if not text:
-            return None
-        for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%m/%d/%Y", "%m/%d/%Y %H:%M", "%d-%b-%Y"):
-            try:
-                return datetime.strptime(text, fmt)
-            except ValueError:
-                continue
-    return None
+def _normalize_device_ids(values: Iterable[object]) -> List[str]:
+    """Normalize a whole column of device IDs, as :func:`_normalize_device_id` would one by one.
+
+    Integers that a float represents exactly are converted directly, and every
+    other distinct value is normalized once per call and memoized, since
+    exports repeat the same devices across many rows.
+    """
+    memo: Dict[object, str] = {}
+    normalized: List[str] = []
+    append = normalized.append
+    for value in values:
+        if type(value) is int and -_EXACT_FLOAT_INT <= value <= _EXACT_FLOAT_INT:
+            append(str(value))
+            continue
+        device_key = memo.get(value)
+        if device_key is None:
+            # Equal keys (1, 1.0, True) normalize alike, so sharing their entry is safe
+            device_key = memo[value] = _normalize_device_id(value)
+        append(device_key)
+    return normalized
 
 
 def _locate_month_sheet(workbook, latest_date: Optional[datetime]) -> Worksheet:
@@ -0,0 +1,258 @@
+"""Saving consolidated workbooks, in full or by patching the original package.
+
+:func:`save_workbook` is openpyxl's own save with a configurable zip
+compression level. :func:`save_modified_sheets` serializes only the named
+sheets (plus the stylesheet they share) and copies every other part of the
+original ``.xlsx`` into the output as-is, still compressed, so the cost of a
+save follows the size of what changed rather than the size of the workbook.
+"""
+import os
+import posixpath
+import re
+import struct
+import zipfile
+from datetime import datetime, timezone
+from io import BytesIO
+from xml.etree import ElementTree
+
+from openpyxl.styles.stylesheet import write_stylesheet
+from openpyxl.worksheet._writer import WorksheetWriter
+from openpyxl.writer.excel import ExcelWriter
+from openpyxl.xml.constants import ARC_CONTENT_TYPES, ARC_CORE, ARC_ROOT_RELS, ARC_STYLE
+from openpyxl.xml.functions import tostring
+
+OUTPUT_MODES = ('full', 'modified')
+
+_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_DOC_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_SHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_OFFICE_DOCUMENT = f'{_DOC_REL_NS}/officeDocument'
+_CALC_CHAIN = f'{_DOC_REL_NS}/calcChain'
+# Workbook children that come after <calcPr> in the schema, for inserting a missing one
+_AFTER_CALC_PR = ('oleSize', 'customWorkbookViews', 'pivotCaches', 'smartTagPr', 'smartTagTypes',
+                  'webPublishing', 'fileRecoveryPr', 'webPublishObjects', 'extLst')
+_COPY_CHUNK = 1024 * 1024
+
+
+def save_workbook(workbook, output, compress_level=None):
+    """Save ``workbook`` to ``output`` (a path or binary file object) with openpyxl's writer.
+
+    ``compress_level`` is the deflate level from 1 (fastest) to 9 (smallest);
+    0 stores the parts uncompressed and ``None`` keeps zlib's default.
+    """
+    archive = zipfile.ZipFile(output, 'w', **_compression(compress_level), allowZip64=True)
+    workbook.properties.modified = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+    ExcelWriter(workbook, archive).save()
+
+
+def save_modified_sheets(workbook, output, original, sheet_titles, compress_level=None):
+    """Save ``workbook`` by rewriting only ``sheet_titles`` inside the ``original`` package.
+
+    ``original`` is the path or bytes ``workbook`` was loaded from. The named
+    worksheets and the stylesheet are serialized again; every other part is
+    copied over without being decompressed. The calculation chain is dropped
+    and Excel is told to recalculate on open, as a full openpyxl save would.
+
+    Returns ``False`` without writing anything when the package cannot be
+    patched safely: sheets were added, removed or renamed since loading, or a
+    rewritten sheet carries charts, images, comments, tables or pivot tables,
+    which only a full save writes out. The caller then falls back to
+    :func:`save_workbook`.
+    """
+    if isinstance(original, (bytes, bytearray)):
+        original = BytesIO(original)
+    elif _same_file(original, output):
+        return False
+    worksheets = [workbook[title] for title in dict.fromkeys(sheet_titles)]
+    if any(_needs_full_save(ws) for ws in worksheets):
+        return False
+
+    with zipfile.ZipFile(original) as source:
+        names = set(source.namelist())
+        workbook_part = _workbook_part(source)
+        workbook_rels = _rels_path(workbook_part)
+        sheet_parts = _sheet_parts(source, workbook_part)
+        if list(sheet_parts) != workbook.sheetnames:
+            return False
+
+        replaced = {}
+        for ws in worksheets:
+            part = sheet_parts[ws.title]
+            writer = WorksheetWriter(ws)
+            try:
+                writer.write()
+                replaced[part] = _read_file(writer.out)
+            finally:
+                writer.cleanup()
+            if ws._comments:
+                # Cell comments are only collected while the sheet is written, and need their own parts
+                return False
+            # Relationships the writer created itself (external hyperlinks) replace the old ones
+            rels_part = _rels_path(part)
+            if writer._rels:
+                replaced[rels_part] = tostring(writer._rels.to_tree())
+            elif rels_part in names:
+                replaced[rels_part] = None
+
+        # Rewritten sheets may use new cell formats; existing style indices keep their positions
+        replaced[ARC_STYLE] = tostring(write_stylesheet(workbook))
+        workbook.properties.modified = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        if ARC_CORE in names:
+            replaced[ARC_CORE] = tostring(workbook.properties.to_tree())
+        replaced[workbook_part] = _full_calc_on_load(source.read(workbook_part))
+
+        calc_chains = _targets(source, workbook_rels, _CALC_CHAIN, workbook_part)
+        if calc_chains:
+            for part in calc_chains:
+                replaced[part] = None
+            replaced[workbook_rels] = _drop_relationships(source.read(workbook_rels), _CALC_CHAIN)
+            replaced[ARC_CONTENT_TYPES] = _drop_overrides(source.read(ARC_CONTENT_TYPES), calc_chains)
+
+        with zipfile.ZipFile(output, 'w', **_compression(compress_level), allowZip64=True) as target:
+            for info in source.infolist():
+                if info.filename not in replaced:
+                    _copy_entry(source, target, info)
+                elif replaced[info.filename] is not None:
+                    target.writestr(info.filename, replaced[info.filename])
+            for name, data in replaced.items():
+                if name not in names and data is not None:
+                    target.writestr(name, data)
+    return True
+
+
+def _compression(compress_level):
+    if compress_level is None:
+        return {'compression': zipfile.ZIP_DEFLATED}
+    if not 0 <= compress_level <= 9:
+        raise ValueError(f"compress_level must be between 0 and 9, got {compress_level}")
+    if compress_level == 0:
+        return {'compression': zipfile.ZIP_STORED}
+    return {'compression': zipfile.ZIP_DEFLATED, 'compresslevel': compress_level}
+
+
+def _same_file(original, output):
+    if not isinstance(original, (str, os.PathLike)) or not isinstance(output, (str, os.PathLike)):
+        return False
+    try:
+        return os.path.samefile(original, output)
+    except OSError:
+        return False
+
+
+def _needs_full_save(ws):
+    # Only ExcelWriter knows how to write these parts and link them to the sheet
+    return bool(getattr(ws, '_charts', None) or getattr(ws, '_images', None) or getattr(ws, '_comments', None)
+                or getattr(ws, 'legacy_drawing', None) or getattr(ws, 'tables', None)
+                or getattr(ws, '_pivots', None))
+
+
+def _read_file(path):
+    with open(path, 'rb') as handle:
+        return handle.read()
+
+
+def _rels_path(part):
+    folder, name = posixpath.split(part)
+    return posixpath.join(folder, '_rels', f'{name}.rels')
+
+
+def _resolve(base_part, target):
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_part), target))
+
+
+def _relationships(source, rels_part):
+    try:
+        root = ElementTree.fromstring(source.read(rels_part))
+    except KeyError:
+        return []
+    return root.findall(f'{{{_REL_NS}}}Relationship')
+
+
+def _targets(source, rels_part, rel_type, base_part):
+    return [_resolve(base_part, rel.get('Target')) for rel in _relationships(source, rels_part)
+            if rel.get('Type') == rel_type and rel.get('TargetMode') != 'External']
+
+
+def _workbook_part(source):
+    parts = _targets(source, ARC_ROOT_RELS, _OFFICE_DOCUMENT, '')
+    return parts[0] if parts else 'xl/workbook.xml'
+
+
+def _sheet_parts(source, workbook_part):
+    """Map sheet names to their part paths, in workbook order."""
+    rels = {rel.get('Id'): _resolve(workbook_part, rel.get('Target'))
+            for rel in _relationships(source, _rels_path(workbook_part))}
+    root = ElementTree.fromstring(source.read(workbook_part))
+    sheets = root.find(f'{{{_SHEET_NS}}}sheets')
+    if sheets is None:
+        return {}
+    return {sheet.get('name'): rels.get(sheet.get(f'{{{_DOC_REL_NS}}}id'))
+            for sheet in sheets.findall(f'{{{_SHEET_NS}}}sheet')}
+
+
+def _full_calc_on_load(xml):
+    """Set ``fullCalcOnLoad`` on the workbook's ``<calcPr>``, adding the element if needed."""
+    text = xml.decode('utf-8')
+    calc_pr = re.search(r'<(\w+:)?calcPr\b[^>]*?/?>', text)
+    if calc_pr:
+        element = calc_pr.group(0)
+        if re.search(r'\sfullCalcOnLoad="[^"]*"', element):
+            patched = re.sub(r'(\s)fullCalcOnLoad="[^"]*"', r'\1fullCalcOnLoad="1"', element)
+        else:
+            end = -2 if element.endswith('/>') else -1
+            patched = f'{element[:end]} fullCalcOnLoad="1"{element[end:]}'
+        text = text[:calc_pr.start()] + patched + text[calc_pr.end():]
+    else:
+        root = re.search(r'<(\w+:)?workbook\b', text)
+        prefix = (root.group(1) or '') if root else ''
+        element = f'<{prefix}calcPr calcId="124519" fullCalcOnLoad="1"/>'
+        names = '|'.join(_AFTER_CALC_PR)
+        anchor = re.search(rf'<{re.escape(prefix)}(?:{names})\b|</{re.escape(prefix)}workbook>', text)
+        position = anchor.start() if anchor else len(text)
+        text = text[:position] + element + text[position:]
+    return text.encode('utf-8')
+
+
+def _drop_relationships(xml, rel_type):
+    return re.sub(rf'<Relationship\b[^>]*\bType="{re.escape(rel_type)}"[^>]*/>'.encode(), b'', xml)
+
+
+def _drop_overrides(xml, parts):
+    for part in parts:
+        xml = re.sub(rf'<Override\b[^>]*\bPartName="/{re.escape(part)}"[^>]*/>'.encode(), b'', xml)
+    return xml
+
+
+def _copy_entry(source, target, info):
+    """Copy one member's compressed bytes from ``source`` to ``target`` without recompressing it."""
+    entry = zipfile.ZipInfo(info.filename, info.date_time)
+    entry.compress_type = info.compress_type
+    entry.create_system = info.create_system
+    entry.external_attr = info.external_attr
+    entry.CRC = info.CRC
+    entry.compress_size = info.compress_size
+    entry.file_size = info.file_size
+    # Sizes go in the local header, so no trailing data descriptor
+    entry.flag_bits = info.flag_bits & ~0x08
+    zip64 = entry.file_size > zipfile.ZIP64_LIMIT or entry.compress_size > zipfile.ZIP64_LIMIT
+
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    source.fp.seek(info.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+
+    entry.header_offset = target.fp.tell()
+    target.fp.write(entry.FileHeader(zip64))
+    remaining = info.compress_size
+    while remaining:
+        chunk = source.fp.read(min(remaining, _COPY_CHUNK))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated member {info.filename!r} in source workbook")
+        target.fp.write(chunk)
+        remaining -= len(chunk)
+    target.filelist.append(entry)
+    target.NameToInfo[entry.filename] = entry
+    target.start_dir = target.fp.tell()
+    target._didModify = True
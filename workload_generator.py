@@ -0,0 +1,139 @@
+"""Synthetic DMS, repJourney, MAIN and telemetry workbooks for benchmarking at scale.
+
+Workbooks are written in openpyxl's write-only mode, so 1M-row files can be
+generated without holding them in memory. The same ``rows``, ``seed`` and
+``month`` always produce the same files.
+"""
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+
+DMS_HEADERS = ['Device_Type', 'Device_ID', 'Last_Sighted_Date', 'Last_Sighted_Location']
+REP_HEADERS = ['Journey ID', 'Begin Journey Date', 'IVM/iScout Device ID', 'Disarm Date', 'Origin', 'Trip Type']
+MONTH_FORMULA_HEADERS = ['Destination', 'Days Out', 'Status']
+MAIN_HEADERS = ['Device Nos', 'Device Type', 'Last Disarmed Date', 'Last Disarmed Area', 'Remarks']
+TELEMETRY_HEADERS = ['Row', 'Device_ID', 'Last_Sighted_Date', 'Last_Sighted_Location', 'Location_Code']
+
+DEVICE_TYPES = ['IVM', 'iScout', 'Null']
+LOCATIONS = ['Head Office', 'MANILA INTL CONTAINER PORT', 'In Trip Journey', 'Unknown Location',
+             'SUBIC BAY FREEPORT', 'CEBU INTL PORT', 'DAVAO WAREHOUSE', 'BATANGAS PORT']
+LOCATION_CODES = ['HQ', 'MICP', 'TRIP', 'UNK', 'SBF', 'CIP', 'DVO', 'BTG']
+TRIP_TYPES = ['Import', 'Export', 'Transfer']
+# Rows already in a month sheet before the run, as a fraction of the repJourney rows
+MONTH_SHEET_FILL = 0.5
+
+
+def generate_workload(out_dir, rows, seed=1, month=None):
+    """Write ``dms.xlsx``, ``rep.xlsx``, ``main.xlsx`` and ``telemetry.xlsx`` to ``out_dir``.
+
+    ``rows`` sets the DMS, repJourney, MAIN and telemetry row counts; repJourney
+    dates fall in ``month`` (a ``datetime``, default the current month), which
+    is also the month sheet phase 2 writes to. Returns the file paths by name.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    month = (month or datetime.utcnow()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    devices = [10000 + i for i in range(rows)]
+    paths = {name: os.path.join(out_dir, f"{name}.xlsx") for name in ('dms', 'rep', 'main', 'telemetry')}
+
+    _write_dms(paths['dms'], devices, random.Random(seed), month)
+    _write_rep(paths['rep'], devices, rows, random.Random(seed + 1), month)
+    _write_main(paths['main'], devices, rows, random.Random(seed + 2), month)
+    _write_telemetry(paths['telemetry'], devices, random.Random(seed + 3), month)
+    return paths
+
+
+def _messy_device_id(rng, device):
+    # Mirror what the real exports contain: ints, floats and padded strings
+    roll = rng.random()
+    if roll < 0.1:
+        return float(device)
+    if roll < 0.2:
+        return f" {device} "
+    return device
+
+
+def _write_dms(path, devices, rng, month):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('DMS Dump')
+    ws.append(DMS_HEADERS)
+    for device in devices:
+        sighted = month - timedelta(days=rng.randint(0, 120))
+        ws.append([rng.choice(DEVICE_TYPES), _messy_device_id(rng, device),
+                   sighted.strftime('%Y-%m-%d'), rng.choice(LOCATIONS)])
+    wb.save(path)
+
+
+def _journey_row(rng, journey_id, devices, month):
+    begin = month + timedelta(minutes=rng.randint(0, 27 * 24 * 60))
+    disarm = begin + timedelta(hours=rng.randint(2, 96)) if rng.random() > 0.1 else None
+    return [journey_id, begin, str(rng.choice(devices)), disarm,
+            rng.choice(LOCATIONS), rng.choice(TRIP_TYPES)]
+
+
+def _month_formulas(row):
+    # Formula columns after Destination, referring to their own row like the real MAIN
+    return [
+        f"=IFERROR(VLOOKUP(C{row},'DMS Dump'!B:D,3,FALSE),\"\")",
+        f'=IF(D{row}="","",D{row}-B{row})',
+        f'=IF(D{row}="","Open","Closed")',
+    ]
+
+
+def _write_rep(path, devices, rows, rng, month):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('repJourney')
+    ws.append(REP_HEADERS)
+    for journey_id in range(1, rows + 1):
+        ws.append(_journey_row(rng, journey_id, devices, month))
+    wb.save(path)
+
+
+def _write_main(path, devices, rows, rng, month):
+    wb = Workbook(write_only=True)
+    main = wb.create_sheet('MAIN')
+    main.append(MAIN_HEADERS)
+    for device in devices:
+        main.append([device, rng.choice(DEVICE_TYPES), None, None, None])
+
+    # A stale DMS Dump that phase 1 replaces
+    dump = wb.create_sheet('DMS Dump')
+    dump.append(DMS_HEADERS)
+    for device in devices[:max(rows // 2, 1)]:
+        dump.append(['Null', device, '2000-01-01', 'Old Location'])
+
+    # The two previous months stay small; the current one is half full before the run
+    previous = (month - timedelta(days=1)).replace(day=1)
+    earlier = (previous - timedelta(days=1)).replace(day=1)
+    for sheet_month, fill in ((earlier, 100), (previous, 100), (month, max(int(rows * MONTH_SHEET_FILL), 1))):
+        ws = wb.create_sheet(sheet_month.strftime('%b%Y'))
+        ws.append(REP_HEADERS + MONTH_FORMULA_HEADERS)
+        for offset in range(fill):
+            ws.append(_journey_row(rng, offset + 1, devices, sheet_month) + _month_formulas(offset + 2))
+    wb.save(path)
+
+
+def _write_telemetry(path, devices, rng, month):
+    # Upload layout read by excel_handler: ignored first column, then the four telemetry columns
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Telemetry')
+    ws.append(TELEMETRY_HEADERS)
+    for row, device in enumerate(devices, start=1):
+        index = rng.randrange(len(LOCATIONS))
+        sighted = month - timedelta(days=rng.randint(0, 120), minutes=rng.randint(0, 1439))
+        ws.append([row, device, sighted.strftime('%Y-%m-%d %H:%M:%S'), LOCATIONS[index], LOCATION_CODES[index]])
+    wb.save(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic DMS, repJourney, MAIN and telemetry workbooks.')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--month', type=lambda value: datetime.strptime(value, '%Y-%m'),
+                        help='YYYY-MM of the repJourney dates (default: current month)')
+    parser.add_argument('--out', default='workload')
+    args = parser.parse_args()
+    for name, path in generate_workload(args.out, args.rows, args.seed, args.month).items():
+        print(f"{name:<10} {path}")